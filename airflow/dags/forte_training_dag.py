@@ -8,6 +8,9 @@ from airflow import DAG
 from airflow.operators.python import PythonOperator, BranchPythonOperator
 from airflow.operators.bash import BashOperator
 from airflow.operators.empty import EmptyOperator
+from airflow.sensors.base import PokeReturnValue
+from airflow.sensors.python import PythonSensor
+from airflow.exceptions import AirflowFailException
 from airflow.utils.trigger_rule import TriggerRule
 import requests
 import json
@@ -148,49 +151,65 @@ def run_feature_engineering(**context):
 
 def train_model(**context):
     """
-    Обучение модели через API ML Service
-    MLflow трекинг происходит внутри ML Service
+    Запуск обучения в ML Service: сервис сразу возвращает id задачи,
+    обучение идёт в отдельном процессе (ожидание - в wait_for_training)
     """
     print("Starting model training via ML Service API...")
     print(f"ML Service URL: {ML_SERVICE_URL}")
 
     try:
-        # Вызываем эндпоинт обучения в ML Service
-        response = requests.post(
-            f"{ML_SERVICE_URL}/train",
-            timeout=3600  # 1 час таймаут
-        )
+        response = requests.post(f"{ML_SERVICE_URL}/train", timeout=30)
+        response.raise_for_status()
+    except requests.exceptions.RequestException as e:
+        raise Exception(f"Failed to connect to ML Service: {str(e)}")
 
-        result = response.json()
-        print(f"Training response: {json.dumps(result, indent=2)}")
+    job = response.json()
+    print(f"Training job: {json.dumps(job, indent=2)}")
 
-        if result.get("status") == "failed":
-            raise Exception(f"Training failed: {result.get('message')}")
+    context["ti"].xcom_push(key="job_id", value=job["job_id"])
 
-        if result.get("status") == "timeout":
-            raise Exception("Training timeout exceeded (1 hour)")
+    return job["job_id"]
 
-        # Сохраняем результаты
-        training_result = {
-            "status": result.get("status", "success"),
-            "model_version": result.get("model_version"),
-            "mlflow_run_id": result.get("mlflow_run_id"),
-            "trained_at": datetime.now().isoformat()
-        }
 
-        context["ti"].xcom_push(key="training_result", value=training_result)
+def check_training_job(**context):
+    """
+    Проверка статуса задачи обучения (sensor в режиме reschedule:
+    между проверками слот воркера свободен)
+    """
+    job_id = context["ti"].xcom_pull(task_ids="train_model", key="job_id")
 
-        print(f"Training completed! Model version: {training_result.get('model_version')}")
-        print(f"MLflow Run ID: {training_result.get('mlflow_run_id')}")
+    try:
+        response = requests.get(f"{ML_SERVICE_URL}/train/{job_id}", params={"log_lines": 20}, timeout=30)
+        response.raise_for_status()
+    except requests.exceptions.RequestException as e:
+        # Сервис временно недоступен - проверим при следующем poke
+        print(f"Failed to get training job status: {e}")
+        return False
+
+    job = response.json()
+    print(f"Training job {job_id}: status={job['status']}, stage={job['stage']}")
+    for line in job.get("logs") or []:
+        print(f"   {line}")
+
+    if job["status"] in ("queued", "running"):
+        return False
+
+    if job["status"] != "succeeded":
+        raise AirflowFailException(f"Training {job['status']}: {job.get('error')}")
+
+    # Сохраняем результаты
+    training_result = {
+        "status": job["status"],
+        "job_id": job_id,
+        "model_version": job.get("model_version"),
+        "mlflow_run_id": job.get("mlflow_run_id"),
+        "trained_at": datetime.now().isoformat()
+    }
 
-        return training_result
+    print(f"Training completed! Model version: {training_result.get('model_version')}")
+    print(f"MLflow Run ID: {training_result.get('mlflow_run_id')}")
 
-    except requests.exceptions.Timeout:
-        raise Exception("Training request timeout exceeded (1 hour)")
-    except requests.exceptions.RequestException as e:
-        raise Exception(f"Failed to connect to ML Service: {str(e)}")
-    except Exception as e:
-        raise Exception(f"Training failed: {str(e)}")
+    return PokeReturnValue(is_done=True, xcom_value=training_result)
 
 
 def validate_model(**context):
@@ -312,7 +331,7 @@ def send_notification(**context):
     Отправка уведомления о результатах
     """
     training_result = context["ti"].xcom_pull(
-        task_ids="train_model",
+        task_ids="wait_for_training",
         key="return_value"
     )
     validation_result = context["ti"].xcom_pull(
@@ -376,12 +395,22 @@ with DAG(
         python_callable=run_feature_engineering,
     )
 
-    # Task 5: Обучение модели
+    # Task 5: Запуск обучения (возвращает id задачи сразу)
     train = PythonOperator(
         task_id="train_model",
         python_callable=train_model,
     )
 
+    # Task 5b: Ожидание обучения - reschedule освобождает слот между проверками
+    wait_training = PythonSensor(
+        task_id="wait_for_training",
+        python_callable=check_training_job,
+        mode="reschedule",
+        poke_interval=60,
+        timeout=2 * 3600,
+        retries=0,
+    )
+
     # Task 6: Валидация
     validate = PythonOperator(
         task_id="validate_model",
@@ -411,4 +440,4 @@ with DAG(
     check_drift >> decide
 
     decide >> skip >> notify
-    decide >> extract_data >> feature_eng >> train >> validate >> deploy >> update_base >> notify
+    decide >> extract_data >> feature_eng >> train >> wait_training >> validate >> deploy >> update_base >> notify
@@ -1,20 +1,25 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
-from app.schemas.transaction import TransactionFeatures, PredictionResponse
+from app.schemas.transaction import (
+    TransactionFeatures, PredictionResponse, ExplainLevel, AnalysisMode, AnalysisResult
+)
 from app.services.model_service import model_service
 from app.services.ai_service import ai_service
+from app.services.enrichment import enrichment_service
+from app.services.training import training_manager, TRAIN_SCRIPT
 from app.core.config import settings
+from app.core.request_id import exemplar
+from app.prefork import notify_reload, notify_threshold
 import json
-from pathlib import Path
 import numpy as np
-import asyncio
 import time
 
 # Import Prometheus metrics
 from app.core.metrics import (
     PREDICTIONS_TOTAL, PREDICTION_LATENCY, FRAUD_SCORE,
-    BLOCKED_TRANSACTIONS, PREDICTIONS_ERRORS, DRIFT_SCORE, CURRENT_THRESHOLD
+    BLOCKED_TRANSACTIONS, PREDICTIONS_ERRORS, DRIFT_SCORE
 )
 
 router = APIRouter()
@@ -37,7 +42,20 @@ class ThresholdResponse(BaseModel):
 class BatchPredictionRequest(BaseModel):
     """Request for batch predictions"""
     transactions: List[TransactionFeatures]
-    skip_ai_analysis: bool = Field(default=True, description="Skip AI analysis for speed")
+    skip_ai_analysis: bool = Field(
+        default=True,
+        description="Skip AI analysis for speed; otherwise rows at AI_BATCH_MIN_RISK or above "
+                    "are analysed in batched prompts"
+    )
+    explain: ExplainLevel = Field(
+        default="topk",
+        description="none: scores only; topk: top risk factors; full: also shap_values for every feature"
+    )
+    analysis: Optional[AnalysisMode] = Field(
+        default=None,
+        description="llm: LLM only; template: local template engine; "
+                    "auto: LLM with template fallback (default: AI_ANALYSIS_MODE)"
+    )
 
 
 class BatchPredictionItem(BaseModel):
@@ -48,6 +66,11 @@ class BatchPredictionItem(BaseModel):
     risk_level: str
     should_block: bool
     top_risk_factors: List[Dict[str, Any]]
+    shap_values: Optional[Dict[str, float]] = None
+    ai_analysis: Optional[str] = None
+    aml_analysis: Optional[str] = None
+    recommendation: Optional[str] = None
+    analysis_source: Optional[str] = None
 
 
 class BatchPredictionResponse(BaseModel):
@@ -80,34 +103,60 @@ class DriftReport(BaseModel):
     recommendation: str
     checked_at: str
 
+def _risk_level(fraud_probability: float, threshold: float) -> str:
+    if fraud_probability >= threshold + 0.2:
+        return "CRITICAL"
+    if fraud_probability >= threshold + 0.1:
+        return "HIGH"
+    if fraud_probability >= threshold:
+        return "MEDIUM"
+    return "LOW"
+
+
+def _sse(event: str, data: Any) -> str:
+    """One Server-Sent Events message with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
 @router.post("/predict", response_model=PredictionResponse)
-async def predict_fraud(transaction: TransactionFeatures):
+async def predict_fraud(
+    transaction: TransactionFeatures,
+    explain: ExplainLevel = Query(
+        "full",
+        description="none: score only; topk: top risk factors; full: also shap_values for every feature"
+    ),
+    deferred: bool = Query(
+        False,
+        description="Return the score immediately with an analysis_id; "
+                    "attributions and AI analysis are fetched from GET /analysis/{analysis_id}"
+    ),
+    analysis: Optional[AnalysisMode] = Query(
+        None,
+        description="llm: LLM only; template: local template engine; "
+                    "auto: LLM with template fallback (default: AI_ANALYSIS_MODE)"
+    )
+):
     """
     Predict fraud probability for a transaction.
     """
     start_time = time.time()
 
     try:
-        # 1. Get model prediction (CPU bound, runs in thread pool)
-        prediction_result = await model_service.predict(transaction)
+        # 1. Get model prediction (CPU bound, runs in thread pool); the deferred
+        # attributions are computed on the same bundle
+        bundle = model_service.bundle
+        prediction_result = await model_service.predict(transaction, "none" if deferred else explain, bundle)
 
         fraud_probability = prediction_result["fraud_probability"]
         shap_values = prediction_result["shap_values"]
 
         # 2. Calculate derived metrics
         fraud_score = fraud_probability * 100
-        threshold = model_service.metadata['optimal_threshold']
+        # Threshold and version of the model bundle that scored this request
+        threshold = prediction_result["threshold"]
 
         # Determine risk level
-        if fraud_probability >= threshold + 0.2:
-            risk_level = "CRITICAL"
-        elif fraud_probability >= threshold + 0.1:
-            risk_level = "HIGH"
-        elif fraud_probability >= threshold:
-            risk_level = "MEDIUM"
-        else:
-            risk_level = "LOW"
-
+        risk_level = _risk_level(fraud_probability, threshold)
         should_block = fraud_probability >= threshold
 
         # 3. Record Prometheus metrics
@@ -116,55 +165,140 @@ async def predict_fraud(transaction: TransactionFeatures):
         if should_block:
             BLOCKED_TRANSACTIONS.inc()
 
-        # 4. Get top risk factors from SHAP values
-        sorted_shap = sorted(shap_values.items(), key=lambda x: abs(x[1]), reverse=True)
-        top_risk_factors = [
-            {
-                "feature": feat,
-                "impact": float(val),
-                "direction": "increases" if val > 0 else "decreases"
-            }
-            for feat, val in sorted_shap[:10]
-        ]
+        # 4. Top risk factors (ensemble attributions, selected in the model service)
+        top_risk_factors = prediction_result["top_risk_factors"]
 
-        # 5. Get AI Analysis (IO bound, async)
-        ai_analysis, aml_analysis, recommendation, fingerprint = await ai_service.analyze_transaction(
-            transaction, fraud_probability, risk_level, top_risk_factors
-        )
+        # 5. Get AI Analysis (IO bound, async), or defer it together with the attributions
+        analysis_id = None
+        if deferred:
+            # The AI analysis needs at least the top risk factors
+            analysis_id = await enrichment_service.submit(
+                transaction, fraud_probability, risk_level, "full" if explain == "full" else "topk", analysis,
+                bundle=bundle
+            )
+            ai_result = {}
+        else:
+            ai_result = await ai_service.analyze(
+                transaction, fraud_probability, risk_level, top_risk_factors, analysis
+            )
 
         # Record latency
-        PREDICTION_LATENCY.observe(time.time() - start_time)
+        PREDICTION_LATENCY.observe(time.time() - start_time, exemplar=exemplar())
 
         return PredictionResponse(
             fraud_probability=fraud_probability,
             fraud_score=fraud_score,
             risk_level=risk_level,
             should_block=should_block,
-            model_version=model_service.metadata['version'],
+            model_version=prediction_result["model_version"],
             shap_values=shap_values,
-            ai_analysis=ai_analysis,
-            aml_analysis=aml_analysis,
-            recommendation=recommendation,
-            analysis_fingerprint=fingerprint,
-            top_risk_factors=top_risk_factors
+            top_risk_factors=top_risk_factors,
+            analysis_id=analysis_id,
+            **ai_result
         )
 
     except Exception as e:
         # Record error latency and error count
-        PREDICTION_LATENCY.observe(time.time() - start_time)
+        PREDICTION_LATENCY.observe(time.time() - start_time, exemplar=exemplar())
         PREDICTIONS_ERRORS.inc()
         raise HTTPException(status_code=500, detail=f"Prediction error: {str(e)}")
 
+@router.post("/predict/stream")
+async def predict_fraud_stream(
+    transaction: TransactionFeatures,
+    analysis: Optional[AnalysisMode] = Query(
+        None,
+        description="llm: LLM only; template: local template engine; "
+                    "auto: LLM with template fallback (default: AI_ANALYSIS_MODE)"
+    )
+):
+    """
+    Predict fraud probability and stream the AI analysis as Server-Sent Events.
+
+    Events: `prediction` (score, risk level and top risk factors, sent as soon
+    as the model has scored the transaction), then `fraud` / `aml` with
+    {"delta": text} as the two analyses are generated, `error` if one of them
+    fails (in auto mode the template text replacing it follows), and finally
+    `done` with the complete analysis (as in /predict).
+    """
+    start_time = time.time()
+    try:
+        prediction_result = await model_service.predict(transaction, "topk")
+    except Exception as e:
+        PREDICTION_LATENCY.observe(time.time() - start_time, exemplar=exemplar())
+        PREDICTIONS_ERRORS.inc()
+        raise HTTPException(status_code=500, detail=f"Prediction error: {str(e)}")
+
+    fraud_probability = prediction_result["fraud_probability"]
+    threshold = prediction_result["threshold"]
+    risk_level = _risk_level(fraud_probability, threshold)
+    should_block = fraud_probability >= threshold
+    top_risk_factors = prediction_result["top_risk_factors"]
+
+    PREDICTIONS_TOTAL.labels(risk_level=risk_level).inc()
+    FRAUD_SCORE.observe(fraud_probability * 100)
+    if should_block:
+        BLOCKED_TRANSACTIONS.inc()
+    PREDICTION_LATENCY.observe(time.time() - start_time, exemplar=exemplar())
+
+    prediction = {
+        "fraud_probability": fraud_probability,
+        "fraud_score": fraud_probability * 100,
+        "risk_level": risk_level,
+        "should_block": should_block,
+        "model_version": prediction_result["model_version"],
+        "top_risk_factors": top_risk_factors
+    }
+
+    async def events():
+        yield _sse("prediction", prediction)
+        async for event, data in ai_service.stream_analysis(
+            transaction, fraud_probability, risk_level, top_risk_factors, analysis
+        ):
+            yield _sse(event, {"delta": data} if event in ("fraud", "aml") else data)
+
+    # No proxy buffering or caching: every event is flushed as it is produced
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@router.get("/analysis/{analysis_id}", response_model=AnalysisResult)
+async def get_analysis(analysis_id: str):
+    """
+    Result of a deferred /predict analysis (status pending until it is ready).
+    """
+    result = await enrichment_service.get(analysis_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Analysis not found or expired")
+    return AnalysisResult(analysis_id=analysis_id, **result)
+
 @router.get("/health")
 async def health_check():
     """
-    Service health check
+    Service health check (liveness: the process is up; see /ready for traffic)
     """
     return {
         "status": "healthy",
         "model_loaded": model_service.lgb_model is not None,
+        "ready": model_service.ready,
         "model_version": model_service.metadata['version'] if model_service.metadata else None,
-        "openai_available": ai_service.client is not None
+        "openai_available": ai_service.gateway is not None,
+        "llm_breaker": ai_service.gateway.state if ai_service.gateway else None
+    }
+
+@router.get("/ready")
+async def readiness_check():
+    """
+    Readiness probe: 200 once the models are loaded and the serving path has
+    been warmed up, 503 before (load balancers and the compose healthcheck
+    route traffic on this, not on /health)
+    """
+    if not model_service.ready:
+        detail = "Warming up" if model_service.bundle is not None else "Model not loaded"
+        raise HTTPException(status_code=503, detail=detail)
+    return {
+        "status": "ready",
+        "model_version": model_service.metadata['version'],
+        "warmup": model_service.warmup_report
     }
 
 @router.get("/model-info", response_model=ModelMetrics)
@@ -232,16 +366,12 @@ async def update_threshold(request: ThresholdUpdate):
     old_threshold = model_service.metadata['optimal_threshold']
     new_threshold = request.threshold
 
-    # Update in memory
-    model_service.metadata['optimal_threshold'] = new_threshold
+    # Update in memory (also updates the Prometheus metric and drops cached predictions)
+    model_service.set_threshold(new_threshold)
 
-    # Update Prometheus metric
-    CURRENT_THRESHOLD.set(new_threshold)
-
-    # Persist to file
-    metadata_path = settings.MODEL_DIR / 'metadata.json'
-    with open(metadata_path, 'w') as f:
-        json.dump(model_service.metadata, f, indent=2)
+    # Persist to file; the other workers re-read it (unless a newer version was promoted meanwhile)
+    if await model_service.save_metadata():
+        notify_threshold()
 
     return ThresholdResponse(
         old_threshold=old_threshold,
@@ -252,11 +382,13 @@ async def update_threshold(request: ThresholdUpdate):
 
 # ==================== BATCH PREDICTION ====================
 
-@router.post("/predict/batch", response_model=BatchPredictionResponse)
+@router.post("/predict/batch", response_model=BatchPredictionResponse, response_model_exclude_none=True)
 async def predict_batch(request: BatchPredictionRequest):
     """
     Batch prediction for multiple transactions.
-    Optimized for speed - skips AI analysis by default.
+    Optimized for speed - skips AI analysis by default. With
+    skip_ai_analysis=false, flagged rows get AI analysis from batched prompts
+    (many transactions per completion call).
     """
     import time
     start_time = time.time()
@@ -264,65 +396,50 @@ async def predict_batch(request: BatchPredictionRequest):
     if not model_service.lgb_model:
         raise HTTPException(status_code=503, detail="Model not loaded")
 
+    # Score the whole batch in a single pass (no AI analysis for speed)
+    result = await model_service.predict_batch(request.transactions, explain=request.explain)
+
+    # Batched AI analysis of flagged rows (rows that failed scoring are left out)
+    analyses = [None] * len(request.transactions)
+    if not request.skip_ai_analysis:
+        rows = np.flatnonzero(~result["errors"]).tolist()
+        row_analyses = await ai_service.analyze_batch(
+            [request.transactions[i] for i in rows],
+            result["fraud_probability"][rows].tolist(),
+            result["risk_level"][rows].tolist(),
+            [result["top_risk_factors"][i] for i in rows],
+            min_risk=settings.AI_BATCH_MIN_RISK,
+            mode=request.analysis
+        )
+        for row, analysis in zip(rows, row_analyses):
+            analyses[row] = analysis
+
     predictions = []
     total_fraud_prob = 0.0
     blocked_count = 0
-    threshold = model_service.metadata['optimal_threshold']
-
-    # Process all transactions
-    for idx, transaction in enumerate(request.transactions):
-        try:
-            # Get prediction (no AI analysis for speed)
-            result = await model_service.predict(transaction)
-            fraud_prob = result["fraud_probability"]
-            shap_values = result["shap_values"]
-
-            fraud_score = fraud_prob * 100
-
-            # Determine risk level
-            if fraud_prob >= threshold + 0.2:
-                risk_level = "CRITICAL"
-            elif fraud_prob >= threshold + 0.1:
-                risk_level = "HIGH"
-            elif fraud_prob >= threshold:
-                risk_level = "MEDIUM"
-            else:
-                risk_level = "LOW"
-
-            should_block = fraud_prob >= threshold
-            if should_block:
-                blocked_count += 1
-
-            total_fraud_prob += fraud_prob
-
-            # Top risk factors
-            sorted_shap = sorted(shap_values.items(), key=lambda x: abs(x[1]), reverse=True)
-            top_factors = [
-                {"feature": feat, "impact": float(val), "direction": "increases" if val > 0 else "decreases"}
-                for feat, val in sorted_shap[:5]
-            ]
-
-            predictions.append(BatchPredictionItem(
-                index=idx,
-                fraud_probability=fraud_prob,
-                fraud_score=fraud_score,
-                risk_level=risk_level,
-                should_block=should_block,
-                top_risk_factors=top_factors
-            ))
-
-        except Exception as e:
-            # Continue on error, mark as high risk
-            predictions.append(BatchPredictionItem(
-                index=idx,
-                fraud_probability=1.0,
-                fraud_score=100.0,
-                risk_level="CRITICAL",
-                should_block=True,
-                top_risk_factors=[{"feature": "error", "impact": 1.0, "direction": "increases"}]
-            ))
+
+    for idx, (fraud_prob, risk_level, should_block, top_factors, shap_values, analysis) in enumerate(zip(
+        result["fraud_probability"].tolist(),
+        result["risk_level"].tolist(),
+        result["should_block"].tolist(),
+        result["top_risk_factors"],
+        result["shap_values"],
+        analyses
+    )):
+        if should_block:
             blocked_count += 1
-            total_fraud_prob += 1.0
+        total_fraud_prob += fraud_prob
+
+        predictions.append(BatchPredictionItem(
+            index=idx,
+            fraud_probability=fraud_prob,
+            fraud_score=fraud_prob * 100,
+            risk_level=risk_level,
+            should_block=should_block,
+            top_risk_factors=top_factors,
+            shap_values=shap_values,
+            **(analysis or {})
+        ))
 
     processing_time = (time.time() - start_time) * 1000
     avg_prob = total_fraud_prob / len(predictions) if predictions else 0.0
@@ -382,94 +499,68 @@ async def set_drift_baseline(transactions: List[TransactionFeatures]):
     }
 
 
-class TrainingResponse(BaseModel):
-    """Response after model training"""
-    status: str
-    message: str
+class TrainingJob(BaseModel):
+    """Status of a background training job"""
+    job_id: str
+    status: str  # queued, running, succeeded, failed, timeout, cancelled
+    stage: str  # progress stage: starting, loading_data, ..., saving, validating, promoting, reloading, done
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
     model_version: Optional[str] = None
     mlflow_run_id: Optional[str] = None
     metrics: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    logs: Optional[List[str]] = None
 
 
-@router.post("/train", response_model=TrainingResponse)
+@router.post("/train", response_model=TrainingJob, status_code=202)
 async def train_model():
     """
     Trigger model training.
     Called by Airflow DAG or manually.
-    Training runs in background - check /model-info for updated version.
-    """
-    import subprocess
-    import sys
-    import os
-    from datetime import datetime
-
-    try:
-        # Set MLflow tracking URI
-        mlflow_uri = os.getenv("MLFLOW_TRACKING_URI", "https://forte.grekdev.com:5000")
-
-        # Run training script
-        train_script = Path(__file__).parent.parent.parent / "train_model.py"
-
-        if not train_script.exists():
-            raise HTTPException(status_code=500, detail=f"Training script not found: {train_script}")
-
-        # Run training in subprocess with MLflow URI
-        env = os.environ.copy()
-        env["MLFLOW_TRACKING_URI"] = mlflow_uri
-
-        result = subprocess.run(
-            [sys.executable, str(train_script)],
-            capture_output=True,
-            text=True,
-            timeout=3600,  # 1 hour timeout
-            env=env,
-            cwd=str(train_script.parent)
-        )
 
-        if result.returncode != 0:
-            return TrainingResponse(
-                status="failed",
-                message=f"Training failed: {result.stderr[-1000:] if result.stderr else 'Unknown error'}",
-                metrics=None
-            )
+    Returns a job at once; training runs in a separate, resource-limited
+    process and the new model version is promoted and hot-swapped in only if
+    it succeeds. Poll GET /train/{job_id}. While a job is active, the active
+    job is returned instead of starting another.
+    """
+    if not TRAIN_SCRIPT.exists():
+        raise HTTPException(status_code=500, detail=f"Training script not found: {TRAIN_SCRIPT}")
+    job_id, _ = await training_manager.submit()
+    return await training_manager.get(job_id)
 
-        # Reload the model after training
-        model_service.load_models()
-
-        # Get new model info
-        metrics_path = settings.MODEL_DIR / 'metrics.json'
-        metrics = None
-        mlflow_run_id = None
-        if metrics_path.exists():
-            with open(metrics_path, 'r') as f:
-                metrics = json.load(f)
-                mlflow_run_id = metrics.get('mlflow', {}).get('run_id')
-
-        return TrainingResponse(
-            status="success",
-            message="Model trained successfully",
-            model_version=model_service.metadata.get('version') if model_service.metadata else None,
-            mlflow_run_id=mlflow_run_id,
-            metrics=metrics
-        )
 
-    except subprocess.TimeoutExpired:
-        return TrainingResponse(
-            status="timeout",
-            message="Training exceeded 1 hour timeout"
-        )
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Training error: {str(e)}")
+@router.get("/train/{job_id}", response_model=TrainingJob, response_model_exclude_none=True)
+async def get_training_job(job_id: str, log_lines: int = Query(50, ge=0, le=5000)):
+    """Status, progress stage and the last `log_lines` lines of the training log"""
+    job = await training_manager.get(job_id, log_lines)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Training job not found")
+    return job
 
 
 @router.post("/reload-model")
-async def reload_model():
+async def reload_model(response: Response):
     """
     Reload model from disk.
     Use after manual model update or training.
+
+    The new models are loaded and warmed in the background while the current
+    ones keep serving, then swapped in atomically; requests already in flight
+    finish on the version they started with. Pre-forked workers don't load
+    anything themselves: the parent loads the models once and rolls the
+    workers onto them, so the reload is reported as pending (202).
     """
     try:
-        model_service.load_models()
+        if notify_reload():
+            response.status_code = 202
+            return {
+                "status": "pending",
+                "message": "Reload requested, workers are rolled onto the new models",
+                "current_version": model_service.metadata.get('version') if model_service.metadata else None
+            }
+        await model_service.reload()
         return {
             "status": "success",
             "message": "Model reloaded",
@@ -11,14 +11,90 @@ class Settings(BaseSettings):
     HOST: str = "0.0.0.0"
     PORT: int = 8000
     LOG_LEVEL: str = "INFO"
+    SERVER_WORKERS: int = 0  # pre-fork workers (python -m app.prefork), 0 = one per CPU core
     
     # Model
     MODEL_DIR: Path = Path("models")
+    USE_SCALER_FREE_MODELS: bool = True  # serve models with the scaler folded into thresholds
+    USE_BUNDLE_FILE: bool = True  # load model.fmb (memory-mapped, precompiled trees) when metadata lists one
+    BUNDLE_VERIFY_HASH: bool = True  # check the bundle's content hash on load
+    INFERENCE_BACKEND: str = "native"  # native | numpy | onnx
+    ONNX_INTRA_OP_THREADS: int = 1
+    EXPLAIN_METHOD: str = "shap"  # shap (exact TreeSHAP) | path (faster Saabas attributions, not SHAP values)
+    MODEL_THREADS: int = 0  # OpenMP threads per LightGBM / XGBoost call, 0 = library default (pre-fork: always 1)
+
+    # Inference executor: "thread" (in-process pool) or "process" (forked workers sharing the models)
+    INFERENCE_EXECUTOR: str = "thread"
+    PROCESS_POOL_WORKERS: int = 0  # 0 = one per CPU core
+
+    # Micro-batching of concurrent /predict calls
+    MICRO_BATCH_ENABLED: bool = True
+    MICRO_BATCH_WINDOW_MS: float = 2.0
+    MICRO_BATCH_MAX_SIZE: int = 64
+
+    # Warm-up before /ready: synthetic traffic through every scoring path, in rounds
+    # until one takes within WARMUP_TOLERANCE of the previous (off: a single round)
+    WARMUP_ENABLED: bool = True
+    WARMUP_BATCH_SIZE: int = 16  # synthetic transactions per round (covers the executor threads)
+    WARMUP_MIN_ROUNDS: int = 3
+    WARMUP_MAX_ROUNDS: int = 20
+    WARMUP_MAX_SECONDS: float = 10.0  # stop adding rounds after this long, stable or not
+    WARMUP_TOLERANCE: float = 0.15
+
+    # /predict result cache (keyed by feature vector, model version and explain level)
+    PREDICTION_CACHE_ENABLED: bool = True
+    PREDICTION_CACHE_MAX_ENTRIES: int = 10000  # a "full" result is ~5 KB, so ~50 MB at most
+    PREDICTION_CACHE_TTL_SECONDS: float = 300.0
     
     # OpenAI
     OPENAI_API_KEY: Optional[str] = None
     OPENAI_MODEL_FRAUD: str = "gpt-4o-mini"
     OPENAI_MODEL_AML: str = "gpt-4o-mini"
+    OPENAI_BASE_URL: Optional[str] = None  # e.g. http://localhost:8100/v1 for benchmarks/llm_stub.py
+
+    # LLM gateway: concurrency cap, queue limit, per-call deadline, circuit breaker
+    LLM_MAX_CONCURRENCY: int = 32
+    LLM_MAX_QUEUE: int = 256
+    LLM_TIMEOUT_SECONDS: float = 10.0
+    LLM_BREAKER_WINDOW: int = 50
+    LLM_BREAKER_ERROR_RATE: float = 0.5
+    LLM_BREAKER_MIN_CALLS: int = 10
+    LLM_BREAKER_COOLDOWN_SECONDS: float = 30.0
+
+    # Source of ai_analysis / aml_analysis / recommendation (per request: ?analysis=...)
+    #   llm: LLM only (None when it is unavailable); template: local template engine only;
+    #   auto: LLM, template engine when the LLM has no answer or misses the budget.
+    #   Default llm: responses without an LLM keep ai_analysis null; opt in to auto / template
+    AI_ANALYSIS_MODE: str = "llm"
+    AI_FALLBACK_BUDGET_SECONDS: Optional[float] = None  # auto mode: wait at most this long for the LLM (default: its own deadline)
+
+    # Batched AI analysis for /predict/batch (skip_ai_analysis=false)
+    AI_BATCH_MIN_RISK: str = "MEDIUM"  # only rows at or above this risk level are analysed
+    AI_BATCH_CHUNK_SIZE: int = 20  # transactions per prompt
+    AI_BATCH_MAX_PARALLEL: int = 4  # chunks in flight per batch
+    AI_BATCH_TIMEOUT_SECONDS: float = 60.0
+
+    # Persistent LLM analysis cache (SQLite in WAL mode, shared by all workers on the node)
+    AI_CACHE_ENABLED: bool = True
+    AI_CACHE_PATH: Path = Path("cache/ai_analysis.sqlite3")
+    AI_CACHE_TTL_SECONDS: float = 7 * 24 * 3600
+    AI_CACHE_MAX_ENTRIES: int = 100000
+    AI_CACHE_BUCKETING: bool = False  # round amount, probability and impacts in the fraud prompt to share cache entries (AML prompts keep exact amounts)
+
+    # Deferred enrichment (/predict?deferred=true): attributions + LLM analysis in the background
+    ENRICHMENT_STORE_PATH: Path = Path("cache/enrichment.sqlite3")
+    ENRICHMENT_RESULT_TTL_SECONDS: float = 3600.0
+    ENRICHMENT_MAX_CONCURRENCY: int = 16
+    ENRICHMENT_MAX_PENDING: int = 1000
+    ENRICHMENT_KAFKA_TOPIC: Optional[str] = None  # e.g. "transactions_analysis" to push finished analyses
+    KAFKA_BOOTSTRAP_SERVERS: str = "localhost:9092"
+
+    # Background training jobs (POST /train): train_model.py in a separate, resource-limited process
+    TRAINING_JOB_DIR: Path = Path("cache/training")  # job table, logs and staged models
+    TRAINING_TIMEOUT_SECONDS: float = 3600.0
+    TRAINING_THREADS: int = 2  # OpenMP/BLAS threads of the training process, 0 = no cap
+    TRAINING_NICE: int = 10  # scheduling priority offset, so scoring wins the CPU
+    TRAINING_CPUS: Optional[str] = None  # CPU set for training, e.g. "2-3" (default: all)
 
     class Config:
         env_file = ".env"
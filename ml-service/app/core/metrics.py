@@ -1,5 +1,8 @@
 # Prometheus metrics for ML Service
-from prometheus_client import Counter, Histogram, Gauge
+import os
+from typing import Optional, Tuple
+from prometheus_client import Counter, Histogram, Gauge, CollectorRegistry, REGISTRY, multiprocess
+from prometheus_client.exposition import choose_encoder
 
 # Predictions counter by risk level
 PREDICTIONS_TOTAL = Counter(
@@ -25,7 +28,8 @@ FRAUD_SCORE = Histogram(
 # Model loaded status
 MODEL_LOADED = Gauge(
     'forte_model_loaded',
-    'Whether the ML model is loaded (1) or not (0)'
+    'Whether the ML model is loaded (1) or not (0)',
+    multiprocess_mode='livemin'
 )
 
 # Blocked transactions counter
@@ -43,11 +47,199 @@ PREDICTIONS_ERRORS = Counter(
 # Data drift score
 DRIFT_SCORE = Gauge(
     'forte_drift_score',
-    'Current data drift score (0-1)'
+    'Current data drift score (0-1)',
+    multiprocess_mode='livemostrecent'
 )
 
 # Current threshold
 CURRENT_THRESHOLD = Gauge(
     'forte_current_threshold',
-    'Current fraud detection threshold'
+    'Current fraud detection threshold',
+    multiprocess_mode='livemostrecent'
 )
+
+# Scoring pipeline breakdown (exemplars carry the request id)
+STAGE_LATENCY = Histogram(
+    'forte_stage_latency_seconds',
+    'Time spent in one stage of the scoring pipeline (features, lightgbm, xgboost, onnx, explain, llm, template)',
+    ['stage'],
+    buckets=[0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+)
+
+EXECUTOR_QUEUE_WAIT = Histogram(
+    'forte_executor_queue_wait_seconds',
+    'Time a scoring call waited for an executor thread or worker process',
+    ['executor'],
+    buckets=[0.0001, 0.0005, 0.001, 0.002, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0]
+)
+
+EXECUTOR_IN_FLIGHT = Gauge(
+    'forte_executor_in_flight',
+    'Scoring calls submitted to an executor and not finished (queued or running)',
+    ['executor'],
+    multiprocess_mode='livesum'
+)
+
+PREDICTIONS_IN_FLIGHT = Gauge(
+    'forte_predictions_in_flight',
+    'Predictions being computed by kind (single, batch)',
+    ['kind'],
+    multiprocess_mode='livesum'
+)
+
+# Micro-batching of concurrent /predict calls
+MICRO_BATCH_SIZE = Histogram(
+    'forte_micro_batch_size',
+    'Number of /predict requests scored together in one micro-batch',
+    buckets=[1, 2, 4, 8, 16, 32, 64, 128, 256]
+)
+
+MICRO_BATCH_QUEUE_DELAY = Histogram(
+    'forte_micro_batch_queue_delay_seconds',
+    'Time a /predict request waited in the micro-batch queue',
+    buckets=[0.0005, 0.001, 0.002, 0.005, 0.01, 0.025, 0.05, 0.1]
+)
+
+# Prediction result cache
+PREDICTION_CACHE_REQUESTS = Counter(
+    'forte_prediction_cache_requests_total',
+    'Prediction cache lookups by result (hit, miss, coalesced into an in-flight computation)',
+    ['result']
+)
+
+PREDICTION_CACHE_EVICTIONS = Counter(
+    'forte_prediction_cache_evictions_total',
+    'Prediction cache entries dropped, by reason (capacity, expired, invalidated)',
+    ['reason']
+)
+
+PREDICTION_CACHE_ENTRIES = Gauge(
+    'forte_prediction_cache_entries',
+    'Number of cached prediction results',
+    multiprocess_mode='livesum'
+)
+
+# Persistent LLM analysis cache
+AI_CACHE_REQUESTS = Counter(
+    'forte_ai_cache_requests_total',
+    'LLM analysis cache lookups by result (hit, miss)',
+    ['result']
+)
+
+# AI analyses by source
+AI_ANALYSIS_TOTAL = Counter(
+    'forte_ai_analysis_total',
+    'Analyses returned by source (llm, template, none)',
+    ['source']
+)
+
+# Deferred enrichment (background attributions + LLM analysis)
+ENRICHMENT_TOTAL = Counter(
+    'forte_enrichment_total',
+    'Deferred analyses by final status (done, failed, rejected)',
+    ['status']
+)
+
+ENRICHMENT_PENDING = Gauge(
+    'forte_enrichment_pending',
+    'Deferred analyses accepted and not yet finished',
+    multiprocess_mode='livesum'
+)
+
+ENRICHMENT_DURATION = Histogram(
+    'forte_enrichment_duration_seconds',
+    'Time to produce a deferred analysis (attributions + LLM)',
+    buckets=[0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0]
+)
+
+# LLM gateway
+LLM_REQUESTS = Counter(
+    'forte_llm_requests_total',
+    'LLM calls by result (ok, error, timeout, cancelled, rejected, breaker_open)',
+    ['result']
+)
+
+LLM_QUEUE_DEPTH = Gauge(
+    'forte_llm_queue_depth',
+    'LLM calls waiting for a concurrency slot',
+    multiprocess_mode='livesum'
+)
+
+LLM_IN_FLIGHT = Gauge(
+    'forte_llm_in_flight',
+    'LLM calls currently sent upstream',
+    multiprocess_mode='livesum'
+)
+
+LLM_UPSTREAM_LATENCY = Histogram(
+    'forte_llm_upstream_latency_seconds',
+    'Latency of upstream LLM calls by result',
+    ['result'],
+    buckets=[0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0]
+)
+
+LLM_BREAKER_STATE = Gauge(
+    'forte_llm_breaker_state',
+    'LLM circuit breaker state (0 closed, 1 open, 2 half-open)',
+    multiprocess_mode='livemax'
+)
+
+LLM_TIME_TO_FIRST_TOKEN = Histogram(
+    'forte_llm_time_to_first_token_seconds',
+    'Time from sending a streamed LLM call to its first content token',
+    buckets=[0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0]
+)
+
+# Model hot-swap
+MODEL_RELOAD_DURATION = Histogram(
+    'forte_model_reload_duration_seconds',
+    'Time to load and warm a model bundle before it is swapped in',
+    buckets=[0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0]
+)
+
+MODEL_BUNDLES = Gauge(
+    'forte_model_bundles',
+    'Model bundles in memory: the current one plus retired ones still draining requests',
+    multiprocess_mode='livemax'
+)
+
+# Warm-up and readiness
+MODEL_READY = Gauge(
+    'forte_model_ready',
+    'Whether the service has finished warming up and reports ready (1) or not (0)',
+    multiprocess_mode='livemin'
+)
+
+WARMUP_DURATION = Histogram(
+    'forte_warmup_duration_seconds',
+    'Time the serving-path warm-up took before the process reported ready',
+    buckets=[0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0]
+)
+
+# Background training jobs
+TRAINING_JOBS_TOTAL = Counter(
+    'forte_training_jobs_total',
+    'Training jobs by final status (succeeded, failed, timeout, cancelled)',
+    ['status']
+)
+
+TRAINING_JOB_DURATION = Histogram(
+    'forte_training_job_duration_seconds',
+    'Training job duration, from start to promotion or failure',
+    buckets=[60, 120, 300, 600, 1200, 1800, 3600, 7200]
+)
+
+
+def exposition(accept: Optional[str]) -> Tuple[bytes, str]:
+    """
+    /metrics body and content type. OpenMetrics when the scraper asks for it
+    (Prometheus does with exemplar storage enabled): exemplars only exist in
+    that format. Pre-forked workers are aggregated from their
+    PROMETHEUS_MULTIPROC_DIR files, which do not keep exemplars.
+    """
+    registry = REGISTRY
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    encoder, content_type = choose_encoder(accept)
+    return encoder(registry), content_type
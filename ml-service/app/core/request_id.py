@@ -0,0 +1,50 @@
+"""
+Request ids: taken from the X-Request-ID header (or generated), echoed in
+the response and kept in a context variable so metrics recorded while the
+request is handled can carry it as an exemplar.
+"""
+
+import uuid
+from contextvars import ContextVar
+from typing import Optional
+
+HEADER = "x-request-id"
+# Exemplar label sets are limited to 128 characters
+MAX_LENGTH = 64
+
+REQUEST_ID: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+
+def exemplar(request_id: Optional[str] = None) -> Optional[dict]:
+    """Exemplar labels for `request_id` (default: the current request's), None outside a request"""
+    request_id = request_id or REQUEST_ID.get()
+    return {"request_id": request_id} if request_id else None
+
+
+class RequestIdMiddleware:
+    """Pure ASGI middleware (the context variable is set in the task that runs the endpoint)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == HEADER.encode():
+                request_id = value.decode("latin-1")[:MAX_LENGTH]
+                break
+        request_id = request_id or uuid.uuid4().hex
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), (HEADER.encode(), request_id.encode("latin-1"))]
+            await send(message)
+
+        token = REQUEST_ID.set(request_id)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            REQUEST_ID.reset(token)
@@ -1,11 +1,14 @@
-from fastapi import FastAPI
+import os
+import asyncio
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
 from fastapi.responses import Response
 from app.core.config import settings
 from app.core.logging import logger
-from app.core.metrics import MODEL_LOADED, CURRENT_THRESHOLD
+from app.core.metrics import MODEL_LOADED, CURRENT_THRESHOLD, exposition
+from app.core.request_id import RequestIdMiddleware
 from app.services.model_service import model_service
+from app.prefork import PARENT_PID_ENV
 
 def create_app() -> FastAPI:
     app = FastAPI(
@@ -22,14 +25,14 @@ def create_app() -> FastAPI:
         allow_methods=["*"],
         allow_headers=["*"],
     )
+    # X-Request-ID in and out; metric exemplars carry it
+    app.add_middleware(RequestIdMiddleware)
 
-    # Prometheus metrics endpoint
+    # Prometheus metrics endpoint (pre-forked workers: aggregated over all worker processes)
     @app.get("/metrics")
-    async def metrics():
-        return Response(
-            content=generate_latest(),
-            media_type=CONTENT_TYPE_LATEST
-        )
+    async def metrics(request: Request):
+        content, content_type = exposition(request.headers.get("accept"))
+        return Response(content=content, media_type=content_type)
 
     # Include router (late import to avoid circular dependency)
     from app.api.routes import router
@@ -39,7 +42,9 @@ def create_app() -> FastAPI:
     async def startup_event():
         logger.info("Starting up application...")
         try:
-            model_service.load_models()
+            # Pre-forked workers inherit the models already loaded by the parent
+            if model_service.lgb_model is None:
+                model_service.load_models()
             MODEL_LOADED.set(1)
             # Set initial threshold metric
             if model_service.metadata:
@@ -48,6 +53,25 @@ def create_app() -> FastAPI:
             logger.error(f"Failed to load models: {e}")
             MODEL_LOADED.set(0)
             pass
+        # Warm-up, then /ready. Pre-forked workers share one listening socket, so a
+        # worker warms up before it accepts anything (the parent waits for that);
+        # a single process serves /health meanwhile and /ready answers 503
+        if model_service.bundle is not None:
+            if os.environ.get(PARENT_PID_ENV):
+                await model_service.warm_up()
+            else:
+                app.state.warmup = asyncio.create_task(model_service.warm_up())
+        # The LLM client (openai import) is created in the background, not before serving
+        from app.services.ai_service import ai_service
+        app.state.ai_warmup = asyncio.create_task(ai_service.warm())
+
+    @app.on_event("shutdown")
+    async def shutdown_event():
+        from app.services.enrichment import enrichment_service
+        from app.services.training import training_manager
+        await enrichment_service.close()
+        await training_manager.close()
+        await model_service.close()
 
     return app
 
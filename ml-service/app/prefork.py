@@ -0,0 +1,391 @@
+"""
+Pre-forked multi-worker server with copy-on-write model preload.
+
+The parent process loads the models once, binds the listening socket and
+forks SERVER_WORKERS uvicorn workers that accept on the shared socket. The
+workers inherit the loaded models copy-on-write, so RSS does not grow with
+the worker count. Each worker reports readiness over a pipe once its app has
+started. LightGBM / XGBoost run single-threaded (MODEL_THREADS=1) from the
+first prediction on, in the parent too: an OpenMP pool started by the
+parent's warm-up would be inherited by the workers without its threads.
+
+Threshold: SIGUSR1 to the parent (sent by the worker that handled
+POST /threshold) is forwarded to every worker, which re-reads the threshold
+from metadata.json unless the file already describes a newer model version.
+
+Reload: SIGHUP to the parent (sent by a worker on /reload-model or after
+/train, or by an operator; workers never load the models themselves)
+reloads the models in the parent and rolls the workers: each old worker is
+replaced by a fresh fork sharing the new models, and stopped gracefully only
+once its replacement is ready. A worker that
+owns an active training job (the job runs inside it) keeps serving the
+previous models and is replaced once the job has finished.
+
+    SERVER_WORKERS=4 python -m app.prefork
+"""
+
+import gc
+import os
+import sys
+import time
+import signal
+import select
+import socket
+import shutil
+import tempfile
+from app.core.config import settings
+from app.core.logging import logger
+
+# Set in every forked worker; tells the app where to send reload requests
+PARENT_PID_ENV = 'FORTE_PREFORK_PARENT'
+
+# Seconds a new worker gets to report readiness before it is considered failed
+READY_TIMEOUT = 60
+
+
+def notify_reload() -> bool:
+    """
+    Ask the pre-fork parent to roll all workers onto freshly loaded models.
+    False (and a no-op) outside pre-fork, where the caller reloads itself.
+    """
+    parent = os.environ.get(PARENT_PID_ENV)
+    if parent:
+        os.kill(int(parent), signal.SIGHUP)
+    return bool(parent)
+
+
+def notify_threshold():
+    """Ask the pre-fork parent to make every worker re-read the threshold (no-op otherwise)"""
+    parent = os.environ.get(PARENT_PID_ENV)
+    if parent:
+        os.kill(int(parent), signal.SIGUSR1)
+
+
+def _refresh_threshold():
+    """Re-read the threshold; a failed read is logged and the current threshold kept"""
+    from app.services.model_service import model_service
+    try:
+        model_service.refresh_threshold()
+    except Exception as e:
+        logger.error(f"Could not refresh the threshold from metadata.json: {e}")
+
+
+def _run_worker(sock: socket.socket, ready_fd: int):
+    """Body of a forked worker: serve the app on the inherited socket"""
+    import asyncio
+    import uvicorn
+    from app.main import app
+
+    class WorkerServer(uvicorn.Server):
+        async def startup(self, sockets=None):
+            # SIGUSR1 runs as a loop callback, not as a raw handler inside whatever
+            # coroutine is running; re-read once for a signal ignored before this
+            asyncio.get_running_loop().add_signal_handler(signal.SIGUSR1, _refresh_threshold)
+            _refresh_threshold()
+            await super().startup(sockets=sockets)
+            if self.started:
+                os.write(ready_fd, b'R')
+                os.close(ready_fd)
+
+    config = uvicorn.Config(app, log_level=settings.LOG_LEVEL.lower(), access_log=False)
+    WorkerServer(config).run(sockets=[sock])
+
+
+class PreforkServer:
+    def __init__(self, workers: int, host: str, port: int):
+        self.num_workers = workers
+        self.host = host
+        self.port = port
+        self.sock = None
+        self.workers = {}  # pid -> {'ready_fd': int | None, 'ready': bool, 'generation': int}
+        self.generation = 0
+        self._reload_requested = False
+        self._threshold_requested = False
+        self._stopping = False
+
+    # ---------- parent lifecycle ----------
+
+    def run(self):
+        from app.core.metrics import MODEL_LOADED
+        from app.services.model_service import model_service
+
+        if settings.INFERENCE_EXECUTOR != "thread":
+            logger.warning("INFERENCE_EXECUTOR=process is not supported with pre-forked workers, using threads")
+            settings.INFERENCE_EXECUTOR = "thread"
+        # One worker per core, and libgomp is not fork-safe: the parent (which
+        # warms the models) must never start an OpenMP thread pool that the
+        # workers would inherit without its threads
+        if settings.MODEL_THREADS > 1:
+            logger.warning(f"MODEL_THREADS={settings.MODEL_THREADS} is not supported with pre-forked workers, using 1")
+        settings.MODEL_THREADS = 1
+
+        model_service.load_models()
+        MODEL_LOADED.set(1)
+        self._fail_orphaned_jobs()
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((self.host, self.port))
+        self.sock.listen(2048)
+        self.sock.set_inheritable(True)
+        logger.info(f"Pre-fork parent {os.getpid()} listening on {self.host}:{self.port}")
+
+        signal.signal(signal.SIGHUP, lambda *_: self._request_reload())
+        signal.signal(signal.SIGUSR1, lambda *_: self._request_threshold())
+        signal.signal(signal.SIGTERM, lambda *_: self._request_stop())
+        signal.signal(signal.SIGINT, lambda *_: self._request_stop())
+
+        for _ in range(self.num_workers):
+            self.spawn()
+        self.wait_ready(list(self.workers))
+
+        try:
+            while not self._stopping:
+                if self._threshold_requested:
+                    self._threshold_requested = False
+                    self._forward_threshold()
+                if self._reload_requested:
+                    self._reload_requested = False
+                    self.reload()
+                elif any(w.get('deferred') for w in self.workers.values()):
+                    self.roll(deferred_only=True)
+                self.reap()
+                self.top_up()
+                self.poll_ready(timeout=1.0)
+        finally:
+            self.stop()
+
+    def _request_reload(self):
+        self._reload_requested = True
+
+    def _request_threshold(self):
+        self._threshold_requested = True
+
+    def _request_stop(self):
+        self._stopping = True
+
+    def _forward_threshold(self):
+        _refresh_threshold()  # future forks inherit the new value
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signal.SIGUSR1)
+            except ProcessLookupError:
+                pass
+
+    def spawn(self) -> int:
+        """Fork one worker sharing the parent's current models"""
+        gc.collect()
+        ready_r, ready_w = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            # Frozen in the worker only: the parent must still collect retired models
+            gc.freeze()  # keep the collector from writing to (and copying) shared pages
+            os.close(ready_r)
+            os.environ[PARENT_PID_ENV] = str(os.getppid())
+            # uvicorn handles SIGTERM / SIGINT with a graceful shutdown
+            signal.signal(signal.SIGHUP, signal.SIG_IGN)
+            # Until the worker's event loop takes SIGUSR1 over (WorkerServer.startup)
+            signal.signal(signal.SIGUSR1, signal.SIG_IGN)
+            for signum in (signal.SIGTERM, signal.SIGINT):
+                signal.signal(signum, signal.SIG_DFL)
+            code = 0
+            try:
+                _run_worker(self.sock, ready_w)
+            except BaseException as e:
+                logger.error(f"Worker {os.getpid()} crashed: {e}")
+                code = 1
+            finally:
+                os._exit(code)
+
+        os.close(ready_w)
+        self.workers[pid] = {'ready_fd': ready_r, 'ready': False, 'generation': self.generation}
+        logger.info(f"Spawned worker {pid} (generation {self.generation})")
+        return pid
+
+    def poll_ready(self, timeout: float):
+        """Collect readiness reports from workers that are still starting"""
+        fds = {w['ready_fd']: pid for pid, w in self.workers.items() if w['ready_fd'] is not None}
+        if not fds:
+            time.sleep(timeout)
+            return
+        try:
+            readable, _, _ = select.select(list(fds), [], [], timeout)
+        except InterruptedError:
+            return
+        for fd in readable:
+            pid = fds[fd]
+            worker = self.workers[pid]
+            worker['ready'] = os.read(fd, 1) == b'R'
+            os.close(fd)
+            worker['ready_fd'] = None
+            if worker['ready']:
+                ready = sum(w['ready'] for w in self.workers.values())
+                logger.info(f"Worker {pid} ready ({ready}/{len(self.workers)})")
+
+    def wait_ready(self, pids, timeout: float = READY_TIMEOUT) -> bool:
+        """
+        True once every worker in `pids` has reported ready; False if one of
+        them exits or the timeout passes. Other workers that exit meanwhile
+        are replaced as usual.
+        """
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            self.reap(exclude=pids)
+            pending = [pid for pid in pids if pid in self.workers and not self.workers[pid]['ready']]
+            if not pending:
+                return all(pid in self.workers for pid in pids)
+            self.poll_ready(timeout=0.5)
+        return False
+
+    def reap(self, respawn: bool = True, exclude=()):
+        """
+        Collect exited workers; replace unexpected exits of the current
+        generation, except those in `exclude` (reported by wait_ready)
+        """
+        from prometheus_client import multiprocess
+
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            worker = self.workers.pop(pid, None)
+            multiprocess.mark_process_dead(pid)
+            if worker is None:
+                continue
+            if worker['ready_fd'] is not None:
+                os.close(worker['ready_fd'])
+            current = worker['generation'] == self.generation or worker.get('deferred')
+            if respawn and not self._stopping and current and pid not in exclude:
+                logger.warning(f"Worker {pid} exited unexpectedly (status {status}), respawning")
+                self.spawn()
+
+    def top_up(self):
+        """Spawn workers until SERVER_WORKERS are running (after failed starts or replacements)"""
+        if self._stopping:
+            return
+        for _ in range(self.num_workers - len(self.workers)):
+            logger.warning(f"{len(self.workers)} of {self.num_workers} workers running, spawning one")
+            self.spawn()
+
+    def reload(self):
+        """Reload models in the parent, then replace workers one at a time"""
+        from app.services.model_service import model_service
+
+        logger.info("Reloading models in the pre-fork parent...")
+        try:
+            model_service.load_models()
+        except Exception as e:
+            logger.error(f"Reload failed, keeping current workers: {e}")
+            return
+
+        self.generation += 1
+        self.roll()
+        logger.info(f"Workers on model version {model_service.metadata['version']}")
+
+    def roll(self, deferred_only: bool = False):
+        """
+        Replace older-generation workers one at a time. Workers that own an
+        active training job are deferred (stopping one would cancel its job)
+        and replaced by a later call once the job has finished.
+        """
+        old = [pid for pid, w in self.workers.items()
+               if w['generation'] < self.generation and (w.get('deferred') or not deferred_only)]
+        if not old:
+            return
+        owners = self._job_owners()
+        for pid in old:
+            worker = self.workers.get(pid)
+            if worker is None:
+                continue
+            if pid in owners:
+                if not worker.get('deferred'):
+                    logger.info(f"Worker {pid} runs a training job, replacing it once the job ends")
+                worker['deferred'] = True
+                continue
+            worker['deferred'] = False
+            new_pid = self.spawn()
+            if not self.wait_ready([new_pid]):
+                logger.error(f"Replacement worker {new_pid} did not become ready, keeping {pid}")
+                self._discard(new_pid)
+                continue
+            if pid in self.workers:
+                os.kill(pid, signal.SIGTERM)
+
+    def _discard(self, pid: int):
+        """Stop a worker that failed to start (reap() then just collects it)"""
+        worker = self.workers.pop(pid, None)
+        if worker is None:
+            return
+        if worker['ready_fd'] is not None:
+            os.close(worker['ready_fd'])
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+    @staticmethod
+    def _job_owners() -> set:
+        """Workers running a training job"""
+        from app.services.training import training_manager
+        try:
+            return training_manager.store.active_owners()
+        except Exception as e:
+            logger.warning(f"Could not read training jobs, rolling all workers: {e}")
+            return set()
+
+    @staticmethod
+    def _fail_orphaned_jobs():
+        """Jobs still active from a previous run have lost the worker that ran them"""
+        from app.services.training import training_manager
+        try:
+            failed = training_manager.store.fail_active("Service restarted during training")
+        except Exception as e:
+            logger.warning(f"Could not check for orphaned training jobs: {e}")
+            return
+        if failed:
+            logger.warning(f"Marked {failed} training job(s) from a previous run as failed")
+
+    def stop(self):
+        logger.info("Stopping pre-fork workers...")
+        self._stopping = True
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + 30
+        while self.workers and time.monotonic() < deadline:
+            self.reap(respawn=False)
+            time.sleep(0.1)
+        for pid in list(self.workers):
+            os.kill(pid, signal.SIGKILL)
+        self.reap(respawn=False)
+        if self.sock is not None:
+            self.sock.close()
+
+
+def main():
+    # Workers share one /metrics view through prometheus_client's multiprocess
+    # mode, which must be configured before prometheus_client is imported
+    metrics_dir = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    own_metrics_dir = metrics_dir is None
+    if own_metrics_dir:
+        metrics_dir = os.environ['PROMETHEUS_MULTIPROC_DIR'] = tempfile.mkdtemp(prefix='forte-metrics-')
+    else:
+        # Stale files from a previous run would be merged into /metrics
+        for name in os.listdir(metrics_dir):
+            os.remove(os.path.join(metrics_dir, name))
+
+    workers = settings.SERVER_WORKERS or os.cpu_count() or 1
+    try:
+        PreforkServer(workers, settings.HOST, settings.PORT).run()
+    finally:
+        if own_metrics_dir:
+            shutil.rmtree(metrics_dir, ignore_errors=True)
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,17 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Literal
+
+# Уровень объяснения предсказания:
+#   none - только вероятность, атрибуции не считаются
+#   topk - только топ факторов риска
+#   full - топ факторов и shap_values по всем признакам
+ExplainLevel = Literal["none", "topk", "full"]
+
+# Источник AI анализа:
+#   llm      - только LLM (None, если LLM недоступна)
+#   template - локальный шаблонный движок, без LLM
+#   auto     - LLM, при отказе или медленном ответе - шаблонный движок
+AnalysisMode = Literal["llm", "template", "auto"]
 
 class TransactionFeatures(BaseModel):
     """Признаки транзакции для предсказания"""
@@ -40,4 +52,21 @@ class PredictionResponse(BaseModel):
     aml_analysis: Optional[str] = None
     recommendation: Optional[str] = None
     analysis_fingerprint: Optional[str] = None
+    analysis_source: Optional[str] = None  # llm | template
     top_risk_factors: List[Dict[str, Any]]
+    analysis_id: Optional[str] = None  # отложенный анализ: GET /analysis/{analysis_id}
+
+
+class AnalysisResult(BaseModel):
+    """Результат отложенного анализа (SHAP + AI)"""
+    analysis_id: str
+    status: str  # pending | done | failed | rejected
+    created_at: float
+    top_risk_factors: Optional[List[Dict[str, Any]]] = None
+    shap_values: Optional[Dict[str, float]] = None
+    ai_analysis: Optional[str] = None
+    aml_analysis: Optional[str] = None
+    recommendation: Optional[str] = None
+    analysis_fingerprint: Optional[str] = None
+    analysis_source: Optional[str] = None
+    error: Optional[str] = None
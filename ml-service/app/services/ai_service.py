@@ -1,17 +1,339 @@
-from openai import AsyncOpenAI
+import re
+import json
+import time
+import asyncio
 import hashlib
-from typing import List, Dict, Any, Tuple
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import List, Dict, Any, Optional, Tuple, AsyncIterator, Callable
 from app.core.config import settings
 from app.core.logging import logger
+from app.core.metrics import (
+    LLM_REQUESTS, LLM_QUEUE_DEPTH, LLM_IN_FLIGHT, LLM_UPSTREAM_LATENCY, LLM_BREAKER_STATE,
+    LLM_TIME_TO_FIRST_TOKEN, AI_ANALYSIS_TOTAL
+)
 from app.schemas.transaction import TransactionFeatures
+from app.services.analysis_cache import AnalysisCache
+from app.services.template_analysis import template_analyzer
+from app.services.stages import observe_stage
+
+FRAUD_SYSTEM_PROMPT = "Ты - эксперт по антифроду в мобильном банкинге. Анализируй транзакции кратко и точно."
+AML_SYSTEM_PROMPT = "Ты - эксперт по AML (Anti-Money Laundering). Выявляй схемы отмывания денег."
+BATCH_SYSTEM_PROMPT = (
+    "Ты - эксперт по антифроду и AML в мобильном банкинге. "
+    "Анализируй транзакции кратко и точно, отвечай строго в формате JSON."
+)
+
+# Risk levels in increasing order (batch analysis covers rows at or above a minimum level)
+RISK_LEVELS = ("LOW", "MEDIUM", "HIGH", "CRITICAL")
+
+# Fields of a finished single-transaction analysis
+_ANALYSIS_FIELDS = ("ai_analysis", "aml_analysis", "recommendation", "analysis_fingerprint")
+
+# Output tokens budgeted per transaction of a batch prompt
+_BATCH_TOKENS_PER_TRANSACTION = 200
+
+# Circuit breaker states (also the value of the forte_llm_breaker_state gauge)
+BREAKER_CLOSED, BREAKER_OPEN, BREAKER_HALF_OPEN = 0, 1, 2
+_BREAKER_NAMES = {BREAKER_CLOSED: "closed", BREAKER_OPEN: "open", BREAKER_HALF_OPEN: "half_open"}
+
+
+class LLMUnavailable(Exception):
+    """The gateway refused the call (queue full or circuit open)"""
+
+
+class LLMGateway:
+    """
+    Admission control in front of the chat completions API.
+
+    - At most `max_concurrency` calls are sent upstream at once; up to
+      `max_queue` more may wait for a slot, further calls are rejected
+      immediately instead of piling up on the event loop.
+    - Every call has a deadline of `timeout` seconds from submission,
+      covering both the wait for a slot and the upstream call.
+    - A circuit breaker watches the last `breaker_window` upstream outcomes
+      (errors and timeouts of calls actually sent). Once at
+      least `breaker_min_calls` are recorded and the error rate reaches
+      `breaker_error_rate`, calls are rejected for `breaker_cooldown`
+      seconds; then a single probe call decides whether to close it again.
+
+    Rejections raise LLMUnavailable; callers degrade to "no analysis".
+
+    The API client comes from `client_factory` on first use, off the event
+    loop and before the call's deadline starts: importing openai costs ~0.4s
+    that no replica should pay before it is ready.
+    """
+
+    def __init__(self, client_factory: Callable[[], Any], max_concurrency: int = 32, max_queue: int = 256,
+                 timeout: float = 10.0, breaker_window: int = 50, breaker_error_rate: float = 0.5,
+                 breaker_min_calls: int = 10, breaker_cooldown: float = 30.0):
+        self.client_factory = client_factory
+        self.client = None
+        self._creating: Optional[asyncio.Future] = None
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.breaker_error_rate = breaker_error_rate
+        self.breaker_min_calls = breaker_min_calls
+        self.breaker_cooldown = breaker_cooldown
+        self._outcomes = deque(maxlen=breaker_window)  # True = error
+        self._state = BREAKER_CLOSED
+        self._opened_at = 0.0
+        self._probing = False
+        self._waiting = 0
+        self._running = 0
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._loop = None
+        LLM_BREAKER_STATE.set(BREAKER_CLOSED)
+
+    @property
+    def state(self) -> str:
+        return _BREAKER_NAMES[self._state]
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._slots is None or self._loop is not loop:
+            self._slots, self._loop = asyncio.Semaphore(self.max_concurrency), loop
+        return self._slots
+
+    async def get_client(self):
+        """The API client, created once by client_factory in a worker thread"""
+        if self.client is None:
+            loop = asyncio.get_running_loop()
+            if self._creating is None or self._creating.get_loop() is not loop:
+                self._creating = asyncio.ensure_future(asyncio.to_thread(self.client_factory))
+            creating = self._creating
+            try:
+                self.client = await asyncio.shield(creating)
+            except Exception:
+                if self._creating is creating:
+                    self._creating = None
+                raise
+        return self.client
+
+    def _set_state(self, state: int):
+        if state != self._state:
+            logger.warning(f"LLM circuit breaker {_BREAKER_NAMES[self._state]} -> {_BREAKER_NAMES[state]}")
+            self._state = state
+            LLM_BREAKER_STATE.set(state)
+
+    def _admit(self) -> bool:
+        """Whether the breaker lets a call through (claims the probe when half-open)"""
+        if self._state == BREAKER_OPEN:
+            if time.monotonic() - self._opened_at < self.breaker_cooldown:
+                return False
+            self._set_state(BREAKER_HALF_OPEN)
+        if self._state == BREAKER_HALF_OPEN:
+            if self._probing:
+                return False
+            self._probing = True
+        return True
+
+    def _record(self, error: bool):
+        if self._state == BREAKER_HALF_OPEN:
+            self._probing = False
+            self._outcomes.clear()
+            if error:
+                self._opened_at = time.monotonic()
+                self._set_state(BREAKER_OPEN)
+            else:
+                self._set_state(BREAKER_CLOSED)
+            return
+        self._outcomes.append(error)
+        if (self._state == BREAKER_CLOSED and len(self._outcomes) >= self.breaker_min_calls
+                and sum(self._outcomes) >= self.breaker_error_rate * len(self._outcomes)):
+            self._opened_at = time.monotonic()
+            self._set_state(BREAKER_OPEN)
+
+    @asynccontextmanager
+    async def _slot(self, timeout: float) -> AsyncIterator[float]:
+        """
+        Admission, wait for a concurrency slot and upstream accounting around
+        one call. Yields the call's deadline (time.monotonic() based).
+        """
+        if not self._admit():
+            LLM_REQUESTS.labels(result="breaker_open").inc()
+            raise LLMUnavailable("LLM circuit breaker is open")
+        if self._waiting + self._running >= self.max_concurrency + self.max_queue:
+            if self._state == BREAKER_HALF_OPEN:
+                self._probing = False
+            LLM_REQUESTS.labels(result="rejected").inc()
+            raise LLMUnavailable("LLM queue is full")
+
+        deadline = time.monotonic() + timeout
+        slots = self._semaphore()
+        self._waiting += 1
+        LLM_QUEUE_DEPTH.inc()
+        acquired = False
+        try:
+            await asyncio.wait_for(slots.acquire(), timeout=timeout)
+            acquired = True
+        except asyncio.TimeoutError:
+            # Local overload, not an upstream failure: not counted by the breaker
+            LLM_REQUESTS.labels(result="timeout").inc()
+            raise
+        finally:
+            self._waiting -= 1
+            LLM_QUEUE_DEPTH.dec()
+            if not acquired and self._state == BREAKER_HALF_OPEN:
+                self._probing = False
+
+        self._running += 1
+        LLM_IN_FLIGHT.inc()
+        start = time.monotonic()
+        result = "error"
+        try:
+            yield deadline
+            result = "ok"
+        except asyncio.TimeoutError:
+            result = "timeout"
+            raise
+        except (asyncio.CancelledError, GeneratorExit):
+            # The caller went away: says nothing about upstream health
+            result = "cancelled"
+            raise
+        finally:
+            slots.release()
+            self._running -= 1
+            LLM_IN_FLIGHT.dec()
+            LLM_UPSTREAM_LATENCY.labels(result=result).observe(time.monotonic() - start)
+            LLM_REQUESTS.labels(result=result).inc()
+            if result != "cancelled":
+                self._record(error=result != "ok")
+            elif self._state == BREAKER_HALF_OPEN:
+                self._probing = False
+
+    async def complete(self, request: Dict[str, Any], timeout: Optional[float] = None) -> str:
+        """
+        Chat completion content for `request` (kwargs of chat.completions.create).
+        `timeout` overrides the default deadline for long calls.
+        """
+        timeout = timeout or self.timeout
+        client = await self.get_client()
+        async with self._slot(timeout) as deadline:
+            response = await asyncio.wait_for(
+                client.chat.completions.create(**request, timeout=timeout),
+                timeout=max(deadline - time.monotonic(), 0.0)
+            )
+            return response.choices[0].message.content
+
+    async def stream(self, request: Dict[str, Any], timeout: Optional[float] = None) -> AsyncIterator[str]:
+        """
+        Streamed chat completion: yields content deltas as they arrive. Same
+        admission, slot and breaker accounting as complete(); the deadline
+        covers the whole stream. Closing the iterator early counts as cancelled.
+        """
+        timeout = timeout or self.timeout
+        client = await self.get_client()
+        async with self._slot(timeout) as deadline:
+            def remaining() -> float:
+                return max(deadline - time.monotonic(), 0.0)
+
+            start = time.monotonic()
+            response = await asyncio.wait_for(
+                client.chat.completions.create(**request, stream=True, timeout=timeout),
+                timeout=remaining()
+            )
+            chunks = response.__aiter__()
+            first = True
+            try:
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), timeout=remaining())
+                    except StopAsyncIteration:
+                        break
+                    # wait_for (3.11) drops a cancel that races with a finished chunk
+                    if asyncio.current_task().cancelling():
+                        raise asyncio.CancelledError
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if delta:
+                        if first:
+                            LLM_TIME_TO_FIRST_TOKEN.observe(time.monotonic() - start)
+                            first = False
+                        yield delta
+            finally:
+                await response.close()
+
+
+def _openai_client():
+    from openai import AsyncOpenAI
+    # Deadlines are enforced by the gateway; the client must not retry past them
+    return AsyncOpenAI(
+        api_key=settings.OPENAI_API_KEY,
+        base_url=settings.OPENAI_BASE_URL,
+        timeout=settings.LLM_TIMEOUT_SECONDS,
+        max_retries=0
+    )
+
 
 class AIService:
     def __init__(self):
-        self.client = None
+        self.gateway = None
         if settings.OPENAI_API_KEY:
-            self.client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+            self.gateway = LLMGateway(
+                _openai_client,
+                max_concurrency=settings.LLM_MAX_CONCURRENCY,
+                max_queue=settings.LLM_MAX_QUEUE,
+                timeout=settings.LLM_TIMEOUT_SECONDS,
+                breaker_window=settings.LLM_BREAKER_WINDOW,
+                breaker_error_rate=settings.LLM_BREAKER_ERROR_RATE,
+                breaker_min_calls=settings.LLM_BREAKER_MIN_CALLS,
+                breaker_cooldown=settings.LLM_BREAKER_COOLDOWN_SECONDS
+            )
         else:
-            logger.warning("OPENAI_API_KEY not found. AI analysis will be disabled.")
+            logger.warning("OPENAI_API_KEY not found. LLM analysis will be disabled.")
+
+        self.cache = None
+        if settings.AI_CACHE_ENABLED:
+            self.cache = AnalysisCache(
+                settings.AI_CACHE_PATH,
+                ttl_seconds=settings.AI_CACHE_TTL_SECONDS,
+                max_entries=settings.AI_CACHE_MAX_ENTRIES
+            )
+
+    async def warm(self):
+        """Create the LLM client now rather than on the first analysis (no-op without an API key)"""
+        if self.gateway:
+            try:
+                await self.gateway.get_client()
+            except Exception as e:
+                logger.error(f"LLM client initialisation failed: {e}")
+
+    async def analyze(
+        self,
+        transaction: TransactionFeatures,
+        probability: float,
+        risk_level: str,
+        top_factors: List[Dict[str, Any]],
+        mode: Optional[str] = None
+    ) -> Dict[str, Optional[str]]:
+        """
+        ai_analysis, aml_analysis, recommendation, analysis_fingerprint and
+        analysis_source of one transaction. `mode` (default AI_ANALYSIS_MODE):
+        llm asks the LLM only, template uses the template engine only, auto
+        asks the LLM and falls back to the template engine when there is no
+        answer (no API key, breaker open, queue full, error, timeout) or it
+        misses AI_FALLBACK_BUDGET_SECONDS.
+        """
+        mode = mode or settings.AI_ANALYSIS_MODE
+        result = (None,) * 4
+        if mode != "template" and self.gateway:
+            budget = settings.AI_FALLBACK_BUDGET_SECONDS if mode == "auto" else None
+            started = time.perf_counter()
+            try:
+                result = await asyncio.wait_for(
+                    self.analyze_transaction(transaction, probability, risk_level, top_factors), budget
+                )
+            except asyncio.TimeoutError:
+                logger.debug(f"AI analysis missed the {budget}s budget, using the template engine")
+            observe_stage("llm", time.perf_counter() - started)
+
+        source = "llm" if result[0] is not None else None
+        if source is None and mode != "llm":
+            result = self._template_analysis(transaction, probability, risk_level, top_factors)
+            source = "template"
+        AI_ANALYSIS_TOTAL.labels(source=source or "none").inc()
+        return {**dict(zip(_ANALYSIS_FIELDS, result)), "analysis_source": source}
 
     async def analyze_transaction(
         self,
@@ -21,55 +343,323 @@ class AIService:
         top_factors: List[Dict[str, Any]]
     ) -> Tuple[str, str, str, str]:
         """Get AI analysis for the transaction"""
-        if not self.client:
+        if not self.gateway:
             return None, None, None, None
 
         try:
-            fraud_prompt = self._build_fraud_prompt(transaction, probability, risk_level, top_factors)
-            aml_prompt = self._build_aml_prompt(transaction, risk_level)
+            fraud_request, aml_request = self._analysis_requests(transaction, probability, risk_level, top_factors)
 
             # Run requests in parallel
-            import asyncio
-            fraud_response, aml_response = await asyncio.gather(
-                self.client.chat.completions.create(
-                    model=settings.OPENAI_MODEL_FRAUD,
-                    messages=[
-                        {"role": "system", "content": "Ты - эксперт по антифроду в мобильном банкинге. Анализируй транзакции кратко и точно."},
-                        {"role": "user", "content": fraud_prompt}
-                    ],
-                    max_tokens=500,
-                    temperature=0.3
-                ),
-                self.client.chat.completions.create(
-                    model=settings.OPENAI_MODEL_AML,
-                    messages=[
-                        {"role": "system", "content": "Ты - эксперт по AML (Anti-Money Laundering). Выявляй схемы отмывания денег."},
-                        {"role": "user", "content": aml_prompt}
-                    ],
-                    max_tokens=600,
-                    temperature=0.3
-                )
+            fraud_analysis, aml_analysis = await asyncio.gather(
+                self._complete(fraud_request),
+                self._complete(aml_request)
             )
+            return self._parse_analysis(transaction, probability, risk_level, fraud_analysis, aml_analysis)
 
-            fraud_analysis = fraud_response.choices[0].message.content
-            aml_analysis = aml_response.choices[0].message.content
+        except LLMUnavailable as e:
+            logger.debug(f"AI analysis skipped: {e}")
+            return None, None, None, None
+        except asyncio.TimeoutError:
+            logger.warning(f"AI analysis timed out after {settings.LLM_TIMEOUT_SECONDS}s")
+            return None, None, None, None
+        except Exception as e:
+            logger.error(f"Error in AI analysis: {e}")
+            return None, None, None, None
 
-            # Parse fraud analysis
-            parts = fraud_analysis.split("**Рекомендация")
-            ai_analysis = parts[0].replace("**Краткий анализ**", "").strip()
-            recommendation = ""
-            if len(parts) > 1:
-                recommendation = parts[1].replace(":**", "").replace("**:", "").strip()
+    async def stream_analysis(
+        self,
+        transaction: TransactionFeatures,
+        probability: float,
+        risk_level: str,
+        top_factors: List[Dict[str, Any]],
+        mode: Optional[str] = None
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Fraud and AML analyses streamed as they are generated, as (event, data)
+        pairs: ("fraud", delta) and ("aml", delta) interleaved in arrival order,
+        ("error", {"analysis", "detail"}) if one of them fails, then ("done",
+        {ai_analysis, aml_analysis, recommendation, analysis_fingerprint,
+        analysis_source}). Both use the same requests as analyze_transaction:
+        a cached analysis is sent as one delta, a finished stream is written
+        to the cache. `mode` as in analyze(): in auto mode a failed analysis
+        is replaced by the template engine's text, sent after its error event.
+        """
+        mode = mode or settings.AI_ANALYSIS_MODE
+        if mode == "template" or not self.gateway:
+            result = (None,) * 4
+            if mode != "llm":
+                result = self._template_analysis(transaction, probability, risk_level, top_factors)
+                yield "fraud", template_analyzer.as_fraud_answer(result[0], result[2])
+                yield "aml", result[1]
+            source = "template" if mode != "llm" else None
+            AI_ANALYSIS_TOTAL.labels(source=source or "none").inc()
+            yield "done", {**dict(zip(_ANALYSIS_FIELDS, result)), "analysis_source": source}
+            return
 
-            # Generate fingerprint
-            fingerprint_data = f"{transaction.amount}_{transaction.hour}_{probability}_{risk_level}_{ai_analysis}_{aml_analysis}"
-            fingerprint = hashlib.sha256(fingerprint_data.encode()).hexdigest()[:16]
+        fraud_request, aml_request = self._analysis_requests(transaction, probability, risk_level, top_factors)
+        events: asyncio.Queue = asyncio.Queue()
+        texts: Dict[str, Optional[str]] = {}
+        templated = set()
 
-            return ai_analysis, aml_analysis, recommendation, fingerprint
+        def fallback(name: str, detail: str):
+            events.put_nowait(("error", {"analysis": name, "detail": detail}))
+            if mode == "auto":
+                ai_analysis, aml_analysis, recommendation = template_analyzer.analyze(
+                    transaction, probability, risk_level, top_factors
+                )
+                texts[name] = (template_analyzer.as_fraud_answer(ai_analysis, recommendation)
+                               if name == "fraud" else aml_analysis)
+                templated.add(name)
+                events.put_nowait((name, texts[name]))
 
-        except Exception as e:
-            logger.error(f"Error in AI analysis: {e}")
-            return None, None, None, None
+        async def produce(name: str, request: Dict[str, Any]):
+            try:
+                texts[name] = await self._stream_complete(request, lambda delta: events.put_nowait((name, delta)))
+            except LLMUnavailable as e:
+                fallback(name, str(e))
+            except asyncio.TimeoutError:
+                fallback(name, "LLM call timed out")
+            except Exception as e:
+                logger.error(f"Error in streamed {name} analysis: {e!r}")
+                fallback(name, "LLM call failed")
+            finally:
+                events.put_nowait(None)
+
+        producers = [asyncio.create_task(produce("fraud", fraud_request)),
+                     asyncio.create_task(produce("aml", aml_request))]
+        try:
+            finished = 0
+            while finished < len(producers):
+                event = await events.get()
+                if event is None:
+                    finished += 1
+                else:
+                    yield event
+        finally:
+            # No-op when both finished; stops the upstream streams if the consumer left early
+            for task in producers:
+                task.cancel()
+            await asyncio.gather(*producers, return_exceptions=True)
+
+        if texts.get("fraud") is None and texts.get("aml") is None:
+            result, source = (None,) * 4, None
+        else:
+            result = self._parse_analysis(transaction, probability, risk_level,
+                                          texts.get("fraud") or "", texts.get("aml"))
+            source = "template" if templated else "llm"
+        AI_ANALYSIS_TOTAL.labels(source=source or "none").inc()
+        yield "done", {**dict(zip(_ANALYSIS_FIELDS, result)), "analysis_source": source}
+
+    async def analyze_batch(
+        self,
+        transactions: List[TransactionFeatures],
+        probabilities: List[float],
+        risk_levels: List[str],
+        top_factors: List[List[Dict[str, Any]]],
+        min_risk: str = "MEDIUM",
+        mode: Optional[str] = None
+    ) -> List[Optional[Dict[str, str]]]:
+        """
+        AI analysis for the rows of a batch at or above `min_risk`. Flagged
+        rows are packed AI_BATCH_CHUNK_SIZE per prompt that asks for one JSON
+        verdict per transaction; at most AI_BATCH_MAX_PARALLEL chunks run at
+        once. Returns one {ai_analysis, aml_analysis, recommendation,
+        analysis_source} per row, None for rows that were not flagged or got
+        no analysis. `mode` as in analyze(): in auto mode rows whose chunk
+        failed get the template engine's analysis.
+        """
+        mode = mode or settings.AI_ANALYSIS_MODE
+        results: List[Optional[Dict[str, str]]] = [None] * len(transactions)
+        min_rank = RISK_LEVELS.index(min_risk)
+        flagged = [i for i, level in enumerate(risk_levels) if RISK_LEVELS.index(level) >= min_rank]
+        if mode != "template" and self.gateway:
+            await self._analyze_chunks(transactions, probabilities, risk_levels, top_factors, flagged, results)
+
+        for row in flagged:
+            if results[row] is None and mode != "llm":
+                ai_analysis, aml_analysis, recommendation = template_analyzer.analyze(
+                    transactions[row], probabilities[row], risk_levels[row], top_factors[row]
+                )
+                results[row] = {
+                    "ai_analysis": ai_analysis,
+                    "aml_analysis": aml_analysis,
+                    "recommendation": recommendation,
+                    "analysis_source": "template"
+                }
+            AI_ANALYSIS_TOTAL.labels(source=results[row]["analysis_source"] if results[row] else "none").inc()
+        return results
+
+    async def _analyze_chunks(self, transactions: List[TransactionFeatures], probabilities: List[float],
+                              risk_levels: List[str], top_factors: List[List[Dict[str, Any]]],
+                              flagged: List[int], results: List[Optional[Dict[str, str]]]):
+        """LLM verdicts for the flagged rows, written into `results` (rows of failed chunks stay None)"""
+        chunk_size = settings.AI_BATCH_CHUNK_SIZE
+        chunks = [flagged[i:i + chunk_size] for i in range(0, len(flagged), chunk_size)]
+        parallel = asyncio.Semaphore(settings.AI_BATCH_MAX_PARALLEL)
+
+        async def analyze_chunk(rows: List[int]):
+            request = {
+                "model": settings.OPENAI_MODEL_AML,
+                "messages": [
+                    {"role": "system", "content": BATCH_SYSTEM_PROMPT},
+                    {"role": "user", "content": self._build_batch_prompt(
+                        [(transactions[i], probabilities[i], risk_levels[i], top_factors[i]) for i in rows]
+                    )}
+                ],
+                "response_format": {"type": "json_object"},
+                "max_tokens": _BATCH_TOKENS_PER_TRANSACTION * len(rows),
+                "temperature": 0.3
+            }
+            async with parallel:
+                try:
+                    content = await self._complete(request, timeout=settings.AI_BATCH_TIMEOUT_SECONDS)
+                    verdicts = self._parse_batch_verdicts(content)
+                except LLMUnavailable as e:
+                    logger.debug(f"Batch AI analysis of {len(rows)} rows skipped: {e}")
+                    return
+                except Exception as e:
+                    logger.error(f"Batch AI analysis of {len(rows)} rows failed: {e!r}")
+                    return
+            for position, row in enumerate(rows, start=1):
+                verdict = verdicts.get(position)
+                if verdict:
+                    results[row] = {
+                        "ai_analysis": verdict.get("analysis"),
+                        "aml_analysis": verdict.get("aml"),
+                        "recommendation": verdict.get("recommendation"),
+                        "analysis_source": "llm"
+                    }
+
+        await asyncio.gather(*(analyze_chunk(rows) for rows in chunks))
+
+    @staticmethod
+    def _parse_batch_verdicts(content: str) -> Dict[int, Dict[str, str]]:
+        """
+        {transaction number: verdict} from a batch answer ({"results": [...]},
+        fences tolerated). A verdict with a field that is neither a string nor
+        missing is dropped, so its row gets the fallback instead.
+        """
+        match = re.search(r"\{.*\}", content or "", flags=re.S)
+        if match is None:
+            raise ValueError("No JSON object in batch analysis answer")
+        verdicts = {}
+        for item in json.loads(match.group(0)).get("results", []):
+            try:
+                verdict = {k: item.get(k) for k in ("analysis", "aml", "recommendation")}
+                number = int(item["id"])
+            except (AttributeError, KeyError, TypeError, ValueError):
+                continue
+            if all(value is None or isinstance(value, str) for value in verdict.values()):
+                verdicts[number] = verdict
+            else:
+                logger.warning(f"Batch analysis verdict #{number} has non-string fields, dropped")
+        return verdicts
+
+    async def _complete(self, request: Dict[str, Any], timeout: Optional[float] = None) -> str:
+        """Chat completion content, served from the analysis cache when the same request was seen"""
+        key = None
+        if self.cache is not None:
+            key = AnalysisCache.key(request)
+            cached = await self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        content = await self.gateway.complete(request, timeout=timeout)
+        if key is not None and content:
+            await self.cache.put(key, content)
+        return content
+
+    async def _stream_complete(self, request: Dict[str, Any], on_delta) -> str:
+        """_complete with the content passed to on_delta as it streams in"""
+        key = None
+        if self.cache is not None:
+            key = AnalysisCache.key(request)
+            cached = await self.cache.get(key)
+            if cached is not None:
+                on_delta(cached)
+                return cached
+
+        parts = []
+        async for delta in self.gateway.stream(request):
+            parts.append(delta)
+            on_delta(delta)
+        content = "".join(parts)
+        if key is not None and content:
+            await self.cache.put(key, content)
+        return content
+
+    def _analysis_requests(self, transaction: TransactionFeatures, probability: float, risk_level: str,
+                           top_factors: List[Dict[str, Any]]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """
+        Chat completion kwargs of the fraud and AML analyses of one transaction.
+        Bucketing only applies to the fraud prompt: the AML analysis looks for
+        amounts just below reporting thresholds, which rounding would erase.
+        """
+        t, prob, factors = transaction, probability, top_factors
+        if settings.AI_CACHE_BUCKETING:
+            t, prob, factors = self._bucketed(transaction, probability, top_factors)
+
+        fraud_request = {
+            "model": settings.OPENAI_MODEL_FRAUD,
+            "messages": [
+                {"role": "system", "content": FRAUD_SYSTEM_PROMPT},
+                {"role": "user", "content": self._build_fraud_prompt(t, prob, risk_level, factors)}
+            ],
+            "max_tokens": 500,
+            "temperature": 0.3
+        }
+        aml_request = {
+            "model": settings.OPENAI_MODEL_AML,
+            "messages": [
+                {"role": "system", "content": AML_SYSTEM_PROMPT},
+                {"role": "user", "content": self._build_aml_prompt(transaction, risk_level)}
+            ],
+            "max_tokens": 600,
+            "temperature": 0.3
+        }
+        return fraud_request, aml_request
+
+    @staticmethod
+    def _parse_analysis(transaction: TransactionFeatures, probability: float, risk_level: str,
+                        fraud_analysis: str, aml_analysis: Optional[str]) -> Tuple[str, str, str, str]:
+        """(ai_analysis, aml_analysis, recommendation, fingerprint) from the two answers"""
+        # Parse fraud analysis
+        parts = fraud_analysis.split("**Рекомендация")
+        ai_analysis = parts[0].replace("**Краткий анализ**", "").strip()
+        recommendation = ""
+        if len(parts) > 1:
+            recommendation = parts[1].replace(":**", "").replace("**:", "").strip()
+
+        fingerprint = AIService._fingerprint(transaction, probability, risk_level, ai_analysis, aml_analysis)
+        return ai_analysis, aml_analysis, recommendation, fingerprint
+
+    @staticmethod
+    def _fingerprint(transaction: TransactionFeatures, probability: float, risk_level: str,
+                     ai_analysis: Optional[str], aml_analysis: Optional[str]) -> str:
+        fingerprint_data = f"{transaction.amount}_{transaction.hour}_{probability}_{risk_level}_{ai_analysis}_{aml_analysis}"
+        return hashlib.sha256(fingerprint_data.encode()).hexdigest()[:16]
+
+    def _template_analysis(self, transaction: TransactionFeatures, probability: float, risk_level: str,
+                           top_factors: List[Dict[str, Any]]) -> Tuple[str, str, str, str]:
+        """analyze_transaction's tuple from the template engine"""
+        started = time.perf_counter()
+        ai_analysis, aml_analysis, recommendation = template_analyzer.analyze(
+            transaction, probability, risk_level, top_factors
+        )
+        fingerprint = self._fingerprint(transaction, probability, risk_level, ai_analysis, aml_analysis)
+        observe_stage("template", time.perf_counter() - started)
+        return ai_analysis, aml_analysis, recommendation, fingerprint
+
+    @staticmethod
+    def _bucketed(t: TransactionFeatures, prob: float, factors: List[Dict]) -> Tuple[TransactionFeatures, float, List[Dict]]:
+        """
+        Coarsen the continuous values that reach the fraud prompt (amount to 2
+        significant digits, probability to 1%, factor impacts to 0.01), so
+        similar transactions produce identical, cacheable prompts.
+        """
+        t = t.model_copy(update={"amount": float(f"{t.amount:.2g}")})
+        factors = [{**f, "impact": round(f["impact"], 2)} for f in factors[:5]]
+        return t, round(prob, 2), factors
 
     def _build_fraud_prompt(self, t: TransactionFeatures, prob: float, risk: str, factors: List[Dict]) -> str:
         factors_str = "\n".join([f"- {f['feature']}: {f['impact']:.3f}" for f in factors[:5]])
@@ -128,4 +718,27 @@ AML_SCORE: [уровень]
 - [действие 1]
 - [действие 2]"""
 
+    def _build_batch_prompt(self, items: List[Tuple[TransactionFeatures, float, str, List[Dict]]]) -> str:
+        blocks = []
+        for number, (t, prob, risk, factors) in enumerate(items, start=1):
+            factors_str = ", ".join(f"{f['feature']} ({f['impact']:+.3f})" for f in factors[:3])
+            blocks.append(f"""Транзакция #{number}:
+- Сумма: {t.amount} тенге
+- Время: {t.hour}:00, день недели: {t.day_of_week}
+- Направление: {t.direction}
+- Входы за 7 / 30 дней: {t.logins_last_7_days} / {t.logins_last_30_days}
+- Изменения устройств / ОС за месяц: {t.monthly_phone_model_changes} / {t.monthly_os_changes}
+- Вероятность мошенничества: {prob:.1%}, уровень риска: {risk}
+- Топ факторы риска: {factors_str or "нет данных"}""")
+
+        transactions_str = "\n\n".join(blocks)
+        return f"""Проанализируй транзакции, которые ML-модель Forte.AI отметила как рискованные.
+
+{transactions_str}
+
+Для каждой транзакции верни объект:
+{{"id": <номер транзакции>, "analysis": "<почему такой уровень риска, 1-2 предложения>", "aml": "<AML риск LOW/MEDIUM/HIGH/CRITICAL и признаки отмывания, 1-2 предложения>", "recommendation": "<что должен сделать аналитик, 1 предложение>"}}
+
+Ответ - только JSON вида {{"results": [...]}} с объектом для каждой транзакции. Отвечай на русском языке."""
+
 ai_service = AIService()
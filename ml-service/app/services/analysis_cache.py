@@ -0,0 +1,119 @@
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import hashlib
+import threading
+from pathlib import Path
+from typing import Any, Optional
+from app.core.logging import logger
+from app.core.metrics import AI_CACHE_REQUESTS
+
+# Eviction (expired rows, then the oldest rows over max_entries) runs every N writes per process
+_EVICT_EVERY = 100
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS analysis (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS analysis_created_at ON analysis (created_at);
+"""
+
+
+def open_shared_db(path: Path, schema: str) -> sqlite3.Connection:
+    """
+    Open a SQLite database shared by the processes on this node: WAL mode
+    (readers never block on the writer), autocommit, usable from any thread.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(schema)
+    return conn
+
+
+class AnalysisCache:
+    """
+    Disk-backed cache of LLM analyses, keyed by a hash of the exact chat
+    completion requests (model, prompts, sampling parameters).
+
+    Backed by SQLite in WAL mode, so it survives restarts and is shared by all
+    worker processes on the node that point at the same file; readers never
+    block on a writer. Entries live for `ttl_seconds`; beyond `max_entries`
+    the oldest are evicted. SQLite errors are logged and treated as misses,
+    the cache never fails an analysis.
+    """
+
+    def __init__(self, path: Path, ttl_seconds: float = 7 * 24 * 3600, max_entries: int = 100000):
+        self.path = Path(path)
+        self.ttl = ttl_seconds
+        self.max_entries = max_entries
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    @staticmethod
+    def key(*requests: dict) -> str:
+        """Normalized hash of chat completion request kwargs"""
+        payload = json.dumps(requests, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _connection(self) -> sqlite3.Connection:
+        # Connections are per process: never reuse one inherited across fork()
+        if self._conn is None or self._pid != os.getpid():
+            self._conn, self._pid, self._writes = open_shared_db(self.path, _SCHEMA), os.getpid(), 0
+        return self._conn
+
+    def _get_sync(self, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT value FROM analysis WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _put_sync(self, key: str, value: Any):
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO analysis (key, value, created_at, expires_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), now, now + self.ttl)
+            )
+            self._writes += 1
+            if self._writes % _EVICT_EVERY == 1:
+                self._evict(conn, now)
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        conn.execute("DELETE FROM analysis WHERE expires_at <= ?", (now,))
+        conn.execute(
+            "DELETE FROM analysis WHERE key IN "
+            "(SELECT key FROM analysis ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+
+    async def get(self, key: str) -> Optional[Any]:
+        try:
+            value = await asyncio.to_thread(self._get_sync, key)
+        except sqlite3.Error as e:
+            logger.warning(f"AI analysis cache read failed: {e}")
+            value = None
+        AI_CACHE_REQUESTS.labels(result="hit" if value is not None else "miss").inc()
+        return value
+
+    async def put(self, key: str, value: Any):
+        try:
+            await asyncio.to_thread(self._put_sync, key, value)
+        except sqlite3.Error as e:
+            logger.warning(f"AI analysis cache write failed: {e}")
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None and self._pid == os.getpid():
+                self._conn.close()
+            self._conn = None
@@ -0,0 +1,96 @@
+import numpy as np
+from pathlib import Path
+from app.core.config import settings
+from app.core.logging import logger
+from app.services.stages import stage
+
+# Ensemble weights (must match train_model.py)
+LGB_WEIGHT = 0.6
+XGB_WEIGHT = 0.4
+
+
+class NativeBackend:
+    """LightGBM + XGBoost predict_proba through the native libraries"""
+    name = "native"
+    applies_scaler = False  # expects the model input prepared by FeatureLayout
+
+    def __init__(self, lgb_model, xgb_model, **kwargs):
+        self.lgb_model = lgb_model
+        self.xgb_model = xgb_model
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        with stage("lightgbm"):
+            lgb_proba = self.lgb_model.predict_proba(X)[:, 1]
+        with stage("xgboost"):
+            xgb_proba = self.xgb_model.predict_proba(X)[:, 1]
+        return LGB_WEIGHT * lgb_proba + XGB_WEIGHT * xgb_proba
+
+
+class NumpyTreeBackend:
+    """Both boosters compiled to node arrays and evaluated in vectorized NumPy"""
+    name = "numpy"
+    applies_scaler = False
+
+    def __init__(self, lgb_model, xgb_model, engines: tuple = None, **kwargs):
+        if engines is None:
+            from app.services.tree_engine import TreeEnsemble
+            engines = (TreeEnsemble.from_lightgbm(lgb_model), TreeEnsemble.from_xgboost(xgb_model))
+        # Precompiled engines come from a model bundle file
+        self.lgb, self.xgb = engines
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        with stage("lightgbm"):
+            lgb_proba = self.lgb.predict_proba(X)
+        with stage("xgboost"):
+            xgb_proba = self.xgb.predict_proba(X)
+        return LGB_WEIGHT * lgb_proba + XGB_WEIGHT * xgb_proba
+
+
+class OnnxBackend:
+    """Scaler + both boosters + weighting exported as one ONNX Runtime session (onnx_export.py)"""
+    name = "onnx"
+    applies_scaler = True  # expects raw features, the graph scales them itself
+
+    def __init__(self, lgb_model, xgb_model, model_dir: Path = None, metadata: dict = None, **kwargs):
+        import onnxruntime as ort
+
+        export = (metadata or {}).get('onnx')
+        if not export or not export.get('passed'):
+            raise FileNotFoundError("no ONNX export recorded in metadata")
+        path = Path(model_dir or settings.MODEL_DIR) / export['file']
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = settings.ONNX_INTRA_OP_THREADS
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(str(path), options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+        self.output_name = self.session.get_outputs()[0].name
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        # One graph for both boosters: not split by model
+        with stage("onnx"):
+            return self.session.run([self.output_name], {self.input_name: X})[0]
+
+
+BACKENDS = {
+    NativeBackend.name: NativeBackend,
+    NumpyTreeBackend.name: NumpyTreeBackend,
+    OnnxBackend.name: OnnxBackend,
+}
+
+
+def create_backend(name: str, lgb_model, xgb_model, **kwargs):
+    """Build the configured inference backend, falling back to native on failure"""
+    backend_cls = BACKENDS.get(name)
+    if backend_cls is None:
+        logger.warning(f"Unknown inference backend '{name}', using native")
+        backend_cls = NativeBackend
+    try:
+        return backend_cls(lgb_model, xgb_model, **kwargs)
+    except Exception as e:
+        if backend_cls is NativeBackend:
+            raise
+        logger.warning(f"Inference backend '{name}' unavailable ({e}), using native")
+        return NativeBackend(lgb_model, xgb_model)
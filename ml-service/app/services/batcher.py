@@ -0,0 +1,112 @@
+import time
+import asyncio
+from typing import Any, Awaitable, Callable, List, Optional
+from app.core.logging import logger
+from app.core.metrics import MICRO_BATCH_SIZE, MICRO_BATCH_QUEUE_DELAY
+
+
+class MicroBatcher:
+    """
+    Dynamic micro-batching in front of a batch function.
+
+    Concurrent submit() calls are queued; a collector task takes the first
+    waiting item plus everything already queued and, while earlier batches
+    are still running, keeps collecting for up to `window_ms` or until
+    `max_batch_size` items are queued. The batch then goes to the async
+    `process_batch` (which hands it to an executor). An idle batcher does not
+    wait out the window, so a lone request pays no extra latency. Up to
+    `max_in_flight` batches run at once.
+
+    process_batch returns one result per item, in order; an Exception instance
+    in the result list is raised to that item's caller only.
+    """
+
+    def __init__(self, process_batch: Callable[[List[Any]], Awaitable[List[Any]]],
+                 window_ms: float = 2.0, max_batch_size: int = 64, max_in_flight: int = 4):
+        self.process_batch = process_batch
+        self.window = window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.max_in_flight = max_in_flight
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._in_flight: Optional[asyncio.Semaphore] = None
+        self._running = 0
+
+    def _ensure_started(self):
+        """Start the collector on the running loop (restarts it if the loop changed)"""
+        loop = asyncio.get_running_loop()
+        if self._task is not None and not self._task.done() and self._loop is loop:
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._in_flight = asyncio.Semaphore(self.max_in_flight)
+        self._running = 0
+        self._task = loop.create_task(self._collect())
+
+    async def submit(self, item: Any) -> Any:
+        """Queue one item and wait for its result"""
+        self._ensure_started()
+        future = self._loop.create_future()
+        await self._queue.put((item, future, time.perf_counter()))
+        return await future
+
+    async def _collect(self):
+        while True:
+            batch = [await self._queue.get()]
+            deadline = time.perf_counter() + self.window
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0 or not self._running:
+                    # Window is over (or nothing to wait for): take what is already queued
+                    while len(batch) < self.max_batch_size and not self._queue.empty():
+                        batch.append(self._queue.get_nowait())
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    continue
+
+            await self._in_flight.acquire()
+            self._running += 1
+            self._loop.create_task(self._run(batch))
+
+    async def _run(self, batch: list):
+        try:
+            started = time.perf_counter()
+            MICRO_BATCH_SIZE.observe(len(batch))
+            for _, _, enqueued in batch:
+                MICRO_BATCH_QUEUE_DELAY.observe(started - enqueued)
+
+            items = [item for item, _, _ in batch]
+            try:
+                results = await self.process_batch(items)
+            except Exception as e:
+                logger.error(f"Micro-batch of {len(batch)} failed: {e}")
+                results = [e] * len(batch)
+
+            for (_, future, _), result in zip(batch, results):
+                if future.done():  # caller went away (request cancelled)
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+        finally:
+            self._running -= 1
+            self._in_flight.release()
+
+    async def close(self):
+        """Stop the collector; items still queued are failed"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        while not self._queue.empty():
+            _, future, _ = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("Micro-batcher stopped"))
+        self._task = None
@@ -0,0 +1,241 @@
+"""
+Single-file model bundle (model.fmb).
+
+Layout:
+
+    b"FMBUNDLE" | header length (uint64 LE) | header JSON | sections...
+
+The header holds the format version, the model metadata, the scalar
+parameters of the compiled tree engines and a table of sections (offset,
+dtype, shape), each aligned to 64 bytes:
+
+    lgb_model               LightGBM text model (uint8)
+    xgb_model               XGBoost UBJ model, sklearn wrapper attributes included (uint8)
+    scaler/mean, /scale     StandardScaler parameters (float64)
+    encoders/<key>          LabelEncoder vocabularies (fixed-width unicode)
+    engines/<lgb|xgb>/<name> compiled TreeEnsemble node arrays
+
+Every array section is a view on one read-only memory map of the file, so
+loading does not copy or recompile anything and the pages are shared by all
+processes that map the same file. The header also carries a SHA-256 of its
+own content and all sections. Files are replaced (os.replace), never
+rewritten in place, so processes that still map an old bundle keep reading
+consistent data.
+"""
+
+import os
+import json
+import struct
+import hashlib
+import tempfile
+import numpy as np
+from pathlib import Path
+from typing import Any, Dict, Optional
+from app.services.tree_engine import TreeEnsemble
+
+BUNDLE_FILE = "model.fmb"
+FORMAT_VERSION = 1
+MAGIC = b"FMBUNDLE"
+_ALIGN = 64
+_PREAMBLE = len(MAGIC) + 8
+
+
+class BundleFormatError(ValueError):
+    """The file is not a model bundle this service can read"""
+
+
+class LightGBMModel:
+    """
+    The parts of LGBMClassifier the service uses (binary objective), around
+    a native Booster: predict_proba, booster_, feature_importances_ and
+    set_params(n_jobs=...).
+    """
+
+    def __init__(self, booster):
+        self.booster_ = booster
+        self.n_jobs = None
+
+    def set_params(self, n_jobs: Optional[int] = None, **params):
+        self.n_jobs = n_jobs
+        return self
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        kwargs = {"num_threads": self.n_jobs} if self.n_jobs else {}
+        proba = self.booster_.predict(X, **kwargs)
+        return np.column_stack([1.0 - proba, proba])
+
+    @property
+    def feature_importances_(self) -> np.ndarray:
+        return self.booster_.feature_importance(importance_type="split")
+
+
+class ScalerParameters:
+    """StandardScaler as its two vectors (None when disabled)"""
+
+    def __init__(self, mean: Optional[np.ndarray], scale: Optional[np.ndarray]):
+        self.mean_, self.scale_ = mean, scale
+        self.with_mean, self.with_std = mean is not None, scale is not None
+
+    def transform(self, X) -> np.ndarray:
+        X = np.array(X, dtype=np.float64)
+        if self.with_mean:
+            X -= self.mean_
+        if self.with_std:
+            X /= self.scale_
+        return X
+
+
+class Vocabulary:
+    """classes_ of a fitted LabelEncoder"""
+
+    def __init__(self, classes: np.ndarray):
+        self.classes_ = classes
+
+
+class BundleContents:
+    """Everything ModelBundle.load() needs, as read from a bundle file"""
+
+    def __init__(self, header: dict, lgb_model, xgb_model, scaler: ScalerParameters,
+                 label_encoders: Dict[str, Vocabulary], engines: tuple):
+        self.header = header
+        self.metadata = header["metadata"]
+        self.scaler_free = header["scaler_free"]
+        self.sha256 = header["sha256"]
+        self.lgb_model = lgb_model
+        self.xgb_model = xgb_model
+        self.scaler = scaler
+        self.label_encoders = label_encoders
+        self.engines = engines
+
+
+def _xgb_ubj(xgb_model) -> bytes:
+    """UBJ bytes of an XGBClassifier, as written by its own save_model (keeps the sklearn attributes)"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "model.ubj")
+        xgb_model.save_model(path)
+        with open(path, "rb") as f:
+            return f.read()
+
+
+def _content_hash(header: dict, payload) -> str:
+    digest = hashlib.sha256(json.dumps(header, sort_keys=True).encode())
+    digest.update(payload)
+    return digest.hexdigest()
+
+
+def write_bundle(path: Path, metadata: Dict[str, Any], lgb_model, xgb_model, scaler, label_encoders: Dict,
+                 scaler_free: bool = False) -> Dict[str, Any]:
+    """
+    Write a bundle file (through a temporary file and an atomic rename).
+    `scaler_free` marks models whose thresholds already live in raw feature
+    space. Returns the report recorded in metadata.json under 'bundle'.
+    """
+    path = Path(path)
+    sections: Dict[str, np.ndarray] = {
+        "lgb_model": np.frombuffer(lgb_model.booster_.model_to_string().encode(), dtype=np.uint8),
+        "xgb_model": np.frombuffer(_xgb_ubj(xgb_model), dtype=np.uint8),
+    }
+    if getattr(scaler, "with_mean", True):
+        sections["scaler/mean"] = np.asarray(scaler.mean_, dtype=np.float64)
+    if getattr(scaler, "with_std", True):
+        sections["scaler/scale"] = np.asarray(scaler.scale_, dtype=np.float64)
+    for key, encoder in label_encoders.items():
+        classes = np.asarray(encoder.classes_)
+        # Categories are matched as strings; object arrays become fixed-width unicode
+        sections[f"encoders/{key}"] = classes.astype(str) if classes.dtype.hasobject else classes
+
+    engines = {}
+    compiled = {"lgb": TreeEnsemble.from_lightgbm(lgb_model), "xgb": TreeEnsemble.from_xgboost(xgb_model)}
+    for name, engine in compiled.items():
+        arrays, engines[name] = engine.to_arrays()
+        for array_name, array in arrays.items():
+            sections[f"engines/{name}/{array_name}"] = array
+
+    table, payload, offset = {}, bytearray(), 0
+    for name, array in sections.items():
+        array = np.ascontiguousarray(array)
+        if array.dtype.hasobject:
+            raise BundleFormatError(f"Section {name} holds Python objects")
+        offset += -offset % _ALIGN
+        payload += b"\0" * (offset - len(payload))
+        table[name] = {"offset": offset, "dtype": array.dtype.str, "shape": list(array.shape)}
+        payload += array.tobytes()
+        offset = len(payload)
+
+    header = {
+        "format": FORMAT_VERSION,
+        "metadata": metadata,
+        "scaler_free": scaler_free,
+        "engines": engines,
+        "sections": table,
+    }
+    header["sha256"] = _content_hash(header, payload)
+
+    header_bytes = json.dumps(header).encode()
+    # Sections start on an aligned offset: pad the header with spaces (valid JSON whitespace)
+    header_bytes += b" " * (-(_PREAMBLE + len(header_bytes)) % _ALIGN)
+
+    tmp = path.with_name(f".{path.name}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<Q", len(header_bytes)))
+        f.write(header_bytes)
+        f.write(payload)
+    os.replace(tmp, path)
+    return {"file": path.name, "format": FORMAT_VERSION, "sha256": header["sha256"],
+            "bytes": _PREAMBLE + len(header_bytes) + len(payload), "scaler_free": scaler_free}
+
+
+def read_header(path: Path) -> dict:
+    """Header of a bundle file, without mapping the sections"""
+    with open(path, "rb") as f:
+        preamble = f.read(_PREAMBLE)
+        if len(preamble) != _PREAMBLE or preamble[:len(MAGIC)] != MAGIC:
+            raise BundleFormatError(f"{path} is not a model bundle")
+        header = json.loads(f.read(struct.unpack("<Q", preamble[len(MAGIC):])[0]))
+    if header.get("format") != FORMAT_VERSION:
+        raise BundleFormatError(f"Unsupported bundle format {header.get('format')}")
+    return header
+
+
+def read_bundle(path: Path, verify: bool = True) -> BundleContents:
+    """
+    Map a bundle file and build the models on top of it. With `verify`,
+    the content hash is checked first (reads every page once).
+    """
+    import lightgbm as lgb
+    import xgboost as xgb
+
+    header = read_header(path)
+    data = np.memmap(path, dtype=np.uint8, mode="r")
+    start = _PREAMBLE + struct.unpack("<Q", bytes(data[len(MAGIC):_PREAMBLE]))[0]
+    payload = data[start:]
+
+    if verify:
+        content = {key: value for key, value in header.items() if key != "sha256"}
+        if _content_hash(content, payload) != header["sha256"]:
+            raise BundleFormatError(f"{path}: content hash mismatch")
+
+    def section(name: str) -> Optional[np.ndarray]:
+        entry = header["sections"].get(name)
+        if entry is None:
+            return None
+        dtype = np.dtype(entry["dtype"])
+        count = int(np.prod(entry["shape"], dtype=np.int64))
+        return np.frombuffer(payload, dtype=dtype, count=count, offset=entry["offset"]).reshape(entry["shape"])
+
+    lgb_model = LightGBMModel(lgb.Booster(model_str=section("lgb_model").tobytes().decode()))
+    xgb_model = xgb.XGBClassifier()
+    xgb_model.load_model(bytearray(section("xgb_model")))
+
+    engines = tuple(
+        TreeEnsemble.from_arrays({name: section(f"engines/{model}/{name}") for name in TreeEnsemble.ARRAYS},
+                                 header["engines"][model])
+        for model in ("lgb", "xgb")
+    )
+    label_encoders = {
+        name.split("/", 1)[1]: Vocabulary(section(name))
+        for name in header["sections"] if name.startswith("encoders/")
+    }
+    scaler = ScalerParameters(section("scaler/mean"), section("scaler/scale"))
+    return BundleContents(header, lgb_model, xgb_model, scaler, label_encoders, engines)
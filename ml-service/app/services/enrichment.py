@@ -0,0 +1,210 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import sqlite3
+import threading
+from contextlib import ExitStack
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+from app.core.config import settings
+from app.core.logging import logger
+from app.core.metrics import ENRICHMENT_TOTAL, ENRICHMENT_PENDING, ENRICHMENT_DURATION
+from app.schemas.transaction import TransactionFeatures
+from app.services.analysis_cache import open_shared_db
+from app.services.model_bundle import ModelBundle
+from app.services.model_service import model_service
+from app.services.ai_service import ai_service
+
+# Analysis states: pending -> done | failed; rejected when the backlog is full
+PENDING, DONE, FAILED, REJECTED = "pending", "done", "failed", "rejected"
+
+# Expired results are purged every N writes per process
+_PURGE_EVERY = 100
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS enrichment (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    result TEXT,
+    created_at REAL NOT NULL,
+    expires_at REAL NOT NULL
+);
+"""
+
+
+class EnrichmentStore:
+    """
+    Results of deferred analyses in a SQLite (WAL) file, so GET /analysis/{id}
+    works on whichever pre-forked worker receives it. Entries live for
+    `ttl_seconds` after their last update.
+    """
+
+    def __init__(self, path: Path, ttl_seconds: float = 3600.0):
+        self.path = Path(path)
+        self.ttl = ttl_seconds
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None or self._pid != os.getpid():
+            self._conn, self._pid, self._writes = open_shared_db(self.path, _SCHEMA), os.getpid(), 0
+        return self._conn
+
+    def write(self, analysis_id: str, status: str, result: Optional[dict] = None):
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT INTO enrichment (id, status, result, created_at, expires_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET status = excluded.status, result = excluded.result, "
+                "expires_at = excluded.expires_at",
+                (analysis_id, status, json.dumps(result, ensure_ascii=False) if result is not None else None,
+                 now, now + self.ttl)
+            )
+            self._writes += 1
+            if self._writes % _PURGE_EVERY == 1:
+                conn.execute("DELETE FROM enrichment WHERE expires_at <= ?", (now,))
+
+    def read(self, analysis_id: str) -> Optional[dict]:
+        """{'status', 'created_at', **result} or None if unknown or expired"""
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT status, result, created_at FROM enrichment WHERE id = ? AND expires_at > ?",
+                (analysis_id, time.time())
+            ).fetchone()
+        if row is None:
+            return None
+        status, result, created_at = row
+        return {"status": status, "created_at": created_at, **(json.loads(result) if result else {})}
+
+
+class EnrichmentService:
+    """
+    Second phase of a deferred /predict: attributions and the LLM analysis run
+    in background tasks after the score has been returned.
+
+    At most `max_concurrency` analyses run at once and at most `max_pending`
+    are accepted (running or waiting); beyond that new analyses are rejected
+    rather than queued without bound. Finished analyses are written to the
+    EnrichmentStore and, if ENRICHMENT_KAFKA_TOPIC is set, published to Kafka.
+    """
+
+    def __init__(self, store: EnrichmentStore, max_concurrency: int = 16, max_pending: int = 1000):
+        self.store = store
+        self.max_pending = max_pending
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._max_concurrency = max_concurrency
+        self._tasks: Set[asyncio.Task] = set()
+        self._producer = None
+
+    async def submit(self, transaction: TransactionFeatures, fraud_probability: float,
+                     risk_level: str, explain: str = "topk", mode: Optional[str] = None,
+                     bundle: Optional[ModelBundle] = None) -> str:
+        """
+        Register an analysis, start it in the background and return its id.
+        The attributions come from `bundle`, the one that produced the score
+        (default: the current one), kept pinned until the analysis ends.
+        """
+        analysis_id = uuid.uuid4().hex
+        if len(self._tasks) >= self.max_pending:
+            ENRICHMENT_TOTAL.labels(status=REJECTED).inc()
+            await asyncio.to_thread(self.store.write, analysis_id, REJECTED,
+                                    {"error": "Analysis backlog is full"})
+            return analysis_id
+
+        bundle = bundle or model_service.bundle
+        pin = ExitStack()
+        pin.enter_context(bundle.pinned())
+        try:
+            await asyncio.to_thread(self.store.write, analysis_id, PENDING)
+        except BaseException:
+            pin.close()
+            raise
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._max_concurrency)
+        task = asyncio.create_task(
+            self._enrich(analysis_id, bundle, transaction, fraud_probability, risk_level, explain, mode)
+        )
+        self._tasks.add(task)
+        ENRICHMENT_PENDING.inc()
+        task.add_done_callback(self._finished)
+        # Also when the task is cancelled before it starts
+        task.add_done_callback(lambda _: pin.close())
+        return analysis_id
+
+    def _finished(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        ENRICHMENT_PENDING.dec()
+
+    async def _enrich(self, analysis_id: str, bundle: ModelBundle, transaction: TransactionFeatures,
+                      fraud_probability: float, risk_level: str, explain: str, mode: Optional[str]):
+        try:
+            async with self._semaphore:
+                start_time = time.time()
+                try:
+                    prediction = await model_service.predict(transaction, explain, bundle)
+                    top_risk_factors = prediction["top_risk_factors"]
+                    analysis = await ai_service.analyze(
+                        transaction, fraud_probability, risk_level, top_risk_factors, mode
+                    )
+                    result = {
+                        "top_risk_factors": top_risk_factors,
+                        "shap_values": prediction["shap_values"],
+                        **analysis
+                    }
+                    status = DONE
+                except Exception as e:
+                    logger.error(f"Deferred analysis {analysis_id} failed: {e}")
+                    result, status = {"error": str(e)}, FAILED
+                ENRICHMENT_DURATION.observe(time.time() - start_time)
+        except asyncio.CancelledError:
+            # Shutdown: report it rather than leave the analysis pending until it expires
+            ENRICHMENT_TOTAL.labels(status=FAILED).inc()
+            await self._deliver(analysis_id, FAILED, {"error": "Service shut down before the analysis finished"})
+            raise
+
+        ENRICHMENT_TOTAL.labels(status=status).inc()
+        await self._deliver(analysis_id, status, result)
+
+    async def _deliver(self, analysis_id: str, status: str, result: dict):
+        try:
+            await asyncio.to_thread(self.store.write, analysis_id, status, result)
+            if settings.ENRICHMENT_KAFKA_TOPIC:
+                await asyncio.to_thread(self._publish, {"analysis_id": analysis_id, "status": status, **result})
+        except Exception as e:
+            logger.error(f"Failed to deliver deferred analysis {analysis_id}: {e}")
+
+    def _publish(self, message: Dict[str, Any]):
+        if self._producer is None:
+            from kafka import KafkaProducer
+            self._producer = KafkaProducer(
+                bootstrap_servers=settings.KAFKA_BOOTSTRAP_SERVERS.split(","),
+                value_serializer=lambda x: json.dumps(x, ensure_ascii=False).encode("utf-8")
+            )
+        self._producer.send(settings.ENRICHMENT_KAFKA_TOPIC, value=message)
+
+    async def get(self, analysis_id: str) -> Optional[dict]:
+        return await asyncio.to_thread(self.store.read, analysis_id)
+
+    async def close(self):
+        """Cancel analyses still running; they are recorded as failed"""
+        # Tasks created just now take their first step, so their cancellation is recorded
+        await asyncio.sleep(0)
+        tasks: List[asyncio.Task] = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self._producer is not None:
+            self._producer.close()
+            self._producer = None
+
+
+enrichment_service = EnrichmentService(
+    EnrichmentStore(settings.ENRICHMENT_STORE_PATH, ttl_seconds=settings.ENRICHMENT_RESULT_TTL_SECONDS),
+    max_concurrency=settings.ENRICHMENT_MAX_CONCURRENCY,
+    max_pending=settings.ENRICHMENT_MAX_PENDING
+)
@@ -0,0 +1,196 @@
+import numpy as np
+from typing import Dict, List
+from app.schemas.transaction import TransactionFeatures
+
+# Value used for features the request does not provide (matches training-time fill)
+MISSING_VALUE = -999.0
+
+# Sentinel for categories the label encoder has never seen
+UNKNOWN_CATEGORY = -1
+
+# Largest magnitude a raw feature may have: the models compare in float32, and
+# XGBoost rejects inf (which is what larger values become after the cast)
+MAX_FEATURE_VALUE = float(np.finfo(np.float32).max)
+
+# Request field -> key of its encoder in label_encoders.joblib
+CATEGORICAL_FIELDS = {
+    'last_phone_model': 'last_phone_model_categorical',
+    'last_os': 'last_os_categorical',
+    'direction': 'direction',
+}
+
+
+def _amount_log(amount):
+    """
+    log1p(amount), with MISSING_VALUE where it is not finite: NaN (amount
+    below -1) as the DataFrame path's fillna(-999) did, and also -inf
+    (amount -1), which that path passed on to the scaler and failed on.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        value = np.log1p(amount)
+    return np.where(np.isfinite(value), value, MISSING_VALUE)
+
+
+def is_night(hour):
+    """The model's is_night feature (22:00-06:59), for an hour or an array of hours"""
+    return (hour >= 22) | (hour <= 6)
+
+
+def _out_of_range(field: str, value) -> ValueError:
+    return ValueError(f"{field}={value} is not a finite float32 value")
+
+
+class CategoryLookup:
+    """
+    Hash-map replacement for a fitted LabelEncoder.
+
+    LabelEncoder.transform validates its input and binary-searches classes_ on
+    every call, and signals unseen values by raising. The lookup table gives
+    the same codes in O(1) and maps unseen values to UNKNOWN_CATEGORY.
+    """
+
+    def __init__(self, classes):
+        self.codes = {value: code for code, value in enumerate(np.asarray(classes).tolist())}
+
+    @classmethod
+    def from_encoder(cls, encoder) -> "CategoryLookup":
+        return cls(encoder.classes_)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def encode(self, value) -> int:
+        return self.codes.get(value, UNKNOWN_CATEGORY)
+
+    def encode_many(self, values: List) -> np.ndarray:
+        """Codes for a batch of values in a single pass"""
+        get = self.codes.get
+        return np.fromiter((get(v, UNKNOWN_CATEGORY) for v in values), dtype=np.float64, count=len(values))
+
+
+class FeatureLayout:
+    """
+    Feature layout compiled once per model load.
+
+    Maps every TransactionFeatures field, derived feature and encoded categorical
+    to a fixed column of the model input, so requests are written straight into
+    a NumPy matrix instead of going through a per-request pandas DataFrame.
+    Columns the request cannot fill keep MISSING_VALUE, exactly like the
+    DataFrame path (add missing columns, fillna(-999)) it replaces.
+    """
+
+    def __init__(self, feature_names: List[str], label_encoders: Dict, scaler=None):
+        self.feature_names = list(feature_names)
+        self.n_features = len(self.feature_names)
+        index = {name: i for i, name in enumerate(self.feature_names)}
+
+        # Raw request fields copied as-is
+        self.numeric = [
+            (field, index[field])
+            for field in TransactionFeatures.model_fields
+            if field in index and field not in CATEGORICAL_FIELDS
+        ]
+
+        # Derived features (None when the model does not use them)
+        self.amount_log = index.get('amount_log')
+        self.is_weekend = index.get('is_weekend')
+        self.is_night = index.get('is_night')
+        self.is_business_hours = index.get('is_business_hours')
+
+        # Encoded categoricals: (request field, column, lookup table)
+        self.categorical = []
+        for field, encoder_key in CATEGORICAL_FIELDS.items():
+            column = index.get(f'{encoder_key}_encoded')
+            if column is not None and encoder_key in label_encoders:
+                lookup = CategoryLookup.from_encoder(label_encoders[encoder_key])
+                self.categorical.append((field, column, lookup))
+
+        # StandardScaler folded into two vectors
+        self.mean = None
+        self.scale = None
+        if scaler is not None:
+            if getattr(scaler, 'with_mean', True):
+                self.mean = np.asarray(scaler.mean_, dtype=np.float64)
+            if getattr(scaler, 'with_std', True):
+                self.scale = np.asarray(scaler.scale_, dtype=np.float64)
+
+        self._template = np.full(self.n_features, MISSING_VALUE, dtype=np.float64)
+
+    def fill_row(self, transaction: TransactionFeatures, out: np.ndarray) -> np.ndarray:
+        """
+        Write one transaction into a preallocated row (must hold MISSING_VALUE).
+        Raises ValueError for a field that is infinite or outside the float32 range.
+        """
+        for field, column in self.numeric:
+            value = getattr(transaction, field)
+            if value is not None and value == value:
+                if not -MAX_FEATURE_VALUE <= value <= MAX_FEATURE_VALUE:
+                    raise _out_of_range(field, value)
+                out[column] = value
+
+        hour = transaction.hour
+        if self.amount_log is not None:
+            amount = transaction.amount
+            out[self.amount_log] = np.log1p(amount) if -1 < amount < np.inf else _amount_log(amount)
+        if self.is_weekend is not None:
+            out[self.is_weekend] = transaction.day_of_week in (5, 6)
+        if self.is_night is not None:
+            out[self.is_night] = is_night(hour)
+        if self.is_business_hours is not None:
+            out[self.is_business_hours] = 9 <= hour <= 18
+
+        for field, column, lookup in self.categorical:
+            value = getattr(transaction, field)
+            if value:
+                out[column] = lookup.encode(value)
+
+        return out
+
+    def build_row(self, transaction: TransactionFeatures) -> np.ndarray:
+        """Raw (unscaled) feature matrix of shape (1, n_features)"""
+        row = self._template.copy()
+        return self.fill_row(transaction, row).reshape(1, -1)
+
+    def build_matrix(self, transactions: List[TransactionFeatures]) -> np.ndarray:
+        """
+        Raw (unscaled) feature matrix for a batch, filled column by column.
+        Raises ValueError if any row has a field fill_row would reject (callers
+        fall back to fill_row per row to find it).
+        """
+        n = len(transactions)
+        X = np.full((n, self.n_features), MISSING_VALUE, dtype=np.float64)
+        if n == 0:
+            return X
+
+        for field, column in self.numeric:
+            values = np.array([getattr(t, field) for t in transactions], dtype=np.float64)
+            bad = np.abs(values) > MAX_FEATURE_VALUE  # NaN compares False: it is a missing value
+            if bad.any():
+                raise _out_of_range(field, values[bad][0])
+            X[:, column] = np.where(np.isnan(values), MISSING_VALUE, values)
+
+        hour = np.array([t.hour for t in transactions])
+        if self.amount_log is not None:
+            X[:, self.amount_log] = _amount_log(np.array([t.amount for t in transactions], dtype=np.float64))
+        if self.is_weekend is not None:
+            X[:, self.is_weekend] = np.isin([t.day_of_week for t in transactions], (5, 6))
+        if self.is_night is not None:
+            X[:, self.is_night] = is_night(hour)
+        if self.is_business_hours is not None:
+            X[:, self.is_business_hours] = (hour >= 9) & (hour <= 18)
+
+        for field, column, lookup in self.categorical:
+            values = [getattr(t, field) for t in transactions]
+            present = np.fromiter(map(bool, values), dtype=bool, count=n)
+            X[present, column] = lookup.encode_many([v for v in values if v])
+
+        return X
+
+    def transform(self, X: np.ndarray) -> np.ndarray:
+        """Apply the scaler in place (same arithmetic as StandardScaler.transform)"""
+        if self.mean is not None:
+            X -= self.mean
+        if self.scale is not None:
+            X /= self.scale
+        return X
+
@@ -0,0 +1,461 @@
+import joblib
+import numpy as np
+import json
+import time
+import fcntl
+import os
+from contextlib import contextmanager
+from pathlib import Path
+from typing import List, Optional
+from app.core.config import settings
+from app.core.logging import logger
+from app.core.metrics import MODEL_BUNDLES
+from app.schemas.transaction import TransactionFeatures
+from app.services.features import FeatureLayout, MISSING_VALUE
+from app.services.backends import create_backend
+from app.services.bundle_file import read_bundle, read_header
+from app.services.stages import stage
+from app.services.explainer import ContributionExplainer, top_k as top_contributions, risk_factors
+from app.services.warmup import EXPLAIN_LEVELS, WarmupRounds, synthetic_transactions
+from app.services import process_pool
+
+
+# Lock file guarding MODEL_DIR: promotion of a new version holds it exclusively,
+# loads hold it shared, so a load never sees a half-copied version
+LOCK_FILE = '.lock'
+
+
+@contextmanager
+def model_dir_lock(model_dir: Path, exclusive: bool = False):
+    """flock() on the model directory's lock file (blocking: run it off the event loop)"""
+    try:
+        fd = os.open(Path(model_dir) / LOCK_FILE, os.O_RDWR | os.O_CREAT, 0o644)
+    except OSError as e:
+        # Read-only model directory: nothing can be promoted into it
+        logger.debug(f"Model directory lock unavailable: {e}")
+        yield
+        return
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        yield
+    finally:
+        os.close(fd)
+
+
+def _scaler_free_variant(model_dir: Path, metadata: dict) -> Optional[dict]:
+    """Scaler-free export recorded in metadata, if enabled and present on disk"""
+    if not settings.USE_SCALER_FREE_MODELS:
+        return None
+    variant = metadata.get('scaler_free')
+    if not variant or not variant.get('passed'):
+        return None
+    if not all((model_dir / variant[key]).exists() for key in ('lgb_model', 'xgb_model')):
+        logger.warning("Scaler-free variants listed in metadata but missing on disk")
+        return None
+    return variant
+
+
+def _bundle_file(model_dir: Path, metadata: dict) -> Optional[Path]:
+    """Bundle file recorded in metadata, if enabled, present, current and of the configured variant"""
+    entry = metadata.get('bundle')
+    if not settings.USE_BUNDLE_FILE or not entry:
+        return None
+    if entry.get('scaler_free') and not settings.USE_SCALER_FREE_MODELS:
+        return None
+    path = model_dir / entry['file']
+    try:
+        header = read_header(path)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Model bundle listed in metadata but unusable: {e}")
+        return None
+    if header['sha256'] != entry.get('sha256'):
+        logger.warning(f"Model bundle {path.name} does not match metadata (stale file?)")
+        return None
+    return path
+
+
+def _load_bundle_file(path: Path, metadata: dict) -> tuple:
+    """Models from a memory-mapped bundle file, the tree engines precompiled"""
+    contents = read_bundle(path, verify=settings.BUNDLE_VERIFY_HASH)
+    if contents.metadata['feature_names'] != metadata['feature_names']:
+        raise ValueError("feature names differ from metadata.json")
+    logger.info(f"Using model bundle {path.name} (sha256 {contents.sha256[:12]})")
+    layout = FeatureLayout(metadata['feature_names'], contents.label_encoders,
+                           None if contents.scaler_free else contents.scaler)
+    return (contents.scaler, contents.label_encoders, contents.lgb_model, contents.xgb_model,
+            layout, contents.engines)
+
+
+def _load_joblib(model_dir: Path, metadata: dict) -> tuple:
+    """Models from the pickled joblib artifacts (the tree engines are compiled later, on demand)"""
+    scaler = joblib.load(model_dir / 'scaler.joblib')
+    label_encoders = joblib.load(model_dir / 'label_encoders.joblib')
+
+    scaler_free = _scaler_free_variant(model_dir, metadata)
+    if scaler_free:
+        # Scaler is folded into the split thresholds: serve on raw features
+        logger.info("Using scaler-free model variants")
+        lgb_model = joblib.load(model_dir / scaler_free['lgb_model'])
+        xgb_model = joblib.load(model_dir / scaler_free['xgb_model'])
+        layout = FeatureLayout(metadata['feature_names'], label_encoders)
+    else:
+        lgb_model = joblib.load(model_dir / 'lgb_model.joblib')
+        xgb_model = joblib.load(model_dir / 'xgb_model.joblib')
+        layout = FeatureLayout(metadata['feature_names'], label_encoders, scaler)
+    return scaler, label_encoders, lgb_model, xgb_model, layout, None
+
+
+class ModelBundle:
+    """
+    One loaded model version: both models, the preprocessing, the inference
+    backend and the explainer, with the CPU-bound scoring methods that use
+    them. The model objects are never modified after load(), so a bundle can
+    be scored from any number of executor threads while a newer one is
+    being loaded.
+
+    Requests pin the bundle they started with (pinned()); a retired bundle
+    releases its worker pool and drops out of MODEL_BUNDLES once the last
+    pinned request has finished. Its memory goes with the last reference.
+    """
+
+    def __init__(self, model_dir: Path, metadata: dict, scaler, label_encoders, lgb_model, xgb_model,
+                 layout: FeatureLayout, backend, explainer: ContributionExplainer):
+        self.model_dir = model_dir
+        self.metadata = metadata
+        self.scaler = scaler
+        self.label_encoders = label_encoders
+        self.lgb_model = lgb_model
+        self.xgb_model = xgb_model
+        self.layout = layout
+        self.backend = backend
+        self.explainer = explainer
+        self.pool = None  # ProcessPoolExecutor when INFERENCE_EXECUTOR=process
+        self._pinned = 0
+        self._retired = False
+        self._released = False
+        MODEL_BUNDLES.inc()
+
+    @classmethod
+    def load(cls, model_dir: Path) -> "ModelBundle":
+        """
+        Load a model version from disk (blocking: run it off the event loop).
+        Everything is read under the shared model directory lock, so a version
+        being promoted is seen either entirely or not at all.
+        """
+        logger.info(f"Loading models from {model_dir}...")
+        with model_dir_lock(model_dir):
+            with open(model_dir / 'metadata.json', 'r') as f:
+                metadata = json.load(f)
+
+            models = None
+            bundle_file = _bundle_file(model_dir, metadata)
+            if bundle_file:
+                try:
+                    models = _load_bundle_file(bundle_file, metadata)
+                except Exception as e:
+                    logger.warning(f"Model bundle {bundle_file.name} unreadable ({e}), loading joblib artifacts")
+            if models is None:
+                models = _load_joblib(model_dir, metadata)
+            scaler, label_encoders, lgb_model, xgb_model, layout, engines = models
+
+            backend = create_backend(
+                settings.INFERENCE_BACKEND, lgb_model, xgb_model,
+                model_dir=model_dir, metadata=metadata, engines=engines
+            )
+        logger.info(f"Inference backend: {backend.name}")
+
+        # The numpy backend has already compiled the trees the path explainer needs
+        if backend.name == "numpy":
+            engines = (backend.lgb, backend.xgb)
+        explainer = ContributionExplainer(lgb_model, xgb_model, method=settings.EXPLAIN_METHOD, engines=engines)
+        logger.info(f"Explain method: {explainer.method}")
+
+        bundle = cls(model_dir, metadata, scaler, label_encoders, lgb_model, xgb_model, layout, backend, explainer)
+        if settings.MODEL_THREADS:
+            bundle.set_threads(settings.MODEL_THREADS)
+        return bundle
+
+    @property
+    def version(self) -> str:
+        return self.metadata['version']
+
+    @property
+    def threshold(self) -> float:
+        return self.metadata['optimal_threshold']
+
+    def set_threads(self, threads: int):
+        """Cap LightGBM / XGBoost (scoring and explainer) at `threads` OpenMP threads per call"""
+        for model in (self.lgb_model, self.xgb_model):
+            if model is not None and hasattr(model, 'set_params'):
+                model.set_params(n_jobs=threads)
+
+    def warm(self) -> dict:
+        """
+        Score synthetic transactions through every path (single rows, micro-batch,
+        batch, each explain level) in rounds until a round's time settles, so the
+        first requests don't pay for lazy initialisation. Raises if scoring fails.
+        """
+        transactions = synthetic_transactions(self.label_encoders, settings.WARMUP_BATCH_SIZE)
+        requests = [(t, EXPLAIN_LEVELS[i % len(EXPLAIN_LEVELS)]) for i, t in enumerate(transactions)]
+        rounds = WarmupRounds()
+        while True:
+            start = time.perf_counter()
+            for request in requests[:len(EXPLAIN_LEVELS)]:
+                self._predict_sync(*request)
+            for result in self._predict_many_sync(requests):
+                if isinstance(result, Exception):
+                    raise result
+            for explain in EXPLAIN_LEVELS:
+                self._predict_batch_sync(transactions, threshold=self.threshold, explain=explain)
+            if rounds.add(time.perf_counter() - start):
+                break
+        report = rounds.report()
+        logger.info(f"Model bundle {self.version} warmed up: {report}")
+        return report
+
+    def start_pool(self, workers: int = 0):
+        """Fork a worker pool serving this bundle (replacing and retiring a previous one)"""
+        old_pool, self.pool = self.pool, process_pool.create_pool(workers, self)
+        if old_pool is not None:
+            process_pool.retire_pool(old_pool)
+
+    # ---------- pinning ----------
+
+    @contextmanager
+    def pinned(self):
+        """Keep the bundle alive for the duration of a request (event loop only)"""
+        self._pinned += 1
+        try:
+            yield self
+        finally:
+            self._pinned -= 1
+            if self._retired and self._pinned == 0:
+                self._release()
+
+    def retire(self):
+        """Called once a newer bundle has been swapped in; released when the last request drains"""
+        self._retired = True
+        if self._pinned == 0:
+            self._release()
+
+    def _release(self):
+        if self._released:
+            return
+        self._released = True
+        if self.pool is not None:
+            process_pool.retire_pool(self.pool)
+            self.pool = None
+        MODEL_BUNDLES.dec()
+        logger.info(f"Model bundle {self.version} drained and released")
+
+    def close(self):
+        """Stop the worker pool now (service shutdown)"""
+        if self.pool is not None:
+            self.pool.shutdown(wait=True, cancel_futures=True)
+            self.pool = None
+
+    # ---------- scoring (CPU bound, runs on the executor) ----------
+
+    def _prepare_features(self, transaction: TransactionFeatures) -> np.ndarray:
+        """Prepare features for prediction (CPU bound)"""
+        return self.layout.transform(self.layout.build_row(transaction))
+
+    def _prepare_batch(self, transactions: List[TransactionFeatures]) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Prepare a feature matrix for a batch. Returns the scaled matrix of the
+        rows that could be prepared and a boolean mask of failed rows.
+        """
+        X, errors = self._build_batch(transactions)
+        return self.layout.transform(X), errors
+
+    def _build_batch(self, transactions: List[TransactionFeatures]) -> tuple[np.ndarray, np.ndarray]:
+        """Unscaled counterpart of _prepare_batch"""
+        errors = np.zeros(len(transactions), dtype=bool)
+        with stage("features"):
+            try:
+                X = self.layout.build_matrix(transactions)
+            except Exception:
+                # Fall back to row-by-row filling to isolate the offending rows
+                X = np.full((len(transactions), self.layout.n_features), MISSING_VALUE, dtype=np.float64)
+                for idx, transaction in enumerate(transactions):
+                    try:
+                        self.layout.fill_row(transaction, X[idx])
+                    except Exception as e:
+                        logger.warning(f"Batch row {idx} failed feature preparation: {e}")
+                        errors[idx] = True
+                X = X[~errors]
+        return X, errors
+
+    def _score(self, X: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Ensemble probabilities for an unscaled feature matrix. Also returns the
+        model input (scaled in place unless the models are scaler-free), which
+        the SHAP explainer needs.
+        """
+        if self.backend.applies_scaler:
+            proba = self.backend.predict(X)
+            with stage("features"):
+                return proba, self.layout.transform(X)
+        with stage("features"):
+            X = self.layout.transform(X)
+        return self.backend.predict(X), X
+
+    def _predict_sync(self, transaction: TransactionFeatures, explain: str = "full", top_k: int = 10) -> dict:
+        """Synchronous prediction logic"""
+        with stage("features"):
+            X = self.layout.build_row(transaction)
+        proba, X_scaled = self._score(X)
+        return self._explained(proba, X_scaled, [explain], top_k)[0]
+
+    def _explained(self, proba: np.ndarray, X_scaled: np.ndarray, explain: List[str], top_k: int) -> List[dict]:
+        """
+        Per-row probability plus the attributions each row's explain level asks
+        for: "none" skips the explainer, "topk" keeps only the top-k risk
+        factors, "full" also returns shap_values for every feature.
+        """
+        results = [
+            {"fraud_probability": p, "shap_values": None, "top_risk_factors": []}
+            for p in proba.tolist()
+        ]
+        rows = np.flatnonzero([level != "none" for level in explain])
+        if not len(rows):
+            return results
+        if len(rows) < len(proba):
+            proba, X_scaled = proba[rows], X_scaled[rows]
+
+        with stage("explain"):
+            contributions, _ = self.explainer.explain(X_scaled, proba)
+        idx, values = top_contributions(contributions, top_k)
+        feature_names = self.metadata['feature_names']
+        for i, row in enumerate(rows):
+            result = results[row]
+            result["top_risk_factors"] = risk_factors(feature_names, idx[i], values[i])
+            if explain[row] == "full":
+                result["shap_values"] = dict(zip(feature_names, contributions[i].tolist()))
+        return results
+
+    def _predict_many_sync(self, requests: List[tuple]) -> list:
+        """
+        _predict_sync for a micro-batch of independent (transaction, explain)
+        requests: one feature matrix, one ensemble call and one explainer call
+        for the rows that want attributions. Rows that fail feature preparation,
+        and every row if the batched scoring call fails, are re-run alone so only
+        the caller whose request fails gets an exception.
+        """
+        transactions = [transaction for transaction, _ in requests]
+        X, errors = self._build_batch(transactions)
+        results: list = [None] * len(requests)
+        valid_idx = np.flatnonzero(~errors)
+
+        if len(valid_idx):
+            try:
+                proba, X_scaled = self._score(X)
+                explain = [requests[idx][1] for idx in valid_idx]
+                explained = self._explained(proba, X_scaled, explain, top_k=10)
+            except Exception as e:
+                logger.warning(f"Micro-batch scoring failed ({e}), re-running {len(valid_idx)} requests alone")
+                errors[valid_idx] = True
+            else:
+                for idx, result in zip(valid_idx, explained):
+                    results[idx] = result
+
+        for idx in np.flatnonzero(errors):
+            try:
+                results[idx] = self._predict_sync(*requests[idx])
+            except Exception as e:
+                results[idx] = e
+        return results
+
+    def _score_batch_rows(self, X: np.ndarray, rows, fraud_probability: np.ndarray, top_risk_factors: list,
+                          shap_values: list, top_k: int, explain: str):
+        """
+        Score the unscaled feature matrix X of batch rows `rows` and write their
+        results into the per-batch outputs (only once scoring has succeeded).
+        """
+        proba, X_scaled = self._score(X)
+        contributions = None
+        if explain != "none":
+            with stage("explain"):
+                contributions, _ = self.explainer.explain(X_scaled, proba)
+
+        fraud_probability[rows] = proba
+        if contributions is not None:
+            # Top-k factors by |contribution|
+            order, impacts = top_contributions(contributions, top_k)
+            feature_names = self.metadata['feature_names']
+            for row, idx in enumerate(rows):
+                top_risk_factors[idx] = risk_factors(feature_names, order[row], impacts[row])
+                if explain == "full":
+                    shap_values[idx] = dict(zip(feature_names, contributions[row].tolist()))
+
+    def _bisect_failed_rows(self, transactions: List[TransactionFeatures], rows: np.ndarray, outputs: tuple,
+                            top_k: int, explain: str, errors: np.ndarray):
+        """
+        Re-score batch rows whose scoring call failed in halves, recursively, so
+        only the rows that fail on their own are flagged in `errors`.
+        """
+        for half in np.array_split(rows, 2):
+            if not len(half):
+                continue
+            try:
+                with stage("features"):
+                    X = self.layout.build_matrix([transactions[idx] for idx in half])
+                self._score_batch_rows(X, half, *outputs, top_k, explain)
+            except Exception as e:
+                if len(half) > 1:
+                    self._bisect_failed_rows(transactions, half, outputs, top_k, explain, errors)
+                else:
+                    logger.warning(f"Batch row {half[0]} failed scoring: {e}")
+                    errors[half[0]] = True
+
+    def _predict_batch_sync(self, transactions: List[TransactionFeatures], top_k: int = 5,
+                            threshold: Optional[float] = None, explain: str = "topk") -> dict:
+        """
+        Score a whole batch in one pass: one feature matrix, one ensemble call
+        and (unless explain="none") one explainer call. Rows that fail feature
+        preparation are reported in the `errors` mask instead of failing the batch;
+        if the batch call fails, it is bisected and only the rows that fail on
+        their own are reported.
+        """
+        n = len(transactions)
+        X, errors = self._build_batch(transactions)
+
+        fraud_probability = np.ones(n, dtype=np.float64)
+        top_risk_factors = [[] for _ in range(n)]
+        shap_values = [None] * n
+        valid_idx = np.flatnonzero(~errors)
+
+        if len(valid_idx):
+            outputs = (fraud_probability, top_risk_factors, shap_values)
+            try:
+                self._score_batch_rows(X, valid_idx, *outputs, top_k, explain)
+            except Exception as e:
+                logger.warning(f"Batch scoring failed ({e}), bisecting {len(valid_idx)} rows")
+                self._bisect_failed_rows(transactions, valid_idx, outputs, top_k, explain, errors)
+
+        # Risk banding
+        if threshold is None:
+            threshold = self.metadata['optimal_threshold']
+        risk_level = np.select(
+            [fraud_probability >= threshold + 0.2,
+             fraud_probability >= threshold + 0.1,
+             fraud_probability >= threshold],
+            ["CRITICAL", "HIGH", "MEDIUM"],
+            default="LOW"
+        )
+        should_block = fraud_probability >= threshold
+
+        # Failed rows are treated as maximum risk
+        risk_level[errors] = "CRITICAL"
+        should_block[errors] = True
+        for idx in np.flatnonzero(errors):
+            top_risk_factors[idx] = [{"feature": "error", "impact": 1.0, "direction": "increases"}]
+
+        return {
+            "fraud_probability": fraud_probability,
+            "risk_level": risk_level,
+            "should_block": should_block,
+            "top_risk_factors": top_risk_factors,
+            "shap_values": shap_values,
+            "errors": errors
+        }
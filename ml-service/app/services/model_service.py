@@ -1,127 +1,341 @@
-import joblib
-import numpy as np
-import pandas as pd
-import shap
+import os
 import json
+import time
 import asyncio
-from pathlib import Path
+from typing import List, Optional
 from concurrent.futures import ThreadPoolExecutor
 from app.core.config import settings
 from app.core.logging import logger
+from app.core.metrics import (
+    CURRENT_THRESHOLD, MODEL_RELOAD_DURATION, MODEL_READY, WARMUP_DURATION, EXECUTOR_IN_FLIGHT, PREDICTIONS_IN_FLIGHT
+)
+from app.core.request_id import REQUEST_ID
 from app.schemas.transaction import TransactionFeatures
+from app.services.batcher import MicroBatcher
+from app.services.prediction_cache import PredictionCache, feature_key
+from app.services.model_bundle import ModelBundle, model_dir_lock
+from app.services.warmup import EXPLAIN_LEVELS, WarmupRounds, synthetic_transactions
+from app.services.stages import timed_call, record_call
+from app.services import process_pool
 
 class ModelService:
+    """
+    Serves the current ModelBundle. A reload builds and warms a new bundle
+    off the event loop and swaps it in with one reference assignment; each
+    request pins the bundle it started with, so it never sees a mix of
+    versions, and the old bundle is released once its requests have drained.
+
+    `ready` turns true once warm_up() has run the serving path of this
+    process; a reload warms the new bundle before the swap, so it stays true.
+    """
+
     def __init__(self):
-        self.lgb_model = None
-        self.xgb_model = None
-        self.scaler = None
-        self.label_encoders = None
-        self.metadata = None
-        self.explainer = None
+        self.bundle: Optional[ModelBundle] = None
         self.executor = ThreadPoolExecutor(max_workers=4)
+        self.batcher = MicroBatcher(
+            self._predict_many,
+            window_ms=settings.MICRO_BATCH_WINDOW_MS,
+            max_batch_size=settings.MICRO_BATCH_MAX_SIZE,
+            max_in_flight=4
+        )
+        self.cache = PredictionCache(
+            max_entries=settings.PREDICTION_CACHE_MAX_ENTRIES,
+            ttl_seconds=settings.PREDICTION_CACHE_TTL_SECONDS
+        )
+        self._reload_lock: Optional[asyncio.Lock] = None
+        # Thread-executor calls in flight; new ones wait while a pool is forked (see _start_pool)
+        self._executor_calls = 0
+        self._executor_drained: Optional[asyncio.Event] = None
+        self._executor_open: Optional[asyncio.Event] = None
+        self.ready = False
+        self.warmup_report: Optional[dict] = None
+
+    # Read-only views of the current bundle (pin `bundle` for anything that spans an await)
+
+    @property
+    def metadata(self) -> Optional[dict]:
+        return self.bundle.metadata if self.bundle else None
+
+    @property
+    def lgb_model(self):
+        return self.bundle.lgb_model if self.bundle else None
+
+    @property
+    def xgb_model(self):
+        return self.bundle.xgb_model if self.bundle else None
+
+    @property
+    def scaler(self):
+        return self.bundle.scaler if self.bundle else None
+
+    @property
+    def label_encoders(self):
+        return self.bundle.label_encoders if self.bundle else None
+
+    @property
+    def layout(self):
+        return self.bundle.layout if self.bundle else None
+
+    @property
+    def backend(self):
+        return self.bundle.backend if self.bundle else None
+
+    @property
+    def explainer(self):
+        return self.bundle.explainer if self.bundle else None
 
     def load_models(self):
-        """Load models from disk"""
-        logger.info("Loading models...")
+        """Load, warm and activate the models on disk (blocking: startup, tools and benchmarks)"""
         try:
-            model_dir = settings.MODEL_DIR
-            self.lgb_model = joblib.load(model_dir / 'lgb_model.joblib')
-            self.xgb_model = joblib.load(model_dir / 'xgb_model.joblib')
-            self.scaler = joblib.load(model_dir / 'scaler.joblib')
-            self.label_encoders = joblib.load(model_dir / 'label_encoders.joblib')
-
-            with open(model_dir / 'metadata.json', 'r') as f:
-                self.metadata = json.load(f)
-
-            logger.info("Initializing SHAP explainer...")
-            self.explainer = shap.TreeExplainer(self.lgb_model)
-            
-            logger.info(f"Models loaded successfully. Version: {self.metadata['version']}")
+            bundle = self._load_bundle()
+            if settings.INFERENCE_EXECUTOR == "process":
+                bundle.start_pool(settings.PROCESS_POOL_WORKERS)
+            self._activate(bundle)
         except Exception as e:
             logger.error(f"Error loading models: {e}")
             raise
 
-    def _prepare_features(self, transaction: TransactionFeatures) -> tuple[np.ndarray, pd.DataFrame]:
-        """Prepare features for prediction (CPU bound)"""
-        data = transaction.model_dump()
+    async def reload(self) -> ModelBundle:
+        """
+        Load and warm the models on disk in a background thread, then swap
+        them in. Requests keep being served by the current bundle meanwhile;
+        concurrent reloads run one after another.
+        """
+        if self._reload_lock is None:
+            self._reload_lock = asyncio.Lock()
+        async with self._reload_lock:
+            try:
+                bundle = await asyncio.to_thread(self._load_bundle)
+                await self._start_pool(bundle)
+            except Exception as e:
+                logger.error(f"Error loading models: {e}")
+                raise
+            self._activate(bundle)
+            return bundle
 
-        # Feature Engineering
-        data['amount_log'] = np.log1p(data['amount'])
-        data['is_weekend'] = int(data['day_of_week'] in [5, 6])
-        data['is_night'] = int(data['hour'] >= 22 or data['hour'] <= 6)
-        data['is_business_hours'] = int(9 <= data['hour'] <= 18)
+    def _load_bundle(self) -> ModelBundle:
+        start_time = time.time()
+        bundle = ModelBundle.load(settings.MODEL_DIR)
+        bundle.warm()
+        MODEL_RELOAD_DURATION.observe(time.time() - start_time)
+        return bundle
 
-        # Categorical Encoding
-        if 'last_phone_model' in data and data['last_phone_model']:
-            if 'last_phone_model_categorical' in self.label_encoders:
-                le = self.label_encoders['last_phone_model_categorical']
-                try:
-                    data['last_phone_model_categorical_encoded'] = le.transform([data['last_phone_model']])[0]
-                except:
-                    data['last_phone_model_categorical_encoded'] = -1
-            del data['last_phone_model']
-
-        if 'last_os' in data and data['last_os']:
-            if 'last_os_categorical' in self.label_encoders:
-                le = self.label_encoders['last_os_categorical']
-                try:
-                    data['last_os_categorical_encoded'] = le.transform([data['last_os']])[0]
-                except:
-                    data['last_os_categorical_encoded'] = -1
-            del data['last_os']
-
-        if 'direction' in data and data['direction']:
-            if 'direction' in self.label_encoders:
-                le = self.label_encoders['direction']
+    async def _start_pool(self, bundle: ModelBundle):
+        """
+        Fork the bundle's worker processes (INFERENCE_EXECUTOR=process) from a
+        helper thread, off the event loop. The thread executor is drained and
+        held idle meanwhile: a fork while a scoring thread is inside LightGBM /
+        XGBoost could hand the child a native lock that thread held.
+        """
+        if settings.INFERENCE_EXECUTOR != "process":
+            return
+        self._executor_events()
+        self._executor_open.clear()
+        try:
+            await self._executor_drained.wait()
+            await asyncio.to_thread(bundle.start_pool, settings.PROCESS_POOL_WORKERS)
+        finally:
+            self._executor_open.set()
+
+    def _executor_events(self):
+        if self._executor_open is None:
+            self._executor_open, self._executor_drained = asyncio.Event(), asyncio.Event()
+            self._executor_open.set()
+            self._executor_drained.set()
+
+    async def _thread_call(self, fn, *args):
+        """
+        timed_call(fn, *args) on the thread executor, once no pool is being
+        forked. The call counts as in flight until its thread has finished,
+        even if the awaiting request is cancelled.
+        """
+        self._executor_events()
+        await self._executor_open.wait()
+        loop = asyncio.get_running_loop()
+        self._executor_calls += 1
+        self._executor_drained.clear()
+        future = self.executor.submit(timed_call, fn, *args)
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(self._executor_call_done))
+        return await asyncio.wrap_future(future)
+
+    def _executor_call_done(self):
+        self._executor_calls -= 1
+        if self._executor_calls == 0:
+            self._executor_drained.set()
+
+    def _activate(self, bundle: ModelBundle):
+        # The swap: from here on every new request pins the new bundle
+        old_bundle, self.bundle = self.bundle, bundle
+        self.cache.clear()
+        CURRENT_THRESHOLD.set(bundle.threshold)
+        logger.info(f"Models loaded successfully. Version: {bundle.version}")
+        if old_bundle is not None:
+            old_bundle.retire()
+
+    async def warm_up(self) -> bool:
+        """
+        Push synthetic traffic through this process's serving path (micro-batcher,
+        executor threads or worker processes, batch scoring; the prediction cache
+        is bypassed) in rounds until a round's time settles, then report ready.
+        The bundle's models were already warmed when it was loaded.
+        """
+        bundle = self.bundle
+        if bundle is None:
+            return False
+        start_time = time.time()
+        transactions = synthetic_transactions(bundle.label_encoders, settings.WARMUP_BATCH_SIZE, seed=1)
+        rounds = WarmupRounds()
+        try:
+            while True:
+                round_start = time.perf_counter()
+                await asyncio.gather(*(
+                    self._predict_uncached(bundle, transaction, EXPLAIN_LEVELS[i % len(EXPLAIN_LEVELS)])
+                    for i, transaction in enumerate(transactions)
+                ))
+                for explain in EXPLAIN_LEVELS:
+                    await self.predict_batch(transactions, explain=explain)
+                if rounds.add(time.perf_counter() - round_start):
+                    break
+        except Exception as e:
+            logger.error(f"Warm-up failed, not reporting ready: {e}")
+            return False
+
+        self.warmup_report = rounds.report()
+        self.ready = True
+        MODEL_READY.set(1)
+        WARMUP_DURATION.observe(time.time() - start_time)
+        logger.info(f"Warm-up finished, ready: {self.warmup_report}")
+        return True
+
+    def refresh_threshold(self):
+        """
+        Re-read optimal_threshold from metadata.json (updated by another
+        process). Skipped while the file describes another model version than
+        the loaded one: a newly promoted version's threshold is not meant for it.
+        """
+        with open(settings.MODEL_DIR / 'metadata.json', 'r') as f:
+            metadata = json.load(f)
+        if self.bundle is not None and metadata.get('version') != self.bundle.version:
+            logger.warning(f"metadata.json is at version {metadata.get('version')}, not {self.bundle.version}: "
+                           f"threshold not refreshed")
+            return
+        self.set_threshold(metadata['optimal_threshold'])
+
+    async def save_metadata(self) -> bool:
+        """
+        Persist the current metadata (threshold) to metadata.json through a
+        temporary file and an atomic rename: other workers re-read it on
+        SIGUSR1 and must never see a partly written file. Written under the
+        model directory lock, and only while the file still describes this
+        process's model version (a newly promoted version keeps its own).
+        """
+        return await asyncio.to_thread(self._write_metadata, dict(self.bundle.metadata))
+
+    @staticmethod
+    def _write_metadata(metadata: dict) -> bool:
+        path = settings.MODEL_DIR / 'metadata.json'
+        with model_dir_lock(settings.MODEL_DIR, exclusive=True):
+            with open(path, 'r') as f:
+                current_version = json.load(f).get('version')
+            if current_version != metadata['version']:
+                logger.warning(f"metadata.json is at version {current_version}, not {metadata['version']}: "
+                               f"threshold not persisted")
+                return False
+            tmp = path.with_name(f".metadata.json.{os.getpid()}.tmp")
+            with open(tmp, 'w') as f:
+                json.dump(metadata, f, indent=2)
+            os.replace(tmp, path)
+        return True
+
+    def set_threshold(self, threshold: float):
+        """Apply a new decision threshold in this process"""
+        if self.bundle is not None:
+            self.bundle.metadata['optimal_threshold'] = threshold
+        self.cache.clear()
+        CURRENT_THRESHOLD.set(threshold)
+
+    async def _run(self, bundle: ModelBundle, method: str, *args, request_id: Optional[str] = None):
+        """
+        Run a CPU-bound bundle method on the thread pool, or on the bundle's
+        worker processes, and record its executor queue wait and pipeline
+        stages (exemplar: `request_id`, default the current request's).
+        """
+        executor = "thread" if bundle.pool is None else "process"
+        submitted = time.monotonic()
+        with EXECUTOR_IN_FLIGHT.labels(executor=executor).track_inprogress():
+            if bundle.pool is not None:
+                result, timings, started = await asyncio.get_running_loop().run_in_executor(
+                    bundle.pool, process_pool.call, method, *args
+                )
+            else:
+                result, timings, started = await self._thread_call(getattr(bundle, method), *args)
+        record_call(executor, submitted, started, timings, request_id)
+        return result
+
+    async def _predict_many(self, requests: List[tuple]) -> list:
+        """
+        Micro-batch of (bundle, transaction, explain, request_id) requests. Rows
+        are scored on the bundle their request pinned: one group normally, two
+        for a batch that straddles a swap. The group's stage timings carry the
+        first row's request id.
+        """
+        groups = {}
+        for idx, (bundle, _, _, _) in enumerate(requests):
+            groups.setdefault(id(bundle), (bundle, []))[1].append(idx)
+        results: list = [None] * len(requests)
+        for bundle, rows in groups.values():
+            group_results = await self._run(bundle, '_predict_many_sync', [requests[idx][1:3] for idx in rows],
+                                            request_id=requests[rows[0]][3])
+            for idx, result in zip(rows, group_results):
+                results[idx] = result
+        return results
+
+    async def predict(self, transaction: TransactionFeatures, explain: str = "full",
+                      bundle: Optional[ModelBundle] = None) -> dict:
+        """
+        Async wrapper for prediction (micro-batched with concurrent calls).
+        Results are cached per feature vector, model version and explain
+        level; identical concurrent requests are scored once. The result also
+        carries the model_version and threshold of the bundle that scored it:
+        `bundle` (kept pinned by the caller) or the current one.
+        """
+        bundle = bundle or self.bundle
+        with PREDICTIONS_IN_FLIGHT.labels(kind="single").track_inprogress():
+            if not settings.PREDICTION_CACHE_ENABLED:
+                result = await self._predict_uncached(bundle, transaction, explain)
+            else:
                 try:
-                    data['direction_encoded'] = le.transform([data['direction']])[0]
-                except:
-                    data['direction_encoded'] = -1
-            del data['direction']
-
-        # Create DataFrame
-        df = pd.DataFrame([data])
-
-        # Add missing features
-        for feat in self.metadata['feature_names']:
-            if feat not in df.columns:
-                df[feat] = -999
-
-        # Sort columns
-        df = df[self.metadata['feature_names']]
-
-        # Fill NaN
-        df = df.fillna(-999)
-
-        # Scale
-        X_scaled = self.scaler.transform(df)
-
-        return X_scaled, df
-
-    def _predict_sync(self, transaction: TransactionFeatures) -> dict:
-        """Synchronous prediction logic"""
-        X_scaled, _ = self._prepare_features(transaction)
-
-        lgb_proba = self.lgb_model.predict_proba(X_scaled)[0, 1]
-        xgb_proba = self.xgb_model.predict_proba(X_scaled)[0, 1]
-
-        fraud_probability = float(0.6 * lgb_proba + 0.4 * xgb_proba)
-        
-        # SHAP
-        shap_values = self.explainer.shap_values(X_scaled)
-        if isinstance(shap_values, list):
-            shap_values = shap_values[1]
-        
-        shap_dict = dict(zip(self.metadata['feature_names'], shap_values[0]))
-        
-        return {
-            "fraud_probability": fraud_probability,
-            "shap_values": shap_dict
-        }
-
-    async def predict(self, transaction: TransactionFeatures) -> dict:
-        """Async wrapper for prediction"""
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(self.executor, self._predict_sync, transaction)
+                    key = feature_key(bundle.layout.build_row(transaction), bundle.version, explain)
+                except Exception:
+                    # Let the scoring path report the feature error
+                    key = None
+                if key is None:
+                    result = await self._predict_uncached(bundle, transaction, explain)
+                else:
+                    result = await self.cache.get_or_compute(
+                        key, lambda: self._predict_uncached(bundle, transaction, explain)
+                    )
+        return {**result, "model_version": bundle.version, "threshold": bundle.threshold}
+
+    async def _predict_uncached(self, bundle: ModelBundle, transaction: TransactionFeatures, explain: str) -> dict:
+        with bundle.pinned():
+            if settings.MICRO_BATCH_ENABLED:
+                # The batch runs in the batcher's task: the request id travels with the item
+                return await self.batcher.submit((bundle, transaction, explain, REQUEST_ID.get()))
+            return await self._run(bundle, '_predict_sync', transaction, explain)
+
+    async def predict_batch(self, transactions: List[TransactionFeatures], top_k: int = 5,
+                            explain: str = "topk") -> dict:
+        """Async wrapper for single-pass batch scoring"""
+        bundle = self.bundle
+        with bundle.pinned(), PREDICTIONS_IN_FLIGHT.labels(kind="batch").track_inprogress():
+            # Threshold is read here: worker processes don't see runtime threshold updates
+            return await self._run(bundle, '_predict_batch_sync', transactions, top_k, bundle.threshold, explain)
+
+    async def close(self):
+        """Stop the micro-batcher and the worker processes"""
+        await self.batcher.close()
+        if self.bundle is not None:
+            self.bundle.close()
 
 model_service = ModelService()
@@ -0,0 +1,103 @@
+import time
+import asyncio
+import hashlib
+import numpy as np
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict
+from app.core.metrics import PREDICTION_CACHE_REQUESTS, PREDICTION_CACHE_EVICTIONS, PREDICTION_CACHE_ENTRIES
+
+
+def feature_key(row: np.ndarray, *parts: str) -> str:
+    """
+    Canonical key of a prepared (unscaled) feature row plus context such as
+    the model version and explain level. -0.0 is folded into 0.0 so equal
+    vectors always hash equally.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    values = np.ascontiguousarray(row, dtype=np.float64).ravel() + 0.0
+    digest.update(values.tobytes())
+    for part in parts:
+        digest.update(b'\0' + str(part).encode())
+    return digest.hexdigest()
+
+
+class PredictionCache:
+    """
+    In-process LRU cache of prediction results with a TTL and request
+    coalescing (singleflight).
+
+    At most `max_entries` results are kept (least recently used are evicted
+    first), each for at most `ttl_seconds`. Concurrent get_or_compute() calls
+    with the same key share one computation; the computation is shielded, so
+    a cancelled caller does not cancel it for the others. clear() drops every
+    entry and keeps computations started before it from being stored.
+
+    Cached results are shared between callers and must not be mutated.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, result)
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self._generation = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Any:
+        """Cached result for key, or None"""
+        entries = self._entries
+        entry = entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            entries.pop(key, None)
+            PREDICTION_CACHE_EVICTIONS.labels(reason="expired").inc()
+            PREDICTION_CACHE_ENTRIES.set(len(entries))
+            return None
+        entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, key: str, result: Any):
+        self._entries[key] = (time.monotonic() + self.ttl, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            PREDICTION_CACHE_EVICTIONS.labels(reason="capacity").inc()
+        PREDICTION_CACHE_ENTRIES.set(len(self._entries))
+
+    def clear(self):
+        """
+        Invalidate everything (model reload, threshold change). Swaps in new
+        containers, so it is safe to call from a signal handler.
+        """
+        self._generation += 1
+        dropped, self._entries, self._in_flight = len(self._entries), OrderedDict(), {}
+        if dropped:
+            PREDICTION_CACHE_EVICTIONS.labels(reason="invalidated").inc(dropped)
+        PREDICTION_CACHE_ENTRIES.set(0)
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[Any]]) -> Any:
+        """Cached result for key; otherwise join or start the computation of it"""
+        result = self.get(key)
+        if result is not None:
+            PREDICTION_CACHE_REQUESTS.labels(result="hit").inc()
+            return result
+
+        task = self._in_flight.get(key)
+        if task is not None:
+            PREDICTION_CACHE_REQUESTS.labels(result="coalesced").inc()
+        else:
+            PREDICTION_CACHE_REQUESTS.labels(result="miss").inc()
+            task = asyncio.ensure_future(compute())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done, generation=self._generation: self._store(key, done, generation))
+        return await asyncio.shield(task)
+
+    def _store(self, key: str, task: asyncio.Future, generation: int):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        # Results computed across an invalidation are not cached; failures never are
+        if generation == self._generation and not task.cancelled() and task.exception() is None:
+            self.put(key, task.result())
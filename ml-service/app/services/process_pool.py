@@ -0,0 +1,62 @@
+import gc
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait
+from app.core.logging import logger
+from app.services.stages import timed_call
+
+# Per-worker thread count of the native libraries (one process per core)
+WORKER_THREADS = 1
+
+
+# The ModelBundle this worker serves (inherited from the parent at fork)
+_bundle = None
+
+
+def _init_worker(bundle):
+    """
+    Runs in every forked worker: adopt the bundle, pin the native libraries to
+    one thread. gc.freeze() moves the inherited objects out of the collector's
+    reach, so collections in the worker don't touch (and copy) the shared pages.
+    """
+    global _bundle
+    gc.freeze()
+    _bundle = bundle
+    bundle.set_threads(WORKER_THREADS)
+
+
+def call(method: str, *args):
+    """Run a ModelBundle method on the worker's (fork-inherited) bundle; returns timed_call()'s tuple"""
+    return timed_call(getattr(_bundle, method), *args)
+
+
+def _ready() -> int:
+    return os.getpid()
+
+
+def create_pool(workers: int, bundle) -> ProcessPoolExecutor:
+    """
+    Fork a pool of inference workers serving `bundle`.
+
+    Workers are forked eagerly, inherit the bundle copy-on-write (fork passes
+    it to the initializer without pickling) and never load anything themselves.
+    Blocking until every worker is ready: run it off the event loop.
+    """
+    workers = workers or os.cpu_count() or 1
+    # Garbage collected now isn't inherited (and frozen) by every worker
+    gc.collect()
+    pool = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('fork'),
+        initializer=_init_worker,
+        initargs=(bundle,)
+    )
+    # Fork all workers now, while the parent's state is the one to share
+    wait([pool.submit(_ready) for _ in range(workers)])
+    logger.info(f"Process pool ready: {workers} workers")
+    return pool
+
+
+def retire_pool(pool: ProcessPoolExecutor):
+    """Let an old pool finish its queued work and exit, without blocking"""
+    pool.shutdown(wait=False, cancel_futures=False)
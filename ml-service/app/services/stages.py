@@ -0,0 +1,58 @@
+"""
+Per-stage timing of the scoring pipeline.
+
+Stages run wherever a scoring call runs (an executor thread or a worker
+process, where nothing reaches the serving process's metrics), so they are
+collected per call: timed_call() returns the stage timings with the result
+and ModelService records them in the serving process.
+"""
+
+import time
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+from app.core.metrics import STAGE_LATENCY, EXECUTOR_QUEUE_WAIT
+from app.core.request_id import exemplar
+
+_local = threading.local()
+
+
+@contextmanager
+def stage(name: str):
+    """Time a block as stage `name` of the current timed_call() (nested re-runs add up)"""
+    timings = getattr(_local, "timings", None)
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
+
+
+def timed_call(fn: Callable, *args) -> tuple:
+    """
+    (result, {stage: seconds}, started) of fn(*args). `started` is on the
+    time.monotonic() clock, which is system-wide on Linux, so a worker
+    process's start can be compared with the parent's submit time.
+    """
+    started = time.monotonic()
+    _local.timings = timings = {}
+    try:
+        return fn(*args), timings, started
+    finally:
+        _local.timings = None
+
+
+def observe_stage(name: str, seconds: float, request_id: Optional[str] = None):
+    STAGE_LATENCY.labels(stage=name).observe(seconds, exemplar=exemplar(request_id))
+
+
+def record_call(executor: str, submitted: float, started: float, timings: Dict[str, float],
+                request_id: Optional[str] = None):
+    """Queue wait and stage timings of one timed_call() submitted to `executor` at `submitted`"""
+    EXECUTOR_QUEUE_WAIT.labels(executor=executor).observe(max(started - submitted, 0.0),
+                                                          exemplar=exemplar(request_id))
+    for name, seconds in timings.items():
+        observe_stage(name, seconds, request_id)
@@ -0,0 +1,167 @@
+from typing import Any, Dict, List, Tuple
+from app.schemas.transaction import TransactionFeatures
+from app.services.features import is_night
+
+# AML score scale requested by the AML prompt (AML_SCORE: ...)
+AML_LEVELS = ("LOW", "MEDIUM", "HIGH", "CRITICAL")
+
+# Описания признаков модели для аналитика
+FEATURE_LABELS = {
+    "amount": "сумма транзакции",
+    "amount_log": "сумма транзакции",
+    "amount_bin": "диапазон суммы",
+    "monthly_os_changes": "смены ОС за месяц",
+    "monthly_phone_model_changes": "смены устройства за месяц",
+    "logins_last_7_days": "число входов за 7 дней",
+    "logins_last_30_days": "число входов за 30 дней",
+    "login_frequency_7d": "частота входов за 7 дней",
+    "login_frequency_30d": "частота входов за 30 дней",
+    "freq_change_7d_vs_mean": "изменение частоты входов",
+    "logins_7d_over_30d_ratio": "доля входов за последнюю неделю",
+    "avg_login_interval_30d": "средний интервал между входами",
+    "std_login_interval_30d": "разброс интервалов между входами",
+    "var_login_interval_30d": "разброс интервалов между входами",
+    "ewm_login_interval_7d": "недавний интервал между входами",
+    "burstiness_login_interval": "всплески активности входов",
+    "fano_factor_login_interval": "нерегулярность входов",
+    "zscore_avg_login_interval_7d": "отклонение интервала входов от нормы",
+    "hour": "время транзакции",
+    "day_of_week": "день недели",
+    "is_weekend": "выходной день",
+    "is_night": "ночное время",
+    "is_business_hours": "рабочее время",
+    "last_phone_model_categorical_encoded": "модель устройства",
+    "last_os_categorical_encoded": "операционная система",
+    "direction_encoded": "направление перевода",
+}
+
+RECOMMENDATIONS = {
+    "CRITICAL": "Заблокировать транзакцию и связаться с клиентом по подтверждённому каналу для верификации.",
+    "HIGH": "Приостановить транзакцию до подтверждения клиентом (звонок или push-подтверждение).",
+    "MEDIUM": "Запросить дополнительное подтверждение (OTP) и проверить последние операции клиента.",
+    "LOW": "Провести транзакцию в обычном режиме, дополнительных действий не требуется.",
+}
+
+# Сумма от этого значения считается крупной (тенге)
+LARGE_AMOUNT = 1_000_000
+
+# Сумма в пределах этой доли ниже круглого порога (1 млн, 10 млн, ...) - признак дробления
+STRUCTURING_MARGIN = 0.05
+
+
+def _describe(feature: str) -> str:
+    return FEATURE_LABELS.get(feature, feature)
+
+
+def _tenge(amount: float) -> str:
+    return f"{amount:,.0f}".replace(",", " ") + " тенге"
+
+
+class TemplateAnalyzer:
+    """
+    Deterministic Russian-language analysis without an LLM: the top risk
+    factors, the risk level and rule-based behavioural signals from the raw
+    transaction fields are rendered into the same three texts the LLM
+    produces (analysis, recommendation, AML block in the AML_SCORE format of
+    the AML prompt). Pure string formatting, a few microseconds per call.
+    """
+
+    def signals(self, t: TransactionFeatures) -> List[Tuple[str, bool]]:
+        """Behavioural red flags as (description, relevant for AML)"""
+        found = []
+        if is_night(t.hour):
+            found.append((f"транзакция в ночное время ({t.hour}:00)", False))
+        if (t.monthly_phone_model_changes or 0) >= 2:
+            found.append((f"частая смена устройства ({t.monthly_phone_model_changes} за месяц)", False))
+        elif t.monthly_phone_model_changes == 1:
+            found.append(("недавняя смена устройства", False))
+        if (t.monthly_os_changes or 0) >= 2:
+            found.append((f"частая смена ОС ({t.monthly_os_changes} за месяц)", False))
+        if t.last_phone_model is None and t.last_os is None:
+            found.append(("нет данных об устройстве клиента", False))
+
+        logins_7d, logins_30d = t.logins_last_7_days, t.logins_last_30_days
+        if logins_30d is not None and logins_30d <= 1:
+            found.append(("почти нет входов за месяц (неактивный аккаунт)", True))
+        elif logins_7d is not None and logins_30d and logins_30d >= 5 and logins_7d / logins_30d > 0.6:
+            found.append((f"резкий рост активности: {logins_7d} из {logins_30d} входов за последнюю неделю", False))
+        if t.burstiness_login_interval is not None and t.burstiness_login_interval > 0.5:
+            found.append(("входы идут всплесками", False))
+        if t.zscore_avg_login_interval_7d is not None and abs(t.zscore_avg_login_interval_7d) >= 2:
+            found.append((f"интервал между входами отклоняется от обычного "
+                          f"({t.zscore_avg_login_interval_7d:+.1f} σ)", False))
+
+        if t.amount >= LARGE_AMOUNT:
+            found.append((f"крупная сумма ({_tenge(t.amount)})", True))
+        threshold = LARGE_AMOUNT
+        while threshold <= t.amount * (1 + STRUCTURING_MARGIN):
+            if threshold * (1 - STRUCTURING_MARGIN) <= t.amount < threshold:
+                found.append((f"сумма чуть ниже порога {_tenge(threshold)} (возможное дробление)", True))
+                break
+            threshold *= 10
+        return found
+
+    def analyze(self, t: TransactionFeatures, probability: float, risk_level: str,
+                top_factors: List[Dict[str, Any]]) -> Tuple[str, str, str]:
+        """(ai_analysis, aml_analysis, recommendation)"""
+        signals = self.signals(t)
+        return (
+            self._fraud_text(probability, risk_level, top_factors, signals),
+            self._aml_text(risk_level, signals),
+            self._recommendation(risk_level, signals),
+        )
+
+    def _fraud_text(self, probability: float, risk_level: str, top_factors: List[Dict[str, Any]],
+                    signals: List[Tuple[str, bool]]) -> str:
+        sentences = [f"Вероятность мошенничества {probability:.1%}, уровень риска {risk_level}."]
+        increases = [_describe(f["feature"]) for f in top_factors[:5] if f["impact"] > 0]
+        decreases = [_describe(f["feature"]) for f in top_factors[:5] if f["impact"] <= 0]
+        increases = list(dict.fromkeys(increases))[:3]
+        decreases = list(dict.fromkeys(decreases))[:2]
+        if increases:
+            sentences.append(f"Риск повышают: {', '.join(increases)}.")
+        if decreases:
+            sentences.append(f"Риск снижают: {', '.join(decreases)}.")
+        if signals:
+            sentences.append(f"Поведенческие признаки: {'; '.join(text for text, _ in signals[:3])}.")
+        elif risk_level != "LOW":
+            sentences.append("Явных поведенческих аномалий не выявлено, оценка основана на модели.")
+        return " ".join(sentences)
+
+    def _aml_text(self, risk_level: str, signals: List[Tuple[str, bool]]) -> str:
+        aml_signals = [text for text, aml in signals if aml]
+        level = AML_LEVELS.index(risk_level) if risk_level in AML_LEVELS else 0
+        level = min(level + len(aml_signals), len(AML_LEVELS) - 1)
+
+        features = aml_signals + [text for text, aml in signals if not aml]
+        if not features:
+            features = ["выраженных признаков отмывания не выявлено"]
+        actions = []
+        if aml_signals:
+            actions.append("Проверить источник средств и получателя перевода")
+            actions.append("Проверить связанные переводы клиента за последние 30 дней")
+        elif level >= AML_LEVELS.index("HIGH"):
+            actions.append("Проверить получателя перевода")
+            actions.append("Проверить историю переводов клиента")
+        else:
+            actions.append("Дополнительная AML-проверка не требуется")
+
+        lines = [f"AML_SCORE: {AML_LEVELS[level]}", "ПРИЗНАКИ:"]
+        lines += [f"- {text}" for text in features[:3]]
+        lines.append("ДЕЙСТВИЯ:")
+        lines += [f"- {text}" for text in actions]
+        return "\n".join(lines)
+
+    def _recommendation(self, risk_level: str, signals: List[Tuple[str, bool]]) -> str:
+        recommendation = RECOMMENDATIONS.get(risk_level, RECOMMENDATIONS["MEDIUM"])
+        if risk_level != "LOW" and any("устройств" in text for text, _ in signals):
+            recommendation += " Уточнить у клиента смену устройства."
+        return recommendation
+
+    @staticmethod
+    def as_fraud_answer(ai_analysis: str, recommendation: str) -> str:
+        """The analysis in the format of the fraud prompt answer (for streaming)"""
+        return f"**Краткий анализ** {ai_analysis}\n\n**Рекомендация:** {recommendation}"
+
+
+template_analyzer = TemplateAnalyzer()
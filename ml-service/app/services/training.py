@@ -0,0 +1,413 @@
+import os
+import sys
+import json
+import time
+import uuid
+import shutil
+import signal
+import asyncio
+import sqlite3
+import threading
+from collections import deque
+from pathlib import Path
+from typing import List, Optional, Set
+from app.core.config import settings
+from app.core.logging import logger
+from app.core.metrics import TRAINING_JOBS_TOTAL, TRAINING_JOB_DURATION
+from app.services.analysis_cache import open_shared_db
+from app.services.model_bundle import ModelBundle, model_dir_lock
+from app.services.model_service import model_service
+from app.prefork import PARENT_PID_ENV, notify_reload
+
+# Job states: queued -> running -> succeeded | failed | timeout | cancelled
+QUEUED, RUNNING, SUCCEEDED, FAILED, TIMEOUT, CANCELLED = (
+    "queued", "running", "succeeded", "failed", "timeout", "cancelled"
+)
+ACTIVE = (QUEUED, RUNNING)
+
+TRAIN_SCRIPT = Path(__file__).parent.parent.parent / "train_model.py"
+
+# Progress stages, recognised by the section markers train_model.py prints
+STAGE_MARKERS = (
+    ("[*] ", "loading_data"),
+    ("[PROCESS]", "feature_engineering"),
+    ("[TRAIN]", "training"),
+    ("[CV]", "cross_validation"),
+    ("[FINAL]", "fitting"),
+    ("[TEST]", "evaluating"),
+    ("[FOLD]", "exporting"),
+    ("[MLflow] Логирование", "logging_to_mlflow"),
+    ("[SAVE]", "saving"),
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS training_jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    pid INTEGER,
+    owner INTEGER,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    model_version TEXT,
+    mlflow_run_id TEXT,
+    metrics TEXT,
+    error TEXT
+);
+"""
+
+
+def _alive(pid: Optional[int]) -> bool:
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class TrainingJobStore:
+    """
+    Training jobs in a SQLite (WAL) file next to their logs, so GET /train/{id}
+    works on whichever pre-forked worker receives it, and at most one job is
+    active per node.
+
+    `owner` is the serving process that runs the job through all its stages
+    (training, validation, promotion, reload), `pid` the trainer while it
+    runs. A job is active for as long as its owner is alive.
+    """
+
+    def __init__(self, job_dir: Path):
+        self.job_dir = Path(job_dir)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None or self._pid != os.getpid():
+            conn = open_shared_db(self.job_dir / "jobs.sqlite3", _SCHEMA)
+            if "owner" not in {row[1] for row in conn.execute("PRAGMA table_info(training_jobs)")}:
+                # Job table from before owners were recorded
+                try:
+                    conn.execute("ALTER TABLE training_jobs ADD COLUMN owner INTEGER")
+                except sqlite3.OperationalError:
+                    pass  # added by another worker meanwhile
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def log_path(self, job_id: str) -> Path:
+        return self.job_dir / job_id / "train.log"
+
+    def staging_dir(self, job_id: str) -> Path:
+        return self.job_dir / job_id / "models"
+
+    def create(self) -> tuple[str, bool]:
+        """
+        (job id, created): a new queued job owned by this process, or the job
+        already active. Jobs whose owner is gone (worker or service restarted
+        mid-run) are failed.
+        """
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for job_id, pid, owner, status in conn.execute(
+                    "SELECT id, pid, owner, status FROM training_jobs WHERE status IN (?, ?)", ACTIVE
+                ).fetchall():
+                    # Rows without an owner predate it: only their trainer can tell
+                    lost = not _alive(owner) if owner else status == RUNNING and not _alive(pid)
+                    if lost:
+                        conn.execute(
+                            "UPDATE training_jobs SET status = ?, finished_at = ?, error = ? WHERE id = ?",
+                            (FAILED, time.time(), "Training job lost: its process exited", job_id)
+                        )
+                        continue
+                    conn.execute("COMMIT")
+                    return job_id, False
+                job_id = uuid.uuid4().hex
+                conn.execute(
+                    "INSERT INTO training_jobs (id, status, stage, owner, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (job_id, QUEUED, "starting", os.getpid(), time.time())
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return job_id, True
+
+    def active_owners(self) -> Set[int]:
+        """Live processes that own an active job"""
+        with self._lock:
+            owners = self._connection().execute(
+                "SELECT owner FROM training_jobs WHERE status IN (?, ?) AND owner IS NOT NULL", ACTIVE
+            ).fetchall()
+        return {owner for owner, in owners if _alive(owner)}
+
+    def fail_active(self, error: str) -> int:
+        """Fail every active job (their owners are gone: the service restarted); returns how many"""
+        with self._lock:
+            cursor = self._connection().execute(
+                "UPDATE training_jobs SET status = ?, finished_at = ?, error = ? WHERE status IN (?, ?)",
+                (FAILED, time.time(), error, *ACTIVE)
+            )
+        return cursor.rowcount
+
+    def update(self, job_id: str, **fields):
+        if "metrics" in fields and fields["metrics"] is not None:
+            fields["metrics"] = json.dumps(fields["metrics"])
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._connection().execute(
+                f"UPDATE training_jobs SET {columns} WHERE id = ?", (*fields.values(), job_id)
+            )
+
+    def read(self, job_id: str, log_lines: int = 0) -> Optional[dict]:
+        """The job row plus the last `log_lines` lines of its log, or None if unknown"""
+        with self._lock:
+            conn = self._connection()
+            cursor = conn.execute("SELECT * FROM training_jobs WHERE id = ?", (job_id,))
+            row = cursor.fetchone()
+            names = [column[0] for column in cursor.description]
+        if row is None:
+            return None
+        job = dict(zip(names, row))
+        job["job_id"] = job.pop("id")
+        job["metrics"] = json.loads(job["metrics"]) if job["metrics"] else None
+        job["logs"] = None
+        if log_lines:
+            try:
+                with open(self.log_path(job_id), "r", encoding="utf-8", errors="replace") as f:
+                    job["logs"] = [line.rstrip("\n") for line in deque(f, maxlen=log_lines)]
+            except FileNotFoundError:
+                job["logs"] = []
+        return job
+
+
+class TrainingJobManager:
+    """
+    Runs train_model.py as a background job instead of inside the request.
+
+    The training process gets its own process group, a thread cap
+    (TRAINING_THREADS for OpenMP/BLAS), a lower scheduling priority
+    (TRAINING_NICE) and optionally a CPU set (TRAINING_CPUS), so it doesn't
+    starve the scoring workers. It writes into a per-job staging directory;
+    only when it exits cleanly and the staged models load and score are
+    they copied over MODEL_DIR and hot-swapped in. A failed, timed-out or
+    cancelled job leaves the served models untouched.
+    """
+
+    def __init__(self, store: TrainingJobStore, timeout_seconds: float = 3600.0):
+        self.store = store
+        self.timeout = timeout_seconds
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def submit(self) -> tuple[str, bool]:
+        """Start a training job and return (job id, created); an active job is returned instead of starting another"""
+        job_id, created = await asyncio.to_thread(self.store.create)
+        if created:
+            task = asyncio.create_task(self._run(job_id))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return job_id, created
+
+    async def get(self, job_id: str, log_lines: int = 0) -> Optional[dict]:
+        return await asyncio.to_thread(self.store.read, job_id, log_lines)
+
+    def _environment(self) -> dict:
+        env = os.environ.copy()
+        env["MLFLOW_TRACKING_URI"] = os.getenv("MLFLOW_TRACKING_URI", "https://forte.grekdev.com:5000")
+        env["PYTHONUNBUFFERED"] = "1"
+        if settings.TRAINING_THREADS:
+            threads = str(settings.TRAINING_THREADS)
+            for name in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "LOKY_MAX_CPU_COUNT"):
+                env[name] = threads
+        return env
+
+    def _limit(self, pid: int):
+        """Priority and CPU set of the training process (inherited by the threads it starts)"""
+        try:
+            os.setpriority(os.PRIO_PROCESS, pid, settings.TRAINING_NICE)
+            if settings.TRAINING_CPUS:
+                os.sched_setaffinity(pid, _parse_cpus(settings.TRAINING_CPUS))
+        except (OSError, AttributeError) as e:
+            logger.warning(f"Could not apply training resource limits: {e}")
+
+    def _prepare(self, job_id: str) -> Path:
+        staging = self.store.staging_dir(job_id)
+        staging.mkdir(parents=True, exist_ok=True)
+        # The trainer bumps the version found in the current metadata
+        current = settings.MODEL_DIR / "metadata.json"
+        if current.exists():
+            shutil.copy2(current, staging / "metadata.json")
+        return staging
+
+    async def _run(self, job_id: str):
+        start_time = time.time()
+        status, error = FAILED, None
+        try:
+            staging = await asyncio.to_thread(self._prepare, job_id)
+            returncode = await self._train(job_id, staging)
+            # The trainer is gone; the job stays active (validate, promote, reload) under its owner
+            await self._set(job_id, pid=None)
+            if returncode is None:
+                status, error = TIMEOUT, f"Training exceeded {self.timeout:.0f}s timeout"
+            elif returncode != 0:
+                error = f"Training exited with code {returncode}"
+            else:
+                await self._set(job_id, stage="validating")
+                await asyncio.to_thread(self._validate, staging)
+                await self._set(job_id, stage="promoting")
+                await asyncio.to_thread(self._promote, staging)
+                await self._set(job_id, stage="reloading")
+                if os.environ.get(PARENT_PID_ENV):
+                    # Pre-forked: the parent loads the promoted models once and rolls the
+                    # workers onto them (notify_reload below, once the job has ended)
+                    metadata = json.loads(await asyncio.to_thread((settings.MODEL_DIR / "metadata.json").read_text))
+                    version = metadata['version']
+                else:
+                    version = (await model_service.reload()).version
+
+                metrics = None
+                metrics_path = settings.MODEL_DIR / "metrics.json"
+                if metrics_path.exists():
+                    metrics = json.loads(await asyncio.to_thread(metrics_path.read_text))
+                await self._set(
+                    job_id, model_version=version, metrics=metrics,
+                    mlflow_run_id=(metrics or {}).get("mlflow", {}).get("run_id")
+                )
+                status = SUCCEEDED
+        except asyncio.CancelledError:
+            status, error = CANCELLED, "Service shut down during training"
+            raise
+        except Exception as e:
+            logger.error(f"Training job {job_id} failed: {e}")
+            error = str(e)
+        finally:
+            TRAINING_JOBS_TOTAL.labels(status=status).inc()
+            TRAINING_JOB_DURATION.observe(time.time() - start_time)
+            # A failed job keeps the stage it failed in
+            fields = {"stage": "done"} if status == SUCCEEDED else {}
+            try:
+                # Shielded: a cancelled job is still recorded (the write finishes on its thread)
+                await asyncio.shield(self._set(
+                    job_id, status=status, error=error, pid=None, finished_at=time.time(), **fields
+                ))
+            except Exception as e:
+                logger.error(f"Failed to record training job {job_id}: {e}")
+            logger.info(f"Training job {job_id} {status}")
+
+        if status == SUCCEEDED:
+            notify_reload()
+
+    async def _set(self, job_id: str, **fields):
+        await asyncio.to_thread(self.store.update, job_id, **fields)
+
+    async def _train(self, job_id: str, staging: Path) -> Optional[int]:
+        """Exit code of the training process, None on timeout"""
+        log_path = self.store.log_path(job_id)
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, str(TRAIN_SCRIPT), "--model-dir", str(staging),
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT,
+            env=self._environment(), cwd=str(TRAIN_SCRIPT.parent), start_new_session=True
+        )
+        self._limit(process.pid)
+        await self._set(job_id, status=RUNNING, pid=process.pid, started_at=time.time())
+        logger.info(f"Training job {job_id} started (pid {process.pid})")
+        try:
+            with open(log_path, "ab") as log:
+                await asyncio.wait_for(self._follow(job_id, process, log), self.timeout)
+            return await process.wait()
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            if process.returncode is None:
+                # Timeout or cancellation: stop the whole process group
+                try:
+                    os.killpg(process.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+                await process.wait()
+
+    async def _follow(self, job_id: str, process: asyncio.subprocess.Process, log):
+        """
+        Copy the trainer's output to the job log and track its stage. Lines
+        longer than the stream buffer (warning dumps, progress bars without
+        newlines) are copied in pieces; only line starts are matched.
+        """
+        stage = None
+        line_start = True
+        while True:
+            try:
+                chunk = await process.stdout.readuntil(b"\n")
+            except asyncio.IncompleteReadError as e:
+                chunk = e.partial  # end of output
+            except asyncio.LimitOverrunError as e:
+                chunk = await process.stdout.read(e.consumed)
+            if not chunk:
+                break
+            log.write(chunk)
+            log.flush()
+            if line_start:
+                text = chunk.decode("utf-8", errors="replace").lstrip()
+                for marker, name in STAGE_MARKERS:
+                    if text.startswith(marker) and name != stage:
+                        stage = name
+                        await self._set(job_id, stage=stage)
+                        break
+            line_start = chunk.endswith(b"\n")
+
+    @staticmethod
+    def _validate(staging: Path):
+        """The staged models must load and score before they replace the served ones"""
+        bundle = ModelBundle.load(staging)
+        try:
+            bundle.warm()
+        finally:
+            bundle.retire()
+
+    @staticmethod
+    def _promote(staging: Path):
+        """
+        Copy the staged artifacts over MODEL_DIR, each through a temporary file
+        and an atomic rename, under the exclusive model directory lock: loads
+        (ModelBundle.load) and threshold writes (save_metadata) wait for the
+        whole version to be in place, so none of them sees old metadata next
+        to new model files.
+        """
+        files = [p for p in staging.iterdir() if p.is_file() and not p.name.startswith(".")]
+        settings.MODEL_DIR.mkdir(parents=True, exist_ok=True)
+        with model_dir_lock(settings.MODEL_DIR, exclusive=True):
+            for path in files:
+                tmp = settings.MODEL_DIR / f".{path.name}.tmp"
+                shutil.copy2(path, tmp)
+                os.replace(tmp, settings.MODEL_DIR / path.name)
+
+    async def close(self):
+        """
+        Cancel running jobs and stop their training processes. The pre-fork
+        parent does not roll a worker that owns an active job, so under
+        pre-fork this only happens when the service stops.
+        """
+        tasks: List[asyncio.Task] = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def _parse_cpus(spec: str) -> Set[int]:
+    """'0-1,4' -> {0, 1, 4}"""
+    cpus = set()
+    for part in spec.split(","):
+        first, _, last = part.strip().partition("-")
+        cpus.update(range(int(first), int(last or first) + 1))
+    return cpus
+
+
+training_manager = TrainingJobManager(
+    TrainingJobStore(settings.TRAINING_JOB_DIR),
+    timeout_seconds=settings.TRAINING_TIMEOUT_SECONDS
+)
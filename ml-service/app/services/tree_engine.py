@@ -0,0 +1,275 @@
+import re
+import json
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+
+# LightGBM treats |x| <= kZeroThreshold as zero for zero_as_missing splits
+_LGB_ZERO_THRESHOLD = 1e-35
+
+# Missing-value handling of a split node
+MISSING_NONE, MISSING_ZERO, MISSING_NAN = 0, 1, 2
+
+# Rows evaluated per traversal chunk (bounds the (rows, trees) work arrays)
+CHUNK_ROWS = 2048
+
+
+class TreeEnsemble:
+    """
+    Gradient-boosted trees flattened into contiguous node arrays.
+
+    All trees share one set of arrays (feature, threshold, left, right, value,
+    default_left, missing); leaves point to themselves, so every row walks every
+    tree in lock-step for max_depth vectorized steps over a (rows, trees) index
+    matrix. Leaf values are accumulated in tree order, like the native
+    libraries do.
+
+    mean_value holds the cover-weighted mean leaf value below every node, used
+    for path (Saabas) attributions: each split on the path credits its feature
+    with the change in mean value, so contributions sum exactly to the margin.
+    """
+
+    def __init__(self, nodes: List[dict], roots: List[int], max_depth: int, strict: bool,
+                 dtype, base_margin: float, sigmoid: float):
+        self.feature = np.array([n['feature'] for n in nodes], dtype=np.intp)
+        self.threshold = np.array([n['threshold'] for n in nodes], dtype=dtype)
+        self.left = np.array([n['left'] for n in nodes], dtype=np.intp)
+        self.right = np.array([n['right'] for n in nodes], dtype=np.intp)
+        self.value = np.array([n['value'] for n in nodes], dtype=dtype)
+        self.default_left = np.array([n['default_left'] for n in nodes], dtype=bool)
+        self.missing = np.array([n['missing'] for n in nodes], dtype=np.int8)
+        self.roots = np.array(roots, dtype=np.intp)
+        self.max_depth = max_depth
+        self.strict = strict  # XGBoost goes left on x < t, LightGBM on x <= t
+        self.dtype = dtype
+        self.base_margin = dtype(base_margin)
+        self.sigmoid = sigmoid
+        self.has_zero_missing = bool((self.missing == MISSING_ZERO).any())
+        self.mean_value = self._mean_values(np.array([n.get('cover', 0.0) for n in nodes], dtype=np.float64))
+        self.bias = float(self.base_margin) + float(self.mean_value[self.roots].sum())
+
+    def _mean_values(self, cover: np.ndarray) -> np.ndarray:
+        """Cover-weighted mean leaf value of every subtree (children follow their parent)"""
+        mean = self.value.astype(np.float64)
+        internal = np.flatnonzero(self.left != np.arange(len(self.left)))
+        for node in internal[::-1]:
+            left, right = self.left[node], self.right[node]
+            total = cover[left] + cover[right]
+            if total > 0:
+                mean[node] = (cover[left] * mean[left] + cover[right] * mean[right]) / total
+            else:
+                mean[node] = (mean[left] + mean[right]) / 2
+            cover[node] = total
+        return mean
+
+    # Node arrays and scalar parameters, as stored in a model bundle file
+    ARRAYS = ('feature', 'threshold', 'left', 'right', 'value', 'default_left', 'missing', 'roots', 'mean_value')
+
+    def to_arrays(self) -> Tuple[Dict[str, np.ndarray], dict]:
+        """(node arrays, scalar parameters): everything from_arrays() needs"""
+        params = {'max_depth': self.max_depth, 'strict': self.strict, 'dtype': np.dtype(self.dtype).name,
+                  'base_margin': float(self.base_margin), 'sigmoid': self.sigmoid, 'bias': self.bias}
+        return {name: getattr(self, name) for name in self.ARRAYS}, params
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray], params: dict) -> "TreeEnsemble":
+        """
+        Rebuild a compiled ensemble without recompiling, e.g. on read-only
+        memory-mapped arrays (never written after compilation).
+        """
+        engine = cls.__new__(cls)
+        for name in cls.ARRAYS:
+            setattr(engine, name, arrays[name])
+        engine.max_depth = params['max_depth']
+        engine.strict = params['strict']
+        engine.dtype = np.dtype(params['dtype']).type
+        engine.base_margin = engine.dtype(params['base_margin'])
+        engine.sigmoid = params['sigmoid']
+        engine.bias = params['bias']
+        engine.has_zero_missing = bool((engine.missing == MISSING_ZERO).any())
+        return engine
+
+    @property
+    def num_trees(self) -> int:
+        return len(self.roots)
+
+    @property
+    def num_nodes(self) -> int:
+        return len(self.feature)
+
+    # ---------- compilation ----------
+
+    @classmethod
+    def from_lightgbm(cls, model) -> "TreeEnsemble":
+        """Compile an LGBMClassifier or lightgbm.Booster (binary objective)"""
+        booster = getattr(model, 'booster_', model)
+        # The text model is ~10x faster to produce than dump_model() JSON
+        header, trees_text = booster.model_to_string().split('\nTree=', 1)
+        fields = dict(re.findall(r'^(\w+)=(.*)$', header, flags=re.M))
+        objective = fields['objective'].split()
+        if (objective[0] != 'binary' or int(fields.get('num_tree_per_iteration', 1)) != 1
+                or re.search(r'^average_output$', header, flags=re.M)):
+            raise NotImplementedError(f"Unsupported LightGBM model: {fields['objective']}")
+        sigmoid = float(next((p.split(':')[1] for p in objective[1:] if p.startswith('sigmoid:')), 1.0))
+
+        nodes, roots, max_depth = [], [], 0
+
+        def parse(tree: dict, key: str, dtype):
+            return np.array(tree[key].split(), dtype=dtype) if key in tree else np.zeros(0, dtype=dtype)
+
+        def add(tree: dict, ref: int, depth: int) -> int:
+            """Append node `ref` (>= 0 internal, < 0 leaf ~ref) and its subtree"""
+            nonlocal max_depth
+            idx = len(nodes)
+            nodes.append(None)
+            if ref < 0:
+                leaf = ~ref
+                max_depth = max(max_depth, depth)
+                nodes[idx] = {'feature': 0, 'threshold': 0.0, 'left': idx, 'right': idx,
+                              'value': float(tree['leaf_value'][leaf]), 'default_left': True,
+                              'missing': MISSING_NONE, 'cover': float(tree['leaf_count'][leaf])}
+                return idx
+            decision_type = int(tree['decision_type'][ref])
+            if decision_type & 1:
+                raise NotImplementedError("Categorical LightGBM splits are not supported")
+            left = add(tree, int(tree['left_child'][ref]), depth + 1)
+            right = add(tree, int(tree['right_child'][ref]), depth + 1)
+            nodes[idx] = {'feature': int(tree['split_feature'][ref]), 'threshold': float(tree['threshold'][ref]),
+                          'left': left, 'right': right, 'value': 0.0,
+                          'default_left': bool(decision_type & 2),
+                          'missing': (decision_type >> 2) & 3}  # 0 None, 1 Zero, 2 NaN
+            return idx
+
+        # trees_text starts right after the first "Tree=" marker
+        trees_text = trees_text.split('end of trees', 1)[0]
+        for block in re.split(r'^Tree=\d+$', trees_text, flags=re.M):
+            text = dict(re.findall(r'^(\w+)=(.*)$', block, flags=re.M))
+            if not text:
+                continue
+            tree = {
+                'leaf_value': parse(text, 'leaf_value', np.float64),
+                'leaf_count': parse(text, 'leaf_count', np.float64),
+                'split_feature': parse(text, 'split_feature', np.int64),
+                'threshold': parse(text, 'threshold', np.float64),
+                'decision_type': parse(text, 'decision_type', np.int64),
+                'left_child': parse(text, 'left_child', np.int64),
+                'right_child': parse(text, 'right_child', np.int64),
+            }
+            if len(tree['leaf_count']) == 0:
+                tree['leaf_count'] = np.zeros(len(tree['leaf_value']))
+            roots.append(add(tree, 0 if int(text['num_leaves']) > 1 else ~0, 0))
+
+        return cls(nodes, roots, max_depth, strict=False, dtype=np.float64,
+                   base_margin=0.0, sigmoid=sigmoid)
+
+    @classmethod
+    def from_xgboost(cls, model) -> "TreeEnsemble":
+        """Compile an XGBClassifier or xgboost.Booster (binary:logistic, gbtree)"""
+        booster = model.get_booster() if hasattr(model, 'get_booster') else model
+        learner = json.loads(booster.save_raw('json'))['learner']
+        if learner['objective']['name'] != 'binary:logistic' or learner['gradient_booster']['name'] != 'gbtree':
+            raise NotImplementedError("Only binary:logistic gbtree XGBoost models are supported")
+
+        # base_score is stored in probability space, e.g. "5E-1" or "[5E-1]"
+        base_score = np.float32(float(learner['learner_model_param']['base_score'].strip('[]')))
+        base_margin = -np.log(np.float32(1.0) / base_score - np.float32(1.0))
+
+        nodes, roots, max_depth = [], [], 0
+        for tree in learner['gradient_booster']['model']['trees']:
+            if any(tree.get('split_type', [])):
+                raise NotImplementedError("Categorical XGBoost splits are not supported")
+            offset = len(nodes)
+            roots.append(offset)
+            lefts, rights = tree['left_children'], tree['right_children']
+            covers = tree['sum_hessian']
+            depth = [0] * len(lefts)
+            for i, (left, right, feature, condition, default_left) in enumerate(zip(
+                lefts, rights, tree['split_indices'], tree['split_conditions'], tree['default_left']
+            )):
+                if left == -1:
+                    # Leaf: split_conditions holds the leaf weight
+                    max_depth = max(max_depth, depth[i])
+                    nodes.append({'feature': 0, 'threshold': 0.0, 'left': offset + i, 'right': offset + i,
+                                  'value': condition, 'default_left': True, 'missing': MISSING_NONE,
+                                  'cover': covers[i]})
+                else:
+                    depth[left] = depth[right] = depth[i] + 1
+                    nodes.append({'feature': feature, 'threshold': condition,
+                                  'left': offset + left, 'right': offset + right, 'value': 0.0,
+                                  'default_left': bool(default_left), 'missing': MISSING_NAN})
+
+        return cls(nodes, roots, max_depth, strict=True, dtype=np.float32,
+                   base_margin=base_margin, sigmoid=1.0)
+
+    # ---------- inference ----------
+
+    def _leaves(self, X: np.ndarray, contrib: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Leaf index reached by every (row, tree) pair. If `contrib` (rows,
+        features) is given, path attributions are accumulated into it.
+        """
+        n, n_features = X.shape
+        node = np.broadcast_to(self.roots, (n, self.num_trees)).copy()
+        row_offset = (np.arange(n, dtype=np.intp) * n_features)[:, None]
+        X_flat = X.ravel()
+        check_missing = self.has_zero_missing or np.isnan(X_flat).any()
+
+        for _ in range(self.max_depth):
+            x = X_flat.take(row_offset + self.feature[node])
+            threshold = self.threshold[node]
+            if check_missing:
+                nan = np.isnan(x)
+                missing = self.missing[node]
+                # LightGBM "None" splits treat NaN as 0.0; XGBoost never uses this type
+                x = np.where(nan & (missing == MISSING_NONE), 0.0, x).astype(self.dtype, copy=False)
+                is_missing = (nan & (missing == MISSING_NAN)) | (
+                    (missing == MISSING_ZERO) & (nan | (np.abs(x) <= _LGB_ZERO_THRESHOLD)))
+                go_left = np.where(is_missing, self.default_left[node],
+                                   x < threshold if self.strict else x <= threshold)
+            else:
+                go_left = x < threshold if self.strict else x <= threshold
+            child = np.where(go_left, self.left[node], self.right[node])
+            if contrib is not None:
+                # Leaves loop onto themselves, so finished paths add 0
+                delta = self.mean_value[child] - self.mean_value[node]
+                cell = (row_offset + self.feature[node]).ravel()
+                contrib += np.bincount(cell, weights=delta.ravel(), minlength=contrib.size).reshape(contrib.shape)
+            node = child
+
+        return node
+
+    def margin(self, X: np.ndarray) -> np.ndarray:
+        """Raw margin (sum of leaf values) for every row"""
+        X = np.ascontiguousarray(X, dtype=self.dtype)
+        out = np.empty(len(X), dtype=self.dtype)
+        for start in range(0, len(X), CHUNK_ROWS):
+            chunk = X[start:start + CHUNK_ROWS]
+            values = self.value[self._leaves(chunk)]
+            # Sequential accumulation in tree order, seeded with the base margin
+            values = np.concatenate([np.full((len(chunk), 1), self.base_margin, dtype=self.dtype), values], axis=1)
+            out[start:start + CHUNK_ROWS] = np.cumsum(values, axis=1, dtype=self.dtype)[:, -1]
+        return out
+
+    def contributions(self, X: np.ndarray) -> np.ndarray:
+        """
+        Path attributions of shape (rows, features + 1), last column the bias,
+        in the layout of LightGBM pred_contrib / XGBoost pred_contribs
+        (approx_contribs). Rows sum to the margin.
+        """
+        X = np.ascontiguousarray(X, dtype=self.dtype)
+        n, n_features = X.shape
+        out = np.empty((n, n_features + 1), dtype=np.float64)
+        out[:, -1] = self.bias
+        for start in range(0, n, CHUNK_ROWS):
+            chunk = X[start:start + CHUNK_ROWS]
+            contrib = np.zeros((len(chunk), n_features), dtype=np.float64)
+            self._leaves(chunk, contrib)
+            out[start:start + CHUNK_ROWS, :-1] = contrib
+        return out
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """Probability of the positive class"""
+        margin = self.margin(X)
+        one = self.dtype(1.0)
+        # exp in double, rounded once to the model dtype (closest to libm expf for XGBoost)
+        exp = np.exp(-self.sigmoid * margin.astype(np.float64)).astype(self.dtype)
+        return one / (one + exp)
@@ -0,0 +1,92 @@
+"""
+Warm-up traffic: synthetic transactions pushed through the scoring paths
+before a replica reports ready, repeated in rounds until a round takes
+about as long as the one before it (lazy allocations in LightGBM/XGBoost,
+first attribution passes and executor threads are paid for by then).
+"""
+
+import random
+from typing import Dict, List, Optional
+from app.core.config import settings
+from app.schemas.transaction import TransactionFeatures
+
+# Explain levels every warm-up round goes through
+EXPLAIN_LEVELS = ("full", "topk", "none")
+
+
+def synthetic_transactions(label_encoders: Optional[Dict], n: int, seed: int = 0) -> List[TransactionFeatures]:
+    """Transactions over the encoders' vocabularies, with unseen categories and missing values mixed in"""
+    rnd = random.Random(seed)
+    label_encoders = label_encoders or {}
+
+    def pick(key: str, unseen: str) -> str:
+        encoder = label_encoders.get(key)
+        if encoder is None or not len(encoder.classes_) or rnd.random() < 0.1:
+            return unseen
+        return str(encoder.classes_[rnd.randrange(len(encoder.classes_))])
+
+    def maybe(value: float) -> Optional[float]:
+        return None if rnd.random() < 0.2 else value
+
+    return [
+        TransactionFeatures(
+            amount=round(rnd.lognormvariate(9, 2), 2),
+            hour=rnd.randint(0, 23),
+            day_of_week=rnd.randint(0, 6),
+            direction=pick('direction', 'warm-up'),
+            monthly_os_changes=rnd.randint(0, 3),
+            monthly_phone_model_changes=rnd.randint(0, 3),
+            last_phone_model=pick('last_phone_model_categorical', 'warm-up'),
+            last_os=pick('last_os_categorical', 'warm-up'),
+            logins_last_7_days=rnd.randint(0, 40),
+            logins_last_30_days=rnd.randint(0, 150),
+            login_frequency_7d=maybe(rnd.uniform(0, 6)),
+            login_frequency_30d=maybe(rnd.uniform(0, 6)),
+            freq_change_7d_vs_mean=maybe(rnd.gauss(0, 1)),
+            logins_7d_over_30d_ratio=maybe(rnd.uniform(0, 1)),
+            avg_login_interval_30d=maybe(rnd.uniform(0, 1e5)),
+            std_login_interval_30d=maybe(rnd.uniform(0, 1e5)),
+            burstiness_login_interval=maybe(rnd.uniform(-1, 1)),
+            zscore_avg_login_interval_7d=maybe(rnd.gauss(0, 2)),
+        )
+        for _ in range(n)
+    ]
+
+
+class WarmupRounds:
+    """
+    Round timings of one warm-up. Done once the last round is within
+    WARMUP_TOLERANCE of the previous one (after WARMUP_MIN_ROUNDS), or after
+    WARMUP_MAX_ROUNDS or WARMUP_MAX_SECONDS; a single round when
+    WARMUP_ENABLED is off.
+    """
+
+    def __init__(self):
+        if settings.WARMUP_ENABLED:
+            self.min_rounds, self.max_rounds = settings.WARMUP_MIN_ROUNDS, settings.WARMUP_MAX_ROUNDS
+        else:
+            self.min_rounds = self.max_rounds = 1
+        self.max_seconds = settings.WARMUP_MAX_SECONDS
+        self.tolerance = settings.WARMUP_TOLERANCE
+        self.times: List[float] = []
+
+    @property
+    def stable(self) -> bool:
+        if len(self.times) < max(self.min_rounds, 2):
+            return False
+        last, previous = self.times[-1], self.times[-2]
+        return abs(last - previous) <= self.tolerance * previous
+
+    def add(self, seconds: float) -> bool:
+        """Record a round; True when the warm-up is done"""
+        self.times.append(seconds)
+        return self.stable or len(self.times) >= self.max_rounds or sum(self.times) >= self.max_seconds
+
+    def report(self) -> dict:
+        return {
+            "rounds": len(self.times),
+            "stable": self.stable,
+            "first_round_ms": round(self.times[0] * 1e3, 1) if self.times else None,
+            "last_round_ms": round(self.times[-1] * 1e3, 1) if self.times else None,
+            "total_ms": round(sum(self.times) * 1e3, 1),
+        }
@@ -0,0 +1 @@
+# Performance benchmarks for the ML service (run from ml-service/: python -m benchmarks.<name>)
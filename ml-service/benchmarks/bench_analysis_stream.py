@@ -0,0 +1,130 @@
+"""
+Streamed AI analysis (/predict/stream) versus the buffered /predict, against
+the local OpenAI-compatible stub in streaming mode.
+
+Starts benchmarks.llm_stub and uvicorn app.main:app in subprocesses and, for
+fresh transactions, reports the time until the client has something to show:
+the whole response for /predict; the `prediction` event (score and top
+factors), the first analysis token and the `done` event for /predict/stream.
+Then replays the streamed transactions through /predict to check that the
+finished streams were written to the analysis cache (no new completions,
+same analysis).
+
+    python -m benchmarks.bench_analysis_stream
+"""
+
+import os
+import sys
+import json
+import time
+import tempfile
+import subprocess
+import urllib.request
+import numpy as np
+from benchmarks.common import sample_transactions
+
+STUB_PORT = 8104
+APP_PORT = 8105
+LATENCY_MS = 800
+REQUESTS = 10
+BASE_URL = f"http://127.0.0.1:{APP_PORT}"
+
+
+def post(path: str, payload: dict):
+    req = urllib.request.Request(f"{BASE_URL}{path}", data=json.dumps(payload).encode(),
+                                 headers={"Content-Type": "application/json"})
+    return urllib.request.urlopen(req, timeout=60)
+
+
+def get_json(url: str) -> dict:
+    with urllib.request.urlopen(url, timeout=5) as response:
+        return json.loads(response.read())
+
+
+def wait_for(url: str, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            return get_json(url)
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up")
+
+
+def stream(payload: dict) -> tuple:
+    """({event: ms since the request for its first occurrence}, done data)"""
+    start = time.perf_counter()
+    first, event, done = {}, None, None
+    with post("/predict/stream", payload) as response:
+        for line in response:
+            line = line.decode().rstrip("\n")
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+                first.setdefault(event, (time.perf_counter() - start) * 1e3)
+            elif line.startswith("data: ") and event == "done":
+                done = json.loads(line[len("data: "):])
+    return first, done
+
+
+def run():
+    wait_for(f"http://127.0.0.1:{STUB_PORT}/stub/config")
+    wait_for(f"{BASE_URL}/health")
+    transactions = [t.model_dump() for t in sample_transactions(2 * REQUESTS + 1, seed=11)]
+    # Warm-up: the first request pays for lazy initialisation
+    post("/predict", transactions[-1]).read()
+
+    buffered = []
+    for payload in transactions[:REQUESTS]:
+        start = time.perf_counter()
+        post("/predict", payload).read()
+        buffered.append((time.perf_counter() - start) * 1e3)
+
+    firsts, streamed = [], []
+    for payload in transactions[REQUESTS:2 * REQUESTS]:
+        first, done = stream(payload)
+        firsts.append(first)
+        streamed.append(done)
+
+    def p50(values) -> str:
+        return f"{np.percentile(values, 50):6.0f}ms"
+
+    print(f"[BENCH] {REQUESTS} sequential requests, stub latency {LATENCY_MS}ms")
+    print(f"   /predict          full response      {p50(buffered)}")
+    print(f"   /predict/stream   prediction event   {p50([f['prediction'] for f in firsts])}")
+    print(f"                     first token        {p50([min(f.get('fraud', 1e9), f.get('aml', 1e9)) for f in firsts])}")
+    print(f"                     done               {p50([f['done'] for f in firsts])}")
+
+    calls = get_json(f"http://127.0.0.1:{STUB_PORT}/stub/config")["calls"]
+    same = 0
+    for payload, done in zip(transactions[REQUESTS:2 * REQUESTS], streamed):
+        with post("/predict", payload) as response:
+            result = json.loads(response.read())
+        same += all(result[k] == done[k] for k in ("ai_analysis", "aml_analysis", "recommendation"))
+    new_calls = get_json(f"http://127.0.0.1:{STUB_PORT}/stub/config")["calls"] - calls
+    print(f"   replay through /predict: {new_calls} new completions, {same}/{REQUESTS} identical analyses")
+
+
+def main():
+    workdir = tempfile.mkdtemp(prefix="bench-stream-")
+    env = {
+        **os.environ,
+        "OPENAI_API_KEY": "stub",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{STUB_PORT}/v1",
+        "AI_CACHE_PATH": os.path.join(workdir, "ai_analysis.sqlite3"),
+        "ENRICHMENT_STORE_PATH": os.path.join(workdir, "enrichment.sqlite3"),
+        "PREDICTION_CACHE_ENABLED": "false",
+    }
+    stub = subprocess.Popen([sys.executable, "-m", "benchmarks.llm_stub", "--port", str(STUB_PORT),
+                             "--latency-ms", str(LATENCY_MS), "--jitter-ms", "0"])
+    app = subprocess.Popen([sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(APP_PORT),
+                            "--log-level", "warning"], env=env, stdout=subprocess.DEVNULL)
+    try:
+        run()
+    finally:
+        for process in (app, stub):
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
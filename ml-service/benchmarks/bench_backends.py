@@ -0,0 +1,66 @@
+"""
+Inference backend benchmark: ensemble scoring of the prepared feature matrix
+through every backend in app.services.backends. Backends that apply the scaler
+themselves (onnx) get the unscaled matrix.
+
+Checks each backend against the native LightGBM/XGBoost predict_proba before
+timing it, then reports p50/p99 at batch sizes 1, 64 and
+10k. Feature preparation is excluded (see bench_features).
+
+    python -m benchmarks.bench_backends
+"""
+
+import time
+import numpy as np
+from app.core.config import settings
+from app.services.model_service import model_service
+from app.services.backends import BACKENDS, NativeBackend
+from benchmarks.common import sample_transactions, timeit, report
+
+# |Δp| tolerated against native: ONNX tree ensembles compare in float32
+PARITY_ATOL = 1e-5
+
+BATCH_SIZES = (1, 64, 10_000)
+REPEATS = {1: 300, 64: 100, 10_000: 5}
+
+
+def main():
+    model_service.load_models()
+    transactions = sample_transactions(max(BATCH_SIZES), model_service.label_encoders)
+    X_raw, errors = model_service.bundle._build_batch(transactions)
+    assert not errors.any()
+    X = model_service.layout.transform(X_raw.copy())
+
+    native = NativeBackend(model_service.lgb_model, model_service.xgb_model)
+    expected = native.predict(X)
+
+    backends = {}
+    for name, backend_cls in BACKENDS.items():
+        start = time.perf_counter()
+        try:
+            backend = backend_cls(model_service.lgb_model, model_service.xgb_model,
+                                  model_dir=settings.MODEL_DIR, metadata=model_service.metadata)
+        except Exception as e:
+            print(f"[SKIP] {name}: {e}")
+            continue
+        build_ms = (time.perf_counter() - start) * 1e3
+        inputs = X_raw if backend.applies_scaler else X
+        diff = np.abs(backend.predict(inputs) - expected)
+        print(f"[PARITY] {name}: build={build_ms:.0f}ms max|Δp|={diff.max():.3e} "
+              f"changed={np.count_nonzero(diff)}/{len(diff)}")
+        assert diff.max() <= PARITY_ATOL, f"{name} backend diverges from native"
+        backends[name] = (backend, inputs)
+
+    for size in BATCH_SIZES:
+        print(f"\n[BENCH] batch of {size}")
+        base = timeit(lambda: native.predict(X[:size]), repeat=REPEATS[size], warmup=2)
+        for name, (backend, inputs) in backends.items():
+            if type(backend) is NativeBackend:
+                report(name, base)
+                continue
+            batch = inputs[:size]
+            report(name, timeit(lambda: backend.predict(batch), repeat=REPEATS[size], warmup=2), base)
+
+
+if __name__ == "__main__":
+    main()
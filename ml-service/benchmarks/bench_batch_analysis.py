@@ -0,0 +1,115 @@
+"""
+Batched AI analysis for /predict/batch versus per-row analysis, against the
+local OpenAI-compatible stub (benchmarks.llm_stub, started in a subprocess).
+
+Per-row: AIService.analyze_transaction for every flagged row (two
+completions each). Batched: AIService.analyze_batch (AI_BATCH_CHUNK_SIZE
+rows per completion, AI_BATCH_MAX_PARALLEL chunks at a time). Reports
+completion calls and wall time, and checks every flagged row got a verdict.
+
+    python -m benchmarks.bench_batch_analysis
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import subprocess
+import urllib.request
+
+STUB_PORT = 8101
+LATENCY_MS = 400
+ROWS = 1000
+
+os.environ.update({
+    "OPENAI_API_KEY": "stub",
+    "OPENAI_BASE_URL": f"http://127.0.0.1:{STUB_PORT}/v1",
+    "AI_CACHE_ENABLED": "false",
+    "AI_ANALYSIS_MODE": "llm",
+})
+
+from app.services.model_service import model_service  # noqa: E402  (settings come from the environment above)
+from app.services.ai_service import ai_service, RISK_LEVELS  # noqa: E402
+from app.core.config import settings  # noqa: E402
+from benchmarks.common import sample_transactions  # noqa: E402
+
+
+def stub_calls() -> int:
+    with urllib.request.urlopen(f"http://127.0.0.1:{STUB_PORT}/stub/config", timeout=5) as response:
+        return json.loads(response.read())["calls"]
+
+
+def wait_for_stub(timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            return stub_calls()
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("LLM stub did not start")
+
+
+def check_verdict_types():
+    """A verdict with a non-string field is dropped (its row falls back), the others are kept"""
+    answer = json.dumps({"results": [
+        {"id": 1, "analysis": "ok", "aml": "AML_SCORE: LOW", "recommendation": "approve"},
+        {"id": 2, "analysis": ["not", "a", "string"], "aml": "AML_SCORE: LOW", "recommendation": "approve"},
+        {"id": 3, "analysis": "ok", "aml": {"score": "HIGH"}, "recommendation": "review"},
+        {"id": 4, "analysis": "ok", "recommendation": 5},
+        {"id": 5, "analysis": "ok", "recommendation": True},
+        {"id": 6, "analysis": "ok"},
+    ]})
+    verdicts = ai_service._parse_batch_verdicts(answer)
+    assert sorted(verdicts) == [1, 6], verdicts
+    assert verdicts[6] == {"analysis": "ok", "aml": None, "recommendation": None}
+    print("[OK] verdicts with non-string fields are dropped")
+
+
+async def run():
+    check_verdict_types()
+    model_service.load_models()
+    await ai_service.warm()  # as the app does at start-up
+    transactions = sample_transactions(ROWS, model_service.label_encoders)
+    # Flag a fixed share of rows regardless of the model, so the comparison does not depend on it
+    result = model_service.bundle._predict_batch_sync(transactions, 5, 0.0)
+    probabilities = result["fraud_probability"].tolist()
+    risk_levels = [RISK_LEVELS[i % 4] for i in range(ROWS)]
+    flagged = [i for i, level in enumerate(risk_levels) if level != "LOW"]
+    print(f"[BENCH] {ROWS} rows, {len(flagged)} flagged (>= {settings.AI_BATCH_MIN_RISK}), "
+          f"stub latency {LATENCY_MS}ms, chunk {settings.AI_BATCH_CHUNK_SIZE}, "
+          f"parallel {settings.AI_BATCH_MAX_PARALLEL}, gateway concurrency {settings.LLM_MAX_CONCURRENCY}")
+
+    calls = stub_calls()
+    start = time.perf_counter()
+    per_row = await asyncio.gather(*(
+        ai_service.analyze_transaction(transactions[i], probabilities[i], risk_levels[i],
+                                       result["top_risk_factors"][i])
+        for i in flagged
+    ))
+    elapsed = time.perf_counter() - start
+    analysed = sum(a[0] is not None for a in per_row)
+    print(f"   per-row   {stub_calls() - calls:5d} completions  {elapsed:6.2f}s  analysed {analysed}/{len(flagged)}")
+
+    calls = stub_calls()
+    start = time.perf_counter()
+    batched = await ai_service.analyze_batch(transactions, probabilities, risk_levels, result["top_risk_factors"])
+    elapsed = time.perf_counter() - start
+    analysed = sum(batched[i] is not None for i in flagged)
+    assert all(batched[i] is None for i in range(ROWS) if risk_levels[i] == "LOW")
+    print(f"   batched   {stub_calls() - calls:5d} completions  {elapsed:6.2f}s  analysed {analysed}/{len(flagged)}")
+
+
+def main():
+    stub = subprocess.Popen([sys.executable, "-m", "benchmarks.llm_stub", "--port", str(STUB_PORT),
+                             "--latency-ms", str(LATENCY_MS), "--jitter-ms", "50"])
+    try:
+        wait_for_stub()
+        asyncio.run(run())
+    finally:
+        stub.terminate()
+        stub.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Categorical encoding benchmark: sklearn LabelEncoder.transform (input
+validation + searchsorted, exceptions for unseen values) versus the
+CategoryLookup hash tables built by FeatureLayout at model load.
+
+    python -m benchmarks.bench_encoders
+"""
+
+import numpy as np
+from app.services.model_service import model_service
+from app.services.features import CategoryLookup, CATEGORICAL_FIELDS, UNKNOWN_CATEGORY
+from benchmarks.common import timeit, report
+
+
+def sklearn_encode(encoder, value) -> int:
+    """Per-value encoding as ModelService used to do it"""
+    try:
+        return encoder.transform([value])[0]
+    except:
+        return UNKNOWN_CATEGORY
+
+
+def main():
+    model_service.load_models()
+
+    for encoder_key in CATEGORICAL_FIELDS.values():
+        encoder = model_service.label_encoders.get(encoder_key)
+        if encoder is None:
+            continue
+        lookup = CategoryLookup.from_encoder(encoder)
+        classes = encoder.classes_.tolist()
+
+        # Parity on the full vocabulary and on unseen values
+        assert lookup.encode_many(classes).tolist() == encoder.transform(classes).tolist()
+        assert lookup.encode('__unseen__') == sklearn_encode(encoder, '__unseen__') == UNKNOWN_CATEGORY
+
+        hit, miss = classes[len(classes) // 2], '__unseen__'
+        rng = np.random.default_rng(0)
+        batch = [classes[i] for i in rng.integers(0, len(classes), 1000)]
+
+        print(f"\n[BENCH] {encoder_key} ({len(classes)} classes)")
+        base = timeit(lambda: sklearn_encode(encoder, hit), repeat=300)
+        report("LabelEncoder hit", base)
+        report("CategoryLookup hit", timeit(lambda: lookup.encode(hit), repeat=300), base)
+        base = timeit(lambda: sklearn_encode(encoder, miss), repeat=300)
+        report("LabelEncoder miss (exception)", base)
+        report("CategoryLookup miss", timeit(lambda: lookup.encode(miss), repeat=300), base)
+        base = timeit(lambda: encoder.transform(batch), repeat=20)
+        report("LabelEncoder batch of 1000", base)
+        report("CategoryLookup batch of 1000", timeit(lambda: lookup.encode_many(batch), repeat=20), base)
+
+
+if __name__ == "__main__":
+    main()
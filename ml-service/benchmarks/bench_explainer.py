@@ -0,0 +1,74 @@
+"""
+Explanation benchmark: shap.TreeExplainer on the LightGBM half (the old hot
+path, including its per-load setup) versus ContributionExplainer on the whole
+ensemble with the "path" and "shap" (native TreeSHAP) methods.
+
+Checks that ensemble attributions sum to logit(p) and that the native
+LightGBM pred_contrib agrees with shap.TreeExplainer, then reports setup time
+and p50/p99 at batch sizes 1 and 500. The service no longer depends on shap;
+install it separately to run this benchmark (pip install shap).
+
+    python -m benchmarks.bench_explainer
+"""
+
+import time
+import numpy as np
+from app.services.model_service import model_service
+from app.services.backends import LGB_WEIGHT, XGB_WEIGHT
+from app.services.explainer import ContributionExplainer, top_k
+from benchmarks.common import sample_transactions, timeit, report
+
+
+def main():
+    import shap
+
+    model_service.load_models()
+    lgb_model, xgb_model = model_service.lgb_model, model_service.xgb_model
+    transactions = sample_transactions(500, model_service.label_encoders)
+    X, errors = model_service.bundle._prepare_batch(transactions)
+    assert not errors.any()
+    proba = model_service.backend.predict(X)
+
+    start = time.perf_counter()
+    tree_explainer = shap.TreeExplainer(lgb_model)
+    print(f"[SETUP] shap.TreeExplainer: {(time.perf_counter() - start) * 1e3:.0f}ms")
+
+    def shap_values(X_):
+        values = tree_explainer.shap_values(X_)
+        return values[1] if isinstance(values, list) else values
+
+    # Native LightGBM TreeSHAP == shap's TreeSHAP on the same model
+    native = lgb_model.booster_.predict(X, pred_contrib=True)[:, :-1]
+    assert np.allclose(native, shap_values(X), atol=1e-9)
+
+    explainers = {}
+    for method in ("path", "shap"):
+        start = time.perf_counter()
+        explainer = ContributionExplainer(lgb_model, xgb_model, method=method)
+        print(f"[SETUP] ContributionExplainer({method}): {(time.perf_counter() - start) * 1e3:.0f}ms")
+
+        contributions, bias = explainer.explain(X, proba)
+        logit = np.log(proba) - np.log1p(-proba)
+        assert np.allclose(contributions.sum(axis=1) + bias, logit, atol=1e-9)
+        # The weighted per-model attributions, unscaled (the residual is in the bias)
+        lgb_contrib, xgb_contrib = explainer._model_contributions(X)
+        assert np.allclose(contributions, (LGB_WEIGHT * lgb_contrib + XGB_WEIGHT * xgb_contrib)[:, :-1])
+        explainers[method] = explainer
+
+    # argpartition top-k agrees with a full sort
+    idx, values = top_k(contributions, 5)
+    order = np.argsort(-np.abs(contributions), axis=1, kind='stable')[:, :5]
+    assert np.array_equal(np.abs(values), np.abs(np.take_along_axis(contributions, order, axis=1)))
+    print("[PARITY] attributions sum to logit(p), unscaled; pred_contrib == TreeExplainer; top-k == sort")
+
+    for size, repeat in ((1, 200), (500, 5)):
+        batch, p = X[:size], proba[:size]
+        print(f"\n[BENCH] batch of {size}")
+        base = timeit(lambda: shap_values(batch), repeat=repeat, warmup=2)
+        report("shap.TreeExplainer (LightGBM only)", base)
+        for method, explainer in explainers.items():
+            report(f"ensemble {method}", timeit(lambda: explainer.explain(batch, p), repeat=repeat, warmup=2), base)
+
+
+if __name__ == "__main__":
+    main()
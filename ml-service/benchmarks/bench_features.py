@@ -0,0 +1,88 @@
+"""
+Feature preparation micro-benchmark: legacy per-request pandas DataFrame path
+versus the compiled FeatureLayout used by ModelService.
+
+    python -m benchmarks.bench_features
+"""
+
+import numpy as np
+import pandas as pd
+from typing import List
+from app.services.model_service import model_service
+from app.schemas.transaction import TransactionFeatures
+from benchmarks.common import sample_transactions, timeit, report
+
+
+def legacy_prepare(transaction: TransactionFeatures) -> np.ndarray:
+    """The pre-FeatureLayout implementation, kept verbatim as the baseline"""
+    label_encoders = model_service.label_encoders
+    data = transaction.model_dump()
+    data['amount_log'] = np.log1p(data['amount'])
+    data['is_weekend'] = int(data['day_of_week'] in [5, 6])
+    data['is_night'] = int(data['hour'] >= 22 or data['hour'] <= 6)
+    data['is_business_hours'] = int(9 <= data['hour'] <= 18)
+    for field, key in [('last_phone_model', 'last_phone_model_categorical'),
+                       ('last_os', 'last_os_categorical'), ('direction', 'direction')]:
+        if field in data and data[field]:
+            if key in label_encoders:
+                try:
+                    data[f'{key}_encoded'] = label_encoders[key].transform([data[field]])[0]
+                except:
+                    data[f'{key}_encoded'] = -1
+            del data[field]
+    df = pd.DataFrame([data])
+    for feat in model_service.metadata['feature_names']:
+        if feat not in df.columns:
+            df[feat] = -999
+    df = df[model_service.metadata['feature_names']]
+    df = df.fillna(-999)
+    return model_service.scaler.transform(df)
+
+
+def legacy_prepare_batch(transactions: List[TransactionFeatures]) -> np.ndarray:
+    return np.vstack([legacy_prepare(t) for t in transactions])
+
+
+def main():
+    model_service.load_models()
+    transactions = sample_transactions(500, model_service.label_encoders)
+    # The schema accepts any amount: include those where log1p is undefined (-1
+    # gives -inf, which the DataFrame path's scaler rejects, so it is not compared)
+    for transaction, amount in zip(transactions, (-2.0, -0.5, 0.0, float('nan'))):
+        transaction.amount = amount
+    layout = model_service.layout
+
+    # Parity: the compiled layout must reproduce the DataFrame path exactly
+    expected = legacy_prepare_batch(transactions)
+    single = np.vstack([model_service.bundle._prepare_features(t) for t in transactions])
+    batch = layout.transform(layout.build_matrix(transactions))
+    assert np.array_equal(expected, single), "single-row layout differs from legacy path"
+    assert np.array_equal(expected, batch), "batch layout differs from legacy path"
+    print("[OK] FeatureLayout output is identical to the DataFrame path")
+
+    # Values the models cannot take (inf, beyond float32) are rejected by both paths
+    for amount in (float('inf'), 1e308):
+        poisoned = transactions[4].model_copy(update={'amount': amount})
+        for build in (layout.build_row, lambda t: layout.build_matrix([transactions[5], t])):
+            try:
+                build(poisoned)
+            except ValueError:
+                continue
+            raise AssertionError(f"amount={amount} was not rejected")
+    print("[OK] Out-of-range amounts are rejected")
+
+    t = transactions[0]
+    print("\n[BENCH] Single transaction")
+    base = timeit(lambda: legacy_prepare(t), repeat=300)
+    report("pandas DataFrame (legacy)", base)
+    report("FeatureLayout.build_row", timeit(lambda: model_service.bundle._prepare_features(t), repeat=300), base)
+
+    print(f"\n[BENCH] Batch of {len(transactions)}")
+    base = timeit(lambda: legacy_prepare_batch(transactions), repeat=5, warmup=1)
+    report("pandas DataFrame per row (legacy)", base)
+    report("FeatureLayout.build_matrix",
+           timeit(lambda: layout.transform(layout.build_matrix(transactions)), repeat=20), base)
+
+
+if __name__ == "__main__":
+    main()
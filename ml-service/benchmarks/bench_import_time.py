@@ -0,0 +1,113 @@
+"""
+Start-up time budget of the serving entry points, against the limits in
+benchmarks/import_budget.json.
+
+For each entry point (app.main, serve), a fresh interpreter runs
+`python -X importtime -c "import <module>"`; the cumulative time of the
+module (median of `runs`) must stay within its budget_ms, and none of its
+`deferred` modules (LLM client, MLflow, training and plotting libraries)
+may be imported: those load on first use. The heaviest packages it pulls
+in are listed.
+
+"startup" is what a replica does before it can serve: import app.main and
+load the models (the model libraries load here), timed in a fresh process.
+
+Exits with status 1 when a budget is exceeded. Budgets are set for a
+single-CPU box with a warm page cache.
+
+    python -m benchmarks.bench_import_time
+"""
+
+import os
+import sys
+import json
+import time
+import subprocess
+import numpy as np
+from pathlib import Path
+
+BUDGET_FILE = Path(__file__).with_name("import_budget.json")
+TOP = 8
+
+
+def importtime(module: str) -> tuple:
+    """(cumulative µs of `module`, {top-level package: cumulative µs} it pulled in) from -X importtime"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, env={**os.environ, "LOG_LEVEL": "WARNING"})
+    if result.returncode:
+        raise SystemExit(f"import {module} failed:\n{result.stderr[-2000:]}")
+    # A module's line follows those of everything it imported: the group that
+    # ends with `module` at the top level (earlier groups are interpreter start-up)
+    group = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        depth = len(name) - len(name.lstrip())
+        if depth == 1 and name.strip() == module:
+            return int(cumulative), group
+        group[name.strip()] = int(cumulative)
+        if depth == 1:
+            group = {}
+    raise SystemExit(f"import {module}: no -X importtime record")
+
+
+def child():
+    """Fresh process: import the app and load the models"""
+    start = time.perf_counter()
+    import app.main  # noqa: F401  (imported only to time the import)
+    from app.services.model_service import model_service
+    imported = time.perf_counter()
+    model_service.load_models()
+    loaded = time.perf_counter()
+    print(json.dumps({"import": imported - start, "load": loaded - imported, "modules": sorted(sys.modules)}))
+
+
+def startup() -> dict:
+    result = subprocess.run([sys.executable, "-m", "benchmarks.bench_import_time", "--child"],
+                            capture_output=True, text=True, env={**os.environ, "LOG_LEVEL": "WARNING"})
+    if result.returncode:
+        raise SystemExit(f"start-up failed:\n{result.stderr[-2000:]}")
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def main():
+    budget = json.loads(BUDGET_FILE.read_text())
+    failures = []
+
+    for module, limits in budget["imports"].items():
+        runs = [importtime(module) for _ in range(budget["runs"])]
+        total_ms = np.median([total for total, _ in runs]) / 1e3
+        modules = runs[-1][1]
+        loaded = sorted(name for name in limits["deferred"] if name in modules)
+        ok = total_ms <= limits["budget_ms"] and not loaded
+        print(f"[{'OK' if ok else 'OVER'}] import {module}: {total_ms:.0f}ms (budget {limits['budget_ms']}ms)"
+              + (f", loads deferred {', '.join(loaded)}" if loaded else ""))
+        packages = {name: cumulative for name, cumulative in modules.items()
+                    if "." not in name and name != module.split(".")[0]}
+        for name, cumulative in sorted(packages.items(), key=lambda item: -item[1])[:TOP]:
+            print(f"      {cumulative / 1e3:7.1f}ms  {name}")
+        if not ok:
+            failures.append(f"import {module}")
+
+    limits = budget["startup"]
+    runs = [startup() for _ in range(budget["runs"])]
+    import_ms = np.median([r["import"] for r in runs]) * 1e3
+    load_ms = np.median([r["load"] for r in runs]) * 1e3
+    loaded = sorted(name for name in limits["deferred"] if name in runs[-1]["modules"])
+    ok = import_ms + load_ms <= limits["budget_ms"] and not loaded
+    print(f"[{'OK' if ok else 'OVER'}] start-up: import {import_ms:.0f}ms + load_models() {load_ms:.0f}ms = "
+          f"{import_ms + load_ms:.0f}ms (budget {limits['budget_ms']}ms)"
+          + (f", loads deferred {', '.join(loaded)}" if loaded else ""))
+    if not ok:
+        failures.append("start-up")
+
+    if failures:
+        raise SystemExit(f"Over budget: {', '.join(failures)}")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--child"]:
+        child()
+    else:
+        main()
@@ -0,0 +1,126 @@
+"""
+LLM gateway load test against the local OpenAI-compatible stub.
+
+Starts benchmarks.llm_stub in a subprocess and drives AIService.analyze_transaction
+(two completions per call) through three phases:
+
+  healthy   stub at LATENCY_MS, load within concurrency + queue
+  burst     calls beyond concurrency + queue are rejected immediately
+            instead of stacking up on the event loop
+  slowdown  stub far slower than the deadline: calls time out, the breaker
+            opens and later calls fail fast with "no analysis"
+  recovery  stub healthy again: after the cooldown one probe closes the breaker
+
+    python -m benchmarks.bench_llm_gateway
+"""
+
+import os
+import json
+import sys
+import time
+import asyncio
+import subprocess
+import urllib.request
+import numpy as np
+
+STUB_PORT = 8100
+LATENCY_MS = 300
+TIMEOUT_SECONDS = 2.0
+COOLDOWN_SECONDS = 2.0
+
+os.environ.update({
+    "OPENAI_API_KEY": "stub",
+    "OPENAI_BASE_URL": f"http://127.0.0.1:{STUB_PORT}/v1",
+    "AI_CACHE_ENABLED": "false",
+    "LLM_MAX_CONCURRENCY": "32",
+    "LLM_MAX_QUEUE": "128",
+    "LLM_TIMEOUT_SECONDS": str(TIMEOUT_SECONDS),
+    "LLM_BREAKER_MIN_CALLS": "10",
+    "LLM_BREAKER_COOLDOWN_SECONDS": str(COOLDOWN_SECONDS),
+})
+
+from app.services.ai_service import ai_service  # noqa: E402  (settings come from the environment above)
+from app.core.metrics import LLM_REQUESTS  # noqa: E402
+from benchmarks.common import sample_transactions  # noqa: E402
+
+RESULTS = ("ok", "error", "timeout", "rejected", "breaker_open")
+
+
+def stub_config(**update):
+    request = urllib.request.Request(
+        f"http://127.0.0.1:{STUB_PORT}/stub/config", method="POST" if update else "GET",
+        data=json.dumps(update).encode() if update else None,
+        headers={"Content-Type": "application/json"}
+    )
+    with urllib.request.urlopen(request, timeout=5) as response:
+        return response.read()
+
+
+def wait_for_stub(timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            stub_config()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("LLM stub did not start")
+
+
+def counts() -> dict:
+    return {r: LLM_REQUESTS.labels(result=r)._value.get() for r in RESULTS}
+
+
+async def phase(name: str, transactions) -> None:
+    before = counts()
+    latencies, analysed = [], 0
+
+    async def one(t):
+        nonlocal analysed
+        start = time.perf_counter()
+        analysis = await ai_service.analyze_transaction(t, 0.87, "HIGH", [])
+        latencies.append((time.perf_counter() - start) * 1e3)
+        analysed += analysis[0] is not None
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(t) for t in transactions))
+    wall = time.perf_counter() - start
+    after = counts()
+    delta = ", ".join(f"{r}={int(after[r] - before[r])}" for r in RESULTS if after[r] - before[r])
+    lat = np.array(latencies)
+    print(f"[{name}] {len(transactions)} calls in {wall:.2f}s, analysed {analysed}, "
+          f"p50={np.percentile(lat, 50):.0f}ms p99={np.percentile(lat, 99):.0f}ms, "
+          f"breaker={ai_service.gateway.state} | completions: {delta}")
+
+
+async def run():
+    transactions = sample_transactions(400)
+    await ai_service.warm()  # as the app does at start-up
+    await phase("healthy", transactions[:60])
+    await phase("burst", transactions)
+
+    stub_config(latency_ms=10 * TIMEOUT_SECONDS * 1000, jitter_ms=0)
+    await phase("slowdown", transactions[:40])
+    await phase("slowdown, breaker open", transactions[:200])
+
+    stub_config(latency_ms=LATENCY_MS, jitter_ms=50)
+    await asyncio.sleep(COOLDOWN_SECONDS)
+    # The probe is one of the two completions; the other is refused while it runs
+    await phase("recovery probe", transactions[:1])
+    await asyncio.sleep(2 * LATENCY_MS / 1000)
+    await phase("recovered", transactions[:60])
+
+
+def main():
+    stub = subprocess.Popen([sys.executable, "-m", "benchmarks.llm_stub", "--port", str(STUB_PORT),
+                             "--latency-ms", str(LATENCY_MS), "--jitter-ms", "50"])
+    try:
+        wait_for_stub()
+        asyncio.run(run())
+    finally:
+        stub.terminate()
+        stub.wait()
+
+
+if __name__ == "__main__":
+    main()
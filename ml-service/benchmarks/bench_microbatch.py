@@ -0,0 +1,69 @@
+"""
+Micro-batching benchmark: N concurrent ModelService.predict() calls with the
+MicroBatcher enabled versus one executor hop per request.
+
+Checks that every micro-batched result equals the single-row result, then
+reports per-request latency (p50/p99) and throughput for each concurrency.
+
+    python -m benchmarks.bench_microbatch
+"""
+
+import time
+import asyncio
+import numpy as np
+from app.core.config import settings
+from app.core.metrics import MICRO_BATCH_SIZE
+from app.services.model_service import model_service
+from benchmarks.common import sample_transactions, report
+
+CONCURRENCY = (1, 16, 64, 256)
+ROUNDS = 5
+
+
+async def run(transactions, concurrency: int, batched: bool) -> tuple[np.ndarray, float]:
+    """Latencies (us) of `ROUNDS` waves of `concurrency` concurrent calls, and requests/s"""
+    settings.MICRO_BATCH_ENABLED = batched
+
+    async def one(t):
+        start = time.perf_counter()
+        await model_service.predict(t)
+        return (time.perf_counter() - start) * 1e6
+
+    latencies = []
+    start = time.perf_counter()
+    for r in range(ROUNDS):
+        wave = transactions[r * concurrency:(r + 1) * concurrency]
+        latencies += await asyncio.gather(*(one(t) for t in wave))
+    elapsed = time.perf_counter() - start
+    return np.array(latencies), len(latencies) / elapsed
+
+
+async def main():
+    model_service.load_models()
+    transactions = sample_transactions(max(CONCURRENCY) * ROUNDS, model_service.label_encoders)
+
+    # Parity: batched results must equal the single-row path
+    settings.MICRO_BATCH_ENABLED = True
+    batched = await asyncio.gather(*(model_service.predict(t) for t in transactions[:256]))
+    for t, result in zip(transactions, batched):
+        assert result == model_service.bundle._predict_sync(t)
+    print("[PARITY] 256 concurrent requests identical to single-row scoring")
+
+    for concurrency in CONCURRENCY:
+        print(f"\n[BENCH] {concurrency} concurrent /predict calls "
+              f"(window={settings.MICRO_BATCH_WINDOW_MS}ms, max={settings.MICRO_BATCH_MAX_SIZE})")
+        base, base_rps = await run(transactions, concurrency, batched=False)
+        report("executor per request", base)
+        samples, rps = await run(transactions, concurrency, batched=True)
+        report("micro-batched", samples, base)
+        print(f"   throughput: {base_rps:.0f} -> {rps:.0f} req/s (x{rps / base_rps:.1f})")
+
+    sizes = MICRO_BATCH_SIZE.collect()[0].samples
+    count = next(s.value for s in sizes if s.name.endswith('_count'))
+    total = next(s.value for s in sizes if s.name.endswith('_sum'))
+    print(f"\n[BATCHES] {count:.0f} micro-batches, mean size {total / count:.1f}")
+    await model_service.batcher.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
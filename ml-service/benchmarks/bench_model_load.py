@@ -0,0 +1,98 @@
+"""
+Model load time: the joblib artifacts versus the memory-mapped bundle file
+(model.fmb, written by train_model.py or bundle_export.py).
+
+Reports ModelBundle.load() in-process (p50 of a few loads, page cache warm),
+then, for WORKERS fresh processes per path (all kept alive), the import and load time and
+the private memory each process holds once loaded (Private_* from
+/proc/<pid>/smaps_rollup): the bundle's arrays are file-backed pages shared
+by every process mapping it, the joblib path builds private copies.
+
+    python -m benchmarks.bench_model_load
+"""
+
+import os
+import sys
+import json
+import time
+import subprocess
+import numpy as np
+from app.core.config import settings
+
+LOADS = 5
+WORKERS = 4
+
+
+def load_once(use_bundle: bool) -> float:
+    from app.services.model_bundle import ModelBundle
+    settings.USE_BUNDLE_FILE = use_bundle
+    start = time.perf_counter()
+    bundle = ModelBundle.load(settings.MODEL_DIR)
+    elapsed = time.perf_counter() - start
+    bundle.retire()
+    return elapsed
+
+
+def child(path: str):
+    """Fresh process: import, load, report, then hold the models until stdin closes"""
+    start = time.perf_counter()
+    from app.services.model_bundle import ModelBundle
+    imported = time.perf_counter()
+    settings.USE_BUNDLE_FILE = path == "bundle"
+    bundle = ModelBundle.load(settings.MODEL_DIR)
+    loaded = time.perf_counter()
+    print(json.dumps({"import": imported - start, "load": loaded - imported}), flush=True)
+    sys.stdin.read()
+    bundle.retire()
+
+
+def private_mb(pid: int) -> float:
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        fields = dict(line.split(":", 1) for line in f if ":" in line and not line.startswith("/"))
+    return sum(int(fields[key].split()[0]) for key in ("Private_Clean", "Private_Dirty")) / 1024
+
+
+def fresh_processes(path: str) -> tuple:
+    env = {**os.environ, "LOG_LEVEL": "WARNING"}
+    procs, reports = [], []
+    try:
+        # One at a time so start-up times do not compete for CPU; earlier ones stay loaded
+        for _ in range(WORKERS):
+            procs.append(subprocess.Popen([sys.executable, "-m", "benchmarks.bench_model_load", "--child", path],
+                                          stdin=subprocess.PIPE, stdout=subprocess.PIPE, env=env, text=True))
+            reports.append(json.loads(procs[-1].stdout.readline()))
+        private = [private_mb(p.pid) for p in procs]
+    finally:
+        for p in procs:
+            p.stdin.close()
+            p.wait()
+    return reports, private
+
+
+def main():
+    from app.services.model_bundle import _bundle_file
+    with open(settings.MODEL_DIR / "metadata.json") as f:
+        metadata = json.load(f)
+    if _bundle_file(settings.MODEL_DIR, metadata) is None:
+        raise SystemExit(f"No usable bundle in {settings.MODEL_DIR}: run python bundle_export.py --model-dir ...")
+
+    print(f"[BENCH] ModelBundle.load() from {settings.MODEL_DIR}, backend {settings.INFERENCE_BACKEND}, "
+          f"explain {settings.EXPLAIN_METHOD}")
+    for label, use_bundle in (("joblib", False), ("bundle", True)):
+        load_once(use_bundle)  # page cache, lazy library initialisation
+        times = [load_once(use_bundle) for _ in range(LOADS)]
+        print(f"   in-process {label:<8} p50 {np.percentile(times, 50) * 1e3:7.1f}ms")
+
+    print(f"   {WORKERS} fresh processes each:")
+    for label in ("joblib", "bundle"):
+        reports, private = fresh_processes(label)
+        print(f"   {label:<8} import {np.median([r['import'] for r in reports]) * 1e3:6.0f}ms  "
+              f"load {np.median([r['load'] for r in reports]) * 1e3:6.1f}ms  "
+              f"private memory {np.median(private):6.1f} MB/process")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--child"]:
+        child(sys.argv[2])
+    else:
+        main()
@@ -0,0 +1,112 @@
+"""
+Model hot-swap under load: ModelService.reload() while /predict-style calls
+keep coming.
+
+Copies settings.MODEL_DIR into two versions (the second with its own
+version string and threshold), then alternates reloads between them while
+CONCURRENCY tasks call model_service.predict() back to back. Reports the
+event-loop stall and the prediction latency during reloads, first with the
+old blocking load_models() on the loop, then with reload(); checks that
+every result carries a (model_version, threshold) pair of a single bundle
+and that retired bundles are released once their requests have drained.
+
+    python -m benchmarks.bench_model_reload
+"""
+
+import gc
+import json
+import time
+import shutil
+import asyncio
+import tempfile
+import weakref
+import numpy as np
+from pathlib import Path
+from app.core.config import settings
+from app.services.model_service import model_service
+from benchmarks.common import sample_transactions
+
+CONCURRENCY = 16
+RELOADS = 4
+TICK_S = 0.005
+
+
+def model_versions(workdir: Path) -> dict:
+    """Two copies of the production artifacts: {model_dir: (version, threshold)}"""
+    versions = {}
+    for suffix, shift in (("a", 0.0), ("b", 0.05)):
+        model_dir = workdir / suffix
+        shutil.copytree(settings.MODEL_DIR, model_dir)
+        metadata = json.loads((model_dir / 'metadata.json').read_text())
+        metadata['version'] = f"{metadata['version']}-{suffix}"
+        metadata['optimal_threshold'] = min(metadata['optimal_threshold'] + shift, 0.99)
+        (model_dir / 'metadata.json').write_text(json.dumps(metadata))
+        versions[model_dir] = (metadata['version'], metadata['optimal_threshold'])
+    return versions
+
+
+async def run(label: str, reload, versions: dict, transactions) -> list:
+    stop = asyncio.Event()
+    latencies, results, stalls, bundles = [], [], [], []
+
+    async def client(offset: int):
+        i = offset
+        while not stop.is_set():
+            start = time.perf_counter()
+            results.append(await model_service.predict(transactions[i % len(transactions)], "topk"))
+            latencies.append((time.perf_counter() - start) * 1e3)
+            i += CONCURRENCY
+
+    async def ticker():
+        # How late a short sleep wakes up: the time the loop could not serve anyone
+        while not stop.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(TICK_S)
+            stalls.append((time.perf_counter() - start - TICK_S) * 1e3)
+
+    tasks = [asyncio.create_task(client(i)) for i in range(CONCURRENCY)] + [asyncio.create_task(ticker())]
+    await asyncio.sleep(0.5)
+    start = time.perf_counter()
+    dirs = list(versions)
+    for n in range(RELOADS):
+        bundles.append(weakref.ref(model_service.bundle))
+        settings.MODEL_DIR = dirs[(n + 1) % len(dirs)]
+        await reload()
+    reload_s = (time.perf_counter() - start) / RELOADS
+    await asyncio.sleep(0.5)
+    stop.set()
+    await asyncio.gather(*tasks)
+
+    pairs = set(versions.values())
+    mixed = sum((r["model_version"], r["threshold"]) not in pairs for r in results)
+    seen = {r["model_version"] for r in results}
+    gc.collect()
+    alive = sum(ref() is not None for ref in bundles)
+    print(f"   {label:<22} reload {reload_s:5.2f}s  loop stall max {max(stalls):7.1f}ms  "
+          f"predict p50 {np.percentile(latencies, 50):6.1f}ms p99 {np.percentile(latencies, 99):7.1f}ms  "
+          f"{len(results)} results, {len(seen)} versions, {mixed} mixed, {alive}/{RELOADS} retired bundles alive")
+    return results
+
+
+async def main():
+    workdir = Path(tempfile.mkdtemp(prefix="bench-reload-"))
+    try:
+        versions = model_versions(workdir)
+        settings.PREDICTION_CACHE_ENABLED = False
+        settings.MODEL_DIR = next(iter(versions))
+        model_service.load_models()
+        transactions = sample_transactions(1000, model_service.label_encoders)
+
+        async def blocking_reload():
+            model_service.load_models()
+
+        print(f"[BENCH] {RELOADS} reloads under {CONCURRENCY} concurrent predict() callers")
+        await run("load_models() on loop", blocking_reload, versions, transactions)
+        await run("reload()", model_service.reload, versions, transactions)
+        await model_service.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,54 @@
+"""
+Process-pool scaling benchmark: throughput of concurrent predict_batch()
+calls on the 4-thread executor versus forked worker pools of 1..N processes
+(N = CPU cores, or the numbers given on the command line).
+
+    python -m benchmarks.bench_process_pool [workers ...]
+"""
+
+import os
+import sys
+import time
+import asyncio
+from app.core.config import settings
+from app.services.model_service import model_service
+from benchmarks.common import sample_transactions
+
+BATCH_ROWS = 64
+CALLS = 32
+
+
+async def throughput(chunks) -> float:
+    """Rows scored per second with all chunks in flight at once"""
+    start = time.perf_counter()
+    await asyncio.gather(*(model_service.predict_batch(chunk) for chunk in chunks))
+    return sum(map(len, chunks)) / (time.perf_counter() - start)
+
+
+async def main():
+    workers_list = [int(w) for w in sys.argv[1:]] or list(range(1, (os.cpu_count() or 1) + 1))
+    settings.INFERENCE_EXECUTOR = "thread"
+    model_service.load_models()
+
+    transactions = sample_transactions(BATCH_ROWS * CALLS, model_service.label_encoders)
+    chunks = [transactions[i:i + BATCH_ROWS] for i in range(0, len(transactions), BATCH_ROWS)]
+
+    expected = model_service.bundle._predict_batch_sync(chunks[0])
+    await throughput(chunks[:2])  # warm-up
+    base = await throughput(chunks)
+    print(f"[BENCH] {CALLS} concurrent predict_batch calls x {BATCH_ROWS} rows, {os.cpu_count()} CPU cores")
+    print(f"   {'thread pool (4 threads)':<28} {base:>8.0f} rows/s")
+
+    for workers in workers_list:
+        settings.PROCESS_POOL_WORKERS = workers
+        model_service.bundle.start_pool(workers)
+        result = await model_service.predict_batch(chunks[0])
+        assert result['fraud_probability'].tolist() == expected['fraud_probability'].tolist()
+        rps = await throughput(chunks)
+        print(f"   {f'process pool ({workers} workers)':<28} {rps:>8.0f} rows/s  x{rps / base:.2f}")
+
+    await model_service.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,99 @@
+"""
+Row isolation check and benchmark: one row the ensemble rejects ("poisoned")
+must fail only itself, not the rows scored in the same vectorized call.
+
+The backend is wrapped to raise whenever the poisoned row is in its input, so
+the check does not depend on which inputs a model version happens to reject.
+Checks that a /predict/batch call flags only the poisoned row and that, among
+concurrent /predict calls coalesced into one micro-batch, only the poisoned
+request fails. Then reports the cost of bisecting the failed batch call
+against a clean batch.
+
+    python -m benchmarks.bench_row_isolation
+"""
+
+import asyncio
+import numpy as np
+from app.core.config import settings
+from app.services.model_service import model_service
+from benchmarks.common import sample_transactions, timeit, report
+
+BATCH_ROWS = 64
+POISONED = 7
+
+
+class PoisonedBackend:
+    """Backend that raises for any input containing the `poisoned` model input row"""
+
+    def __init__(self, backend, poisoned: np.ndarray):
+        self.backend = backend
+        self.poisoned = poisoned
+        self.name = backend.name
+        self.applies_scaler = backend.applies_scaler
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        if (X == self.poisoned).all(axis=1).any():
+            raise ValueError("poisoned row")
+        return self.backend.predict(X)
+
+
+def poison(bundle, transaction) -> PoisonedBackend:
+    """Wrap the bundle's backend so that `transaction` fails in the ensemble call"""
+    row = bundle.layout.build_row(transaction)
+    if not bundle.backend.applies_scaler:
+        row = bundle.layout.transform(row)
+    bundle.backend = PoisonedBackend(bundle.backend, row[0])
+    return bundle.backend
+
+
+async def check_micro_batch(transactions):
+    """Concurrent predict() calls: only the poisoned one raises, the rest match single-row scoring"""
+    settings.MICRO_BATCH_ENABLED = True
+    settings.PREDICTION_CACHE_ENABLED = False
+    results = await asyncio.gather(*(model_service.predict(t) for t in transactions), return_exceptions=True)
+    await model_service.batcher.close()
+    for idx, (t, result) in enumerate(zip(transactions, results)):
+        if idx == POISONED:
+            assert isinstance(result, ValueError), "the poisoned request must fail"
+        else:
+            assert not isinstance(result, Exception), f"request {idx} failed: {result}"
+            expected = model_service.bundle._predict_sync(t)
+            assert result['fraud_probability'] == expected['fraud_probability']
+            assert result['shap_values'] == expected['shap_values']
+
+
+def main():
+    model_service.load_models()
+    bundle = model_service.bundle
+    transactions = sample_transactions(BATCH_ROWS, model_service.label_encoders)
+    clean = bundle._predict_batch_sync(transactions, explain="full")
+    assert not clean['errors'].any()
+
+    backend = poison(bundle, transactions[POISONED])
+    result = bundle._predict_batch_sync(transactions, explain="full")
+    expected = np.zeros(BATCH_ROWS, dtype=bool)
+    expected[POISONED] = True
+    assert result['errors'].tolist() == expected.tolist(), "errors must flag only the poisoned row"
+    assert result['risk_level'][POISONED] == "CRITICAL"
+    for key in ('fraud_probability', 'risk_level', 'should_block'):
+        assert result[key][~expected].tolist() == clean[key][~expected].tolist(), f"{key} changed"
+    for key in ('top_risk_factors', 'shap_values'):
+        assert [v for i, v in enumerate(result[key]) if i != POISONED] == \
+               [v for i, v in enumerate(clean[key]) if i != POISONED], f"{key} changed"
+    print(f"[OK] predict_batch: only the poisoned row of {BATCH_ROWS} is flagged")
+
+    asyncio.run(check_micro_batch(transactions[:settings.MICRO_BATCH_MAX_SIZE]))
+    print("[OK] micro-batched predict: only the poisoned request fails")
+
+    print(f"\n[BENCH] predict_batch of {BATCH_ROWS} rows (explain=topk)")
+    bundle.backend = backend.backend
+    base = timeit(lambda: bundle._predict_batch_sync(transactions), repeat=50)
+    report("clean batch", base)
+    bundle.backend = backend
+    report("one poisoned row (bisected)",
+           timeit(lambda: bundle._predict_batch_sync(transactions), repeat=20), base)
+    bundle.backend = backend.backend
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Scaler folding benchmark: raw thresholds whose boundary lies where the
+float grid is densest (a split at scaled 0, a split at the scaled image of
+category code 0, between -1 and 0), then folding small LightGBM/XGBoost
+models trained on such features, with a parity check on the training rows.
+
+    python -m benchmarks.bench_scaler_folding
+"""
+
+import time
+import numpy as np
+import lightgbm as lgb
+import xgboost as xgb
+from sklearn.preprocessing import StandardScaler
+from scaler_folding import (
+    _scaler_vectors, _raw_threshold_le, _raw_threshold_lt, fold_lightgbm, fold_xgboost, check_parity
+)
+
+
+def training_data(n: int = 2000, seed: int = 0):
+    """
+    Integer-valued feature {-1, 0, 1, 2}, a category code with -1 for unseen
+    and float32-representable noise (the XGBoost fold is exact for those)
+    """
+    rng = np.random.default_rng(seed)
+    small_ints = rng.integers(-1, 3, n).astype(float)
+    codes = rng.choice([-1, 0, 1, 2, 3, 40], n).astype(float)
+    noise = rng.normal(9.19, 6.13, n).astype(np.float32).astype(float)
+    X = np.column_stack([small_ints, codes, noise])
+    y = ((small_ints > 0) ^ (codes < 0) ^ (rng.random(n) < 0.1)).astype(int)
+    return X, y
+
+
+def check_threshold(t: float, mean: float, scale: float) -> float:
+    """Both raw thresholds for scaled threshold t sit exactly on the boundary; returns seconds"""
+    start = time.perf_counter()
+    c = _raw_threshold_le(t, mean, scale)
+    assert (c - mean) / scale <= t < (np.nextafter(c, np.inf) - mean) / scale
+
+    t32 = np.float32(t)
+    c32 = _raw_threshold_lt(t32, mean, scale)
+    scaled = lambda x: np.float32((np.float64(x) - mean) / scale)
+    assert scaled(np.nextafter(c32, np.float32(-np.inf))) < t32 <= scaled(c32)
+    return time.perf_counter() - start
+
+
+def main():
+    X, y = training_data()
+    scaler = StandardScaler().fit(X)
+    X_scaled = scaler.transform(X)
+    mean, scale = _scaler_vectors(scaler)
+
+    print("\n[BENCH] Raw thresholds near raw 0")
+    cases = {
+        'scaled 0': (0.0, 0.0, 6.13),
+        'scaled 0, mean 0.1': (0.0, 0.1, 3.0),
+        'code 0 (mean 0.1)': ((0 - 0.1) / 3.0, 0.1, 3.0),
+        'code 0 (fitted scaler)': ((0 - mean[1]) / scale[1], mean[1], scale[1]),
+        'code -1/0 midpoint': ((-0.5 - mean[1]) / scale[1], mean[1], scale[1]),
+        'direction_encoded': (-1.5004792, 9.19, 6.13),
+    }
+    for name, (t, m, sc) in cases.items():
+        print(f"   {name:<24} {check_threshold(t, m, sc) * 1e6:>8.1f}us")
+
+    lgb_model = lgb.LGBMClassifier(n_estimators=50, num_leaves=8, min_child_samples=5, verbose=-1)
+    lgb_model.fit(X_scaled, y)
+    xgb_model = xgb.XGBClassifier(n_estimators=50, max_depth=3)
+    xgb_model.fit(X_scaled, y)
+
+    print("\n[BENCH] Scaler folding")
+    start = time.perf_counter()
+    lgb_raw = fold_lightgbm(lgb_model, mean, scale)
+    print(f"   fold LightGBM: {time.perf_counter() - start:.3f}s")
+    start = time.perf_counter()
+    xgb_raw = fold_xgboost(xgb_model, mean, scale)
+    print(f"   fold XGBoost:  {time.perf_counter() - start:.3f}s")
+
+    report = check_parity(lgb_model, xgb_model, lgb_raw, xgb_raw, scaler, X)
+    print(f"   parity: rows={report['rows']} max|Δp|={report['max_abs_diff']:.3e} "
+          f"changed={report['rows_changed']}")
+    assert report['passed'], report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Concurrency of the legacy serve.py entry point with AI analysis enabled.
+
+Starts benchmarks.llm_stub and uvicorn serve:app in subprocesses, fires
+CONCURRENCY simultaneous /predict calls (each needs a fraud and an AML
+completion) and reports wall time and p50/p99. With the model on the
+executor and both completions awaited concurrently, wall time stays close
+to one stub latency instead of growing with the number of requests, and
+/health keeps answering while the analyses are in flight.
+
+    python -m benchmarks.bench_serve_concurrency
+"""
+
+import os
+import sys
+import json
+import time
+import subprocess
+import urllib.request
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from benchmarks.common import sample_transactions
+
+STUB_PORT = 8102
+SERVE_PORT = 8103
+LATENCY_MS = 500
+CONCURRENCY = 20
+BASE_URL = f"http://127.0.0.1:{SERVE_PORT}"
+
+
+def request(url: str, payload: dict = None) -> dict:
+    data = json.dumps(payload).encode() if payload is not None else None
+    req = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req, timeout=120) as response:
+        return json.loads(response.read())
+
+
+def wait_for(url: str, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            return request(url)
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up")
+
+
+def timed(url: str, payload: dict = None) -> tuple:
+    start = time.perf_counter()
+    result = request(url, payload)
+    return (time.perf_counter() - start) * 1e3, result
+
+
+def run():
+    wait_for(f"http://127.0.0.1:{STUB_PORT}/stub/config")
+    wait_for(f"{BASE_URL}/health")
+    transactions = [t.model_dump() for t in sample_transactions(CONCURRENCY, seed=7)]
+    # Warm-up: the first request pays for lazy initialisation
+    request(f"{BASE_URL}/predict", transactions[0])
+
+    with ThreadPoolExecutor(CONCURRENCY + 1) as pool:
+        start = time.perf_counter()
+        futures = [pool.submit(timed, f"{BASE_URL}/predict", t) for t in transactions]
+        # /health is answered by the same event loop the predictions run on
+        time.sleep(LATENCY_MS / 2000)
+        health_ms, _ = pool.submit(timed, f"{BASE_URL}/health").result()
+        results = [f.result() for f in futures]
+        wall = time.perf_counter() - start
+
+    lat = np.array([ms for ms, _ in results])
+    analysed = sum(r["ai_analysis"] is not None for _, r in results)
+    print(f"[BENCH] {CONCURRENCY} concurrent /predict, stub latency {LATENCY_MS}ms (2 completions each)")
+    print(f"   wall {wall:.2f}s, p50={np.percentile(lat, 50):.0f}ms p99={np.percentile(lat, 99):.0f}ms, "
+          f"analysed {analysed}/{CONCURRENCY}, /health during load {health_ms:.0f}ms")
+
+
+def main():
+    env = {
+        **os.environ,
+        "OPENAI_API_KEY": "stub",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{STUB_PORT}/v1",
+        "AI_CACHE_ENABLED": "false",
+        "PREDICTION_CACHE_ENABLED": "false",
+    }
+    stub = subprocess.Popen([sys.executable, "-m", "benchmarks.llm_stub", "--port", str(STUB_PORT),
+                             "--latency-ms", str(LATENCY_MS), "--jitter-ms", "0"])
+    serve = subprocess.Popen([sys.executable, "-m", "uvicorn", "serve:app", "--port", str(SERVE_PORT),
+                              "--log-level", "warning"], env=env,
+                             stdout=subprocess.DEVNULL)
+    try:
+        run()
+    finally:
+        for process in (serve, stub):
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Template analysis engine: latency of the local Russian-language fallback for
+ai_analysis / aml_analysis / recommendation, on top risk factors from the
+production model.
+
+Reports p50/p99 of TemplateAnalyzer.analyze and of AIService.analyze in
+template mode and in auto mode without an LLM (the fallback path /predict
+takes with AI_ANALYSIS_MODE=auto when OPENAI_API_KEY is missing), checks
+that every AML block follows the AML_SCORE format of the AML prompt, and
+prints one sample analysis.
+
+    python -m benchmarks.bench_template_analysis
+"""
+
+import os
+import re
+import asyncio
+
+os.environ["OPENAI_API_KEY"] = ""
+
+from app.services.model_service import model_service  # noqa: E402  (settings come from the environment above)
+from app.services.ai_service import ai_service  # noqa: E402
+from app.services.template_analysis import template_analyzer  # noqa: E402
+from benchmarks.common import sample_transactions, timeit, report  # noqa: E402
+
+ROWS = 500
+AML_FORMAT = re.compile(r"AML_SCORE: (LOW|MEDIUM|HIGH|CRITICAL)\nПРИЗНАКИ:\n(- .+\n)+ДЕЙСТВИЯ:\n(- .+\n?)+$")
+
+
+def main():
+    model_service.load_models()
+    transactions = sample_transactions(ROWS, model_service.label_encoders)
+    result = model_service.bundle._predict_batch_sync(transactions, 5)
+    rows = [(t, float(p), str(r), f) for t, p, r, f in zip(
+        transactions, result["fraud_probability"], result["risk_level"], result["top_risk_factors"]
+    )]
+
+    for t, p, r, f in rows:
+        _, aml_analysis, _ = template_analyzer.analyze(t, p, r, f)
+        assert AML_FORMAT.match(aml_analysis), aml_analysis
+
+    print(f"[BENCH] {ROWS} transactions, one analysis per call")
+    cycle = iter(rows * 1000)
+    report("TemplateAnalyzer.analyze", timeit(lambda: template_analyzer.analyze(*next(cycle)), repeat=2000))
+
+    loop = asyncio.new_event_loop()
+    for mode in ("template", "auto"):
+        cycle = iter(rows * 1000)
+        report(f"AIService.analyze ({mode}, no LLM)",
+               timeit(lambda: loop.run_until_complete(ai_service.analyze(*next(cycle), mode)), repeat=2000))
+    loop.close()
+
+    t, p, r, f = max(rows, key=lambda row: row[1])
+    ai_analysis, aml_analysis, recommendation = template_analyzer.analyze(t, p, r, f)
+    print(f"\n[SAMPLE] amount={t.amount} hour={t.hour} risk={r}\n{ai_analysis}\n\n{aml_analysis}\n\n"
+          f"Рекомендация: {recommendation}")
+
+
+if __name__ == "__main__":
+    main()
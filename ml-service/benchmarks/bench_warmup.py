@@ -0,0 +1,91 @@
+"""
+First requests after start-up, with and without the warm-up.
+
+Each variant runs in a fresh process: "cold" loads the models without any
+warm-up, "single round" is the bundle's one-round warm (WARMUP_ENABLED=false),
+"warm-up" adds the rounds and model_service.warm_up() that gate /ready.
+Then the first call of every serving path (a burst of concurrent single
+predictions, each explain level, a batch) is timed against the same path's
+steady-state p50.
+
+    python -m benchmarks.bench_warmup
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import subprocess
+import numpy as np
+from app.core.config import settings
+from benchmarks.common import sample_transactions
+
+BURST = 16
+BATCH = 256
+STEADY = 30
+
+
+VARIANTS = {"cold": "false", "single round": "false", "warm-up": "true"}
+
+
+async def child(variant: str):
+    from app.services.model_service import model_service
+    from app.services.model_bundle import ModelBundle
+    settings.PREDICTION_CACHE_ENABLED = False
+    start = time.perf_counter()
+    if variant == "cold":
+        model_service._activate(ModelBundle.load(settings.MODEL_DIR))
+    else:
+        model_service.load_models()
+    warmup_ms = 0.0
+    if variant == "warm-up":
+        await model_service.warm_up()
+        warmup_ms = model_service.warmup_report["total_ms"]
+    ready_ms = (time.perf_counter() - start) * 1e3
+
+    transactions = sample_transactions(BATCH, model_service.label_encoders, seed=7)
+    paths = {
+        f"burst of {BURST} predict()": lambda i: asyncio.gather(*(
+            model_service.predict(t, "topk") for t in transactions[i:i + BURST])),
+        "predict() full": lambda i: model_service.predict(transactions[i], "full"),
+        "predict() none": lambda i: model_service.predict(transactions[i], "none"),
+        f"predict_batch({BATCH}) topk": lambda i: model_service.predict_batch(transactions, explain="topk"),
+    }
+    report = {"ready_ms": ready_ms, "warmup_ms": warmup_ms, "paths": {}}
+    for name, call in paths.items():
+        timings = []
+        for i in range(STEADY + 1):
+            t0 = time.perf_counter()
+            await call(i)
+            timings.append((time.perf_counter() - t0) * 1e3)
+        report["paths"][name] = {"first": timings[0], "steady": float(np.percentile(timings[1:], 50))}
+    await model_service.close()
+    print(json.dumps(report))
+
+
+def run(variant: str) -> dict:
+    env = {**os.environ, "WARMUP_ENABLED": VARIANTS[variant], "LOG_LEVEL": "WARNING"}
+    result = subprocess.run([sys.executable, "-m", "benchmarks.bench_warmup", "--child", variant],
+                            capture_output=True, text=True, env=env)
+    if result.returncode:
+        raise SystemExit(result.stderr[-2000:])
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def main():
+    print(f"[BENCH] first call vs steady-state p50 after start-up, backend {settings.INFERENCE_BACKEND}, "
+          f"explain {settings.EXPLAIN_METHOD}")
+    for variant in VARIANTS:
+        report = run(variant)
+        print(f"   {variant}: ready after {report['ready_ms']:.0f}ms (service warm-up {report['warmup_ms']:.0f}ms)")
+        for name, timing in report["paths"].items():
+            print(f"      {name:<26} first {timing['first']:7.1f}ms  steady p50 {timing['steady']:6.1f}ms  "
+                  f"x{timing['first'] / timing['steady']:.1f}")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--child"]:
+        asyncio.run(child(sys.argv[2]))
+    else:
+        main()
@@ -0,0 +1,76 @@
+"""
+Shared helpers for the ML service benchmarks.
+
+Benchmarks load the production artifacts from settings.MODEL_DIR (override
+with the MODEL_DIR environment variable) and score synthetic transactions
+drawn from the encoders' own vocabularies.
+"""
+
+import time
+import random
+import numpy as np
+from typing import Callable, Dict, List
+from app.schemas.transaction import TransactionFeatures
+
+
+def sample_transactions(n: int, label_encoders: Dict = None, seed: int = 42,
+                        unknown_rate: float = 0.1) -> List[TransactionFeatures]:
+    """Synthetic transactions; a share of categoricals is deliberately unseen"""
+    rnd = random.Random(seed)
+    label_encoders = label_encoders or {}
+
+    def vocab(key: str, fallback: List[str]) -> List[str]:
+        le = label_encoders.get(key)
+        return [str(c) for c in le.classes_] if le is not None else fallback
+
+    phones = vocab('last_phone_model_categorical', ['iPhone 13', 'Samsung A52'])
+    oses = vocab('last_os_categorical', ['iOS/17', 'Android/14'])
+    directions = vocab('direction', ['a3f1c9'])
+
+    def pick(values: List[str], unknown: str):
+        return unknown if rnd.random() < unknown_rate else rnd.choice(values)
+
+    transactions = []
+    for i in range(n):
+        transactions.append(TransactionFeatures(
+            amount=round(rnd.lognormvariate(9, 2), 2),
+            hour=rnd.randint(0, 23),
+            day_of_week=rnd.randint(0, 6),
+            direction=pick(directions, f'unseen-{i}'),
+            monthly_os_changes=rnd.randint(0, 3),
+            monthly_phone_model_changes=rnd.randint(0, 3),
+            last_phone_model=pick(phones, 'Unseen Phone'),
+            last_os=pick(oses, 'Unseen OS'),
+            logins_last_7_days=rnd.randint(0, 40),
+            logins_last_30_days=rnd.randint(0, 150),
+            login_frequency_7d=rnd.choice([None, rnd.uniform(0, 6)]),
+            login_frequency_30d=rnd.uniform(0, 6),
+            freq_change_7d_vs_mean=rnd.gauss(0, 1),
+            logins_7d_over_30d_ratio=rnd.uniform(0, 1),
+            avg_login_interval_30d=rnd.choice([None, rnd.uniform(0, 1e5)]),
+            std_login_interval_30d=rnd.uniform(0, 1e5),
+            burstiness_login_interval=rnd.uniform(-1, 1),
+            zscore_avg_login_interval_7d=rnd.gauss(0, 2),
+        ))
+    return transactions
+
+
+def timeit(fn: Callable[[], object], repeat: int = 200, warmup: int = 5) -> np.ndarray:
+    """Wall-clock samples of fn() in microseconds"""
+    for _ in range(warmup):
+        fn()
+    samples = np.empty(repeat)
+    for i in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples[i] = (time.perf_counter() - start) * 1e6
+    return samples
+
+
+def report(name: str, samples_us: np.ndarray, baseline_us: np.ndarray = None) -> None:
+    """Print p50/p99 and the speed-up of the median against a baseline"""
+    p50, p99 = np.percentile(samples_us, [50, 99])
+    line = f"   {name:<36} p50={p50:>10.1f}us  p99={p99:>10.1f}us"
+    if baseline_us is not None:
+        line += f"  x{np.median(baseline_us) / p50:.1f}"
+    print(line)
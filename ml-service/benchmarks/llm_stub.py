@@ -0,0 +1,145 @@
+"""
+OpenAI-compatible stub for offline load tests of the LLM gateway.
+
+Serves POST /v1/chat/completions with canned fraud / AML analyses (JSON
+verdicts for every "Транзакция #N" of a batch prompt) after a configurable
+latency, and fails a configurable share of calls with HTTP 500. Latency
+grows with the number of transactions in a batch prompt. With "stream": true
+the answer is sent as SSE chunks: the first after FIRST_TOKEN_SHARE of the
+latency, the rest spread evenly over the remainder.
+The behaviour can be changed while running with POST /stub/config, e.g.
+{"latency_ms": 15000} to simulate an upstream slowdown.
+
+    python -m benchmarks.llm_stub --port 8100 --latency-ms 800 --jitter-ms 200
+    OPENAI_API_KEY=stub OPENAI_BASE_URL=http://localhost:8100/v1 python -m app.prefork
+"""
+
+import re
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from typing import Optional
+
+FRAUD_ANSWER = (
+    "**Краткий анализ** Сумма и время транзакции нетипичны для клиента, "
+    "недавно сменилось устройство.\n\n**Рекомендация:** Запросить подтверждение у клиента."
+)
+AML_ANSWER = (
+    "AML_SCORE: MEDIUM\nПРИЗНАКИ:\n- Нетипичная сумма\n- Смена устройства\n"
+    "ДЕЙСТВИЯ:\n- Проверить получателя\n- Проверить историю переводов"
+)
+
+# Share of the latency spent before the first streamed token
+FIRST_TOKEN_SHARE = 0.2
+
+
+class StubConfig(BaseModel):
+    latency_ms: float = 800.0
+    jitter_ms: float = 200.0
+    error_rate: float = 0.0
+
+
+class StubConfigUpdate(BaseModel):
+    latency_ms: Optional[float] = None
+    jitter_ms: Optional[float] = None
+    error_rate: Optional[float] = None
+
+
+def create_stub(config: StubConfig) -> FastAPI:
+    app = FastAPI(title="LLM stub")
+    stats = {"calls": 0, "errors": 0}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: dict):
+        stats["calls"] += 1
+        prompt = request["messages"][-1]["content"]
+        batch_ids = [int(n) for n in re.findall(r"Транзакция #(\d+)", prompt)]
+        # Generation time grows with the answer: ~1/4 of the base latency per extra transaction
+        delay = config.latency_ms * (1 + 0.25 * max(len(batch_ids) - 1, 0))
+        delay = max(delay + random.uniform(-config.jitter_ms, config.jitter_ms), 0.0)
+        await asyncio.sleep(delay / 1000 * (FIRST_TOKEN_SHARE if request.get("stream") else 1.0))
+        if random.random() < config.error_rate:
+            stats["errors"] += 1
+            raise HTTPException(status_code=500, detail="stub upstream error")
+
+        system = request["messages"][0]["content"]
+        if request.get("response_format", {}).get("type") == "json_object":
+            content = json.dumps({"results": [
+                {"id": n, "analysis": "Нетипичная сумма для клиента.", "aml": "MEDIUM: нетипичный получатель.",
+                 "recommendation": "Запросить подтверждение у клиента."}
+                for n in batch_ids
+            ]}, ensure_ascii=False)
+        else:
+            content = FRAUD_ANSWER if "антифрод" in system else AML_ANSWER
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        if request.get("stream"):
+            return StreamingResponse(stream_chunks(completion_id, request, content, delay),
+                                     media_type="text/event-stream")
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop"
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        }
+
+    async def stream_chunks(completion_id: str, request: dict, content: str, delay: float):
+        tokens = re.findall(r"\S+\s*|\s+", content)
+        pause = delay * (1 - FIRST_TOKEN_SHARE) / 1000 / max(len(tokens), 1)
+        for i, token in enumerate(tokens):
+            if i:
+                await asyncio.sleep(pause)
+            yield chunk(completion_id, request, {"content": token}, None)
+        yield chunk(completion_id, request, {}, "stop")
+        yield "data: [DONE]\n\n"
+
+    def chunk(completion_id: str, request: dict, delta: dict, finish_reason: Optional[str]) -> str:
+        return "data: " + json.dumps({
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": request.get("model", "stub"),
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+        }, ensure_ascii=False) + "\n\n"
+
+    @app.get("/stub/config")
+    async def get_config():
+        return {**config.model_dump(), **stats}
+
+    @app.post("/stub/config")
+    async def update_config(update: StubConfigUpdate):
+        for key, value in update.model_dump(exclude_none=True).items():
+            setattr(config, key, value)
+        return config
+
+    return app
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency-ms", type=float, default=800.0)
+    parser.add_argument("--jitter-ms", type=float, default=200.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    config = StubConfig(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate)
+    uvicorn.run(create_stub(config), host=args.host, port=args.port, log_level="warning", access_log=False)
+
+
+if __name__ == "__main__":
+    main()
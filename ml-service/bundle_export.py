@@ -0,0 +1,109 @@
+"""
+Forte.AI - Single-file model bundle export
+
+Writes model.fmb (app/services/bundle_file.py): both boosters in their native
+formats (LightGBM text, XGBoost UBJ), the scaler and encoder vocabularies as
+raw arrays, the compiled tree engines, the metadata and a content hash. The
+service memory-maps it instead of unpickling the joblib files and compiling
+the trees on every start and reload.
+
+The bundle holds the variant the service would serve: the scaler-free models
+when their export passed parity, the regular ones otherwise. check_parity()
+reads the written file back and compares it with the in-memory models on the
+hold-out set.
+
+Usage (bundle existing models):
+    python bundle_export.py --model-dir models [--holdout holdout.npy]
+"""
+
+import json
+import argparse
+import numpy as np
+import joblib
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+from app.services.bundle_file import BUNDLE_FILE, write_bundle, read_bundle
+from app.services.tree_engine import TreeEnsemble
+
+# Bundle and in-memory models must agree exactly (same trees, same code)
+PARITY_ATOL = 0.0
+
+
+def check_parity(path: Path, lgb_model, xgb_model, X: np.ndarray) -> Dict[str, Any]:
+    """Compare the models read back from the bundle with the in-memory ones"""
+    contents = read_bundle(path)
+    X = np.asarray(X, dtype=np.float64)
+    lgb_engine, xgb_engine = TreeEnsemble.from_lightgbm(lgb_model), TreeEnsemble.from_xgboost(xgb_model)
+    diffs = [
+        np.abs(lgb_model.predict_proba(X)[:, 1] - contents.lgb_model.predict_proba(X)[:, 1]),
+        np.abs(xgb_model.predict_proba(X)[:, 1] - contents.xgb_model.predict_proba(X)[:, 1]),
+        np.abs(lgb_engine.contributions(X) - contents.engines[0].contributions(X)).ravel(),
+        np.abs(xgb_engine.contributions(X) - contents.engines[1].contributions(X)).ravel(),
+    ]
+    max_diff = max(float(d.max()) if len(d) else 0.0 for d in diffs)
+    return {'rows': int(len(X)), 'max_abs_diff': max_diff, 'passed': bool(max_diff <= PARITY_ATOL)}
+
+
+def export_bundle(lgb_model, xgb_model, scaler, label_encoders: Dict, metadata: Dict[str, Any],
+                  model_dir: Path, scaler_free: bool = False,
+                  X_holdout: Optional[np.ndarray] = None) -> Dict[str, Any]:
+    """
+    Write the bundle and, given hold-out features (in the models' input
+    space), verify it. Returns the report to record in metadata.json under
+    'bundle'; a bundle that fails parity is deleted.
+    """
+    path = Path(model_dir) / BUNDLE_FILE
+    report = write_bundle(path, metadata, lgb_model, xgb_model, scaler, label_encoders, scaler_free)
+    if X_holdout is not None:
+        report['parity'] = check_parity(path, lgb_model, xgb_model, X_holdout)
+        if not report['parity']['passed']:
+            path.unlink()
+            raise ValueError(f"bundle parity failed: max|Δp|={report['parity']['max_abs_diff']:.3e}")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the models as a single memory-mappable bundle")
+    parser.add_argument('--model-dir', default='models')
+    parser.add_argument('--holdout', help=".npy matrix of raw (unscaled) hold-out features for the parity check")
+    args = parser.parse_args()
+
+    model_dir = Path(args.model_dir)
+    metadata_path = model_dir / 'metadata.json'
+    with open(metadata_path, 'r') as f:
+        metadata = json.load(f)
+    scaler = joblib.load(model_dir / 'scaler.joblib')
+    label_encoders = joblib.load(model_dir / 'label_encoders.joblib')
+
+    variant = metadata.get('scaler_free')
+    scaler_free = bool(variant and variant.get('passed'))
+    if scaler_free:
+        lgb_model = joblib.load(model_dir / variant['lgb_model'])
+        xgb_model = joblib.load(model_dir / variant['xgb_model'])
+    else:
+        lgb_model = joblib.load(model_dir / 'lgb_model.joblib')
+        xgb_model = joblib.load(model_dir / 'xgb_model.joblib')
+
+    X_holdout = None
+    if args.holdout:
+        X_holdout = np.load(args.holdout)
+        if not scaler_free:
+            X_holdout = scaler.transform(X_holdout)
+
+    print(f"[BUNDLE] Экспорт {'scaler-free ' if scaler_free else ''}моделей в {BUNDLE_FILE}...")
+    bundle_metadata = {key: value for key, value in metadata.items() if key != 'bundle'}
+    report = export_bundle(lgb_model, xgb_model, scaler, label_encoders, bundle_metadata, model_dir,
+                           scaler_free, X_holdout)
+    if 'parity' in report:
+        print(f"[PARITY] rows={report['parity']['rows']} max|Δp|={report['parity']['max_abs_diff']:.3e}")
+
+    metadata['bundle'] = report
+    with open(metadata_path, 'w') as f:
+        json.dump(metadata, f, indent=2)
+
+    print(f"[OK] Бандл сохранён: {BUNDLE_FILE} ({report['bytes'] / 1e6:.1f} MB, sha256 {report['sha256'][:12]})")
+
+
+if __name__ == "__main__":
+    main()
@@ -88,6 +88,9 @@ class KafkaConfig:
     ACKS = "all"
     RETRIES = 3
 
+    # Уровень объяснения от ML сервиса: процессору нужны только топ факторов риска
+    EXPLAIN_LEVEL = os.getenv("KAFKA_EXPLAIN_LEVEL", "topk")
+
 
 class FraudStreamProcessor:
     """
@@ -97,10 +100,12 @@ class FraudStreamProcessor:
     def __init__(
         self,
         ml_service_url: str = "http://localhost:8000",
-        kafka_servers: str = None
+        kafka_servers: str = None,
+        explain: str = None
     ):
         self.ml_service_url = ml_service_url
         self.kafka_servers = kafka_servers or KafkaConfig.BOOTSTRAP_SERVERS
+        self.explain = explain or KafkaConfig.EXPLAIN_LEVEL
 
         self.consumer: Optional[KafkaConsumer] = None
         self.producer: Optional[KafkaProducer] = None
@@ -180,6 +185,7 @@ class FraudStreamProcessor:
 
             response = requests.post(
                 f"{self.ml_service_url}/predict",
+                params={"explain": self.explain},
                 json=payload,
                 timeout=5
             )
@@ -392,6 +398,7 @@ def main():
     print(f"\n[CONFIG]")
     print(f"  ML Service: {ml_service_url}")
     print(f"  Kafka: {kafka_servers}")
+    print(f"  Explain: {KafkaConfig.EXPLAIN_LEVEL}")
     print(f"\n[TOPICS]")
     print(f"  Input:  {KafkaConfig.TOPIC_TRANSACTIONS_RAW}")
     print(f"  Output: {KafkaConfig.TOPIC_TRANSACTIONS_SCORED}")
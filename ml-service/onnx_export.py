@@ -0,0 +1,168 @@
+"""
+Forte.AI - ONNX export of the fraud ensemble
+
+Builds one ONNX graph that runs the whole scoring path:
+
+    raw features (double) -> StandardScaler (Sub/Div in double) -> float32
+        -> LightGBM TreeEnsembleClassifier -+
+        -> XGBoost TreeEnsembleClassifier --+-> 0.6 * p_lgb + 0.4 * p_xgb (double)
+
+so the service can score with a single ONNX Runtime session call. ONNX tree
+ensembles compare in float32, so the result is close to, but not bit-identical
+with, the native libraries; check_parity() verifies it on the hold-out set
+before the file is written.
+
+Usage (re-export existing models against a saved hold-out matrix):
+    python onnx_export.py --model-dir models --holdout holdout.npy
+"""
+
+import json
+import argparse
+import numpy as np
+import joblib
+from pathlib import Path
+from typing import Dict, Any
+
+# Output file name (next to the regular models)
+ONNX_FILE = 'ensemble.onnx'
+
+# Graph input / output names
+INPUT_NAME = 'features'
+OUTPUT_NAME = 'fraud_probability'
+
+# Maximum |Δp| tolerated between the ONNX graph and the native ensemble
+PARITY_ATOL = 1e-5
+
+OPSET = 15
+ML_OPSET = 1
+
+
+def _convert_trees(lgb_model, xgb_model, n_features: int):
+    """Per-model ONNX graphs reading a float32 'scaled' input"""
+    import onnxmltools
+    from onnx import compose
+    from onnxmltools.convert.common.data_types import FloatTensorType
+
+    initial_types = [('scaled', FloatTensorType([None, n_features]))]
+    lgb_onnx = onnxmltools.convert_lightgbm(lgb_model, initial_types=initial_types,
+                                            zipmap=False, target_opset=OPSET)
+    xgb_onnx = onnxmltools.convert_xgboost(xgb_model, initial_types=initial_types,
+                                           target_opset=OPSET)
+    # Prefix every internal name so both graphs can live in one model
+    return (compose.add_prefix(lgb_onnx, 'lgb_', rename_inputs=False),
+            compose.add_prefix(xgb_onnx, 'xgb_', rename_inputs=False))
+
+
+def build_ensemble_onnx(lgb_model, xgb_model, scaler, n_features: int):
+    """Single ONNX ModelProto: scaler + both boosters + weighted average"""
+    import onnx
+    from onnx import helper, numpy_helper, TensorProto
+
+    lgb_graph, xgb_graph = _convert_trees(lgb_model, xgb_model, n_features)
+
+    mean = np.asarray(scaler.mean_, dtype=np.float64) if getattr(scaler, 'with_mean', True) else np.zeros(n_features)
+    scale = np.asarray(scaler.scale_, dtype=np.float64) if getattr(scaler, 'with_std', True) else np.ones(n_features)
+
+    nodes = [
+        helper.make_node('Sub', [INPUT_NAME, 'scaler_mean'], ['centered']),
+        helper.make_node('Div', ['centered', 'scaler_scale'], ['scaled_double']),
+        helper.make_node('Cast', ['scaled_double'], ['scaled'], to=TensorProto.FLOAT),
+    ]
+    nodes += list(lgb_graph.graph.node) + list(xgb_graph.graph.node)
+    for name in ('lgb', 'xgb'):
+        nodes += [
+            helper.make_node('Gather', [f'{name}_probabilities', 'positive_class'], [f'{name}_positive'], axis=1),
+            helper.make_node('Cast', [f'{name}_positive'], [f'{name}_positive_double'], to=TensorProto.DOUBLE),
+            helper.make_node('Mul', [f'{name}_positive_double', f'{name}_weight'], [f'{name}_weighted']),
+        ]
+    nodes.append(helper.make_node('Add', ['lgb_weighted', 'xgb_weighted'], [OUTPUT_NAME]))
+
+    initializers = [
+        numpy_helper.from_array(mean, 'scaler_mean'),
+        numpy_helper.from_array(scale, 'scaler_scale'),
+        numpy_helper.from_array(np.array(1, dtype=np.int64), 'positive_class'),
+        numpy_helper.from_array(np.array(0.6, dtype=np.float64), 'lgb_weight'),
+        numpy_helper.from_array(np.array(0.4, dtype=np.float64), 'xgb_weight'),
+    ]
+    initializers += list(lgb_graph.graph.initializer) + list(xgb_graph.graph.initializer)
+
+    graph = helper.make_graph(
+        nodes, 'fraud_ensemble',
+        [helper.make_tensor_value_info(INPUT_NAME, TensorProto.DOUBLE, [None, n_features])],
+        [helper.make_tensor_value_info(OUTPUT_NAME, TensorProto.DOUBLE, [None])],
+        initializers
+    )
+    model = helper.make_model(graph, producer_name='forte-ml', opset_imports=[
+        helper.make_opsetid('', OPSET), helper.make_opsetid('ai.onnx.ml', ML_OPSET)
+    ])
+    model.ir_version = 8
+    onnx.checker.check_model(model)
+    return model
+
+
+def check_parity(onnx_bytes: bytes, lgb_model, xgb_model, scaler, X_holdout: np.ndarray) -> Dict[str, Any]:
+    """Compare the ONNX graph with the native ensemble on raw hold-out features"""
+    import onnxruntime as ort
+
+    X_raw = np.asarray(X_holdout, dtype=np.float64)
+    X_scaled = scaler.transform(X_raw)
+    expected = 0.6 * lgb_model.predict_proba(X_scaled)[:, 1] + 0.4 * xgb_model.predict_proba(X_scaled)[:, 1]
+
+    session = ort.InferenceSession(onnx_bytes, providers=['CPUExecutionProvider'])
+    actual = session.run([OUTPUT_NAME], {INPUT_NAME: X_raw})[0]
+    diff = np.abs(expected - actual)
+
+    return {
+        'rows': int(len(X_raw)),
+        'max_abs_diff': float(diff.max()) if len(diff) else 0.0,
+        'rows_changed': int(np.count_nonzero(diff)),
+        'passed': bool(len(diff) == 0 or diff.max() <= PARITY_ATOL)
+    }
+
+
+def export_onnx(lgb_model, xgb_model, scaler, X_holdout: np.ndarray, model_dir: Path) -> Dict[str, Any]:
+    """
+    Export the ensemble graph, verify parity on the hold-out set and write it.
+    Returns the parity report; the file is written only when parity passes.
+    """
+    X_holdout = np.asarray(X_holdout, dtype=np.float64)
+    onnx_bytes = build_ensemble_onnx(lgb_model, xgb_model, scaler, X_holdout.shape[1]).SerializeToString()
+
+    report = check_parity(onnx_bytes, lgb_model, xgb_model, scaler, X_holdout)
+    if report['passed']:
+        (Path(model_dir) / ONNX_FILE).write_bytes(onnx_bytes)
+        report['file'] = ONNX_FILE
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the fraud ensemble to ONNX")
+    parser.add_argument('--model-dir', default='models')
+    parser.add_argument('--holdout', required=True, help=".npy matrix of raw (unscaled) hold-out features")
+    args = parser.parse_args()
+
+    model_dir = Path(args.model_dir)
+    lgb_model = joblib.load(model_dir / 'lgb_model.joblib')
+    xgb_model = joblib.load(model_dir / 'xgb_model.joblib')
+    scaler = joblib.load(model_dir / 'scaler.joblib')
+    X_holdout = np.load(args.holdout)
+
+    print("[ONNX] Экспорт ансамбля (scaler + LightGBM + XGBoost) в ONNX...")
+    report = export_onnx(lgb_model, xgb_model, scaler, X_holdout, model_dir)
+    print(f"[PARITY] rows={report['rows']} max|Δp|={report['max_abs_diff']:.3e} changed={report['rows_changed']}")
+
+    if not report['passed']:
+        raise SystemExit("[ERROR] Parity check failed, ONNX model was not written")
+
+    metadata_path = model_dir / 'metadata.json'
+    with open(metadata_path, 'r') as f:
+        metadata = json.load(f)
+    metadata['onnx'] = report
+    with open(metadata_path, 'w') as f:
+        json.dump(metadata, f, indent=2)
+
+    print(f"[OK] ONNX модель сохранена: {ONNX_FILE}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""
+Forte.AI - Scaler folding for tree models
+
+StandardScaler applies a monotone per-feature affine map x -> (x - mean) / scale,
+so a split "scaled_x <= t" routes exactly the same rows as "x <= t'" for a
+suitably chosen raw-space threshold t'. This module rewrites the LightGBM and
+XGBoost split thresholds into raw feature space, producing "scaler-free" model
+variants that serve directly on unscaled features.
+
+Thresholds are not just mapped with t * scale + mean: the raw threshold is
+bisected over the float grid until it sits exactly on the boundary of the
+scaled comparison in the precision each library uses: double for LightGBM
+(exact for every input) and float32 for XGBoost (exact for
+float32-representable inputs).
+check_parity() verifies the result on the hold-out set before anything is
+written.
+
+Usage (re-export existing models against a saved hold-out matrix):
+    python scaler_folding.py --model-dir models --holdout holdout.npy
+"""
+
+import re
+import copy
+import json
+import argparse
+import numpy as np
+import joblib
+from pathlib import Path
+from typing import Dict, Any
+
+# Output file names of the scaler-free variants (next to the regular models)
+LGB_RAW_FILE = 'lgb_model_raw.joblib'
+XGB_RAW_FILE = 'xgb_model_raw.joblib'
+
+# Maximum |Δp| tolerated between the scaled and scaler-free ensembles
+PARITY_ATOL = 1e-9
+
+
+def _scaler_vectors(scaler) -> tuple[np.ndarray, np.ndarray]:
+    n = len(scaler.mean_ if scaler.mean_ is not None else scaler.scale_)
+    mean = np.asarray(scaler.mean_, dtype=np.float64) if getattr(scaler, 'with_mean', True) else np.zeros(n)
+    scale = np.asarray(scaler.scale_, dtype=np.float64) if getattr(scaler, 'with_std', True) else np.ones(n)
+    return mean, scale
+
+
+def _ordered_key(x, dtype) -> int:
+    """Integer key of a float that orders like the float itself (-0.0 and 0.0 share a key)"""
+    uint = np.uint64 if dtype == np.float64 else np.uint32
+    sign = 1 << (8 * np.dtype(dtype).itemsize - 1)
+    bits = int(np.asarray(x, dtype=dtype).view(uint))
+    return -(bits ^ sign) if bits & sign else bits
+
+
+def _from_ordered_key(key: int, dtype):
+    uint = np.uint64 if dtype == np.float64 else np.uint32
+    sign = 1 << (8 * np.dtype(dtype).itemsize - 1)
+    bits = key if key >= 0 else -key | sign
+    return np.asarray(bits, dtype=uint).view(dtype)[()]
+
+
+def _first_true(pred, dtype):
+    """
+    Smallest float c of `dtype` with pred(c), for a pred that is monotone
+    (false, then true) and true at +inf. Bisects the ordered bit patterns,
+    so it takes at most 64 steps wherever the boundary lies, including the
+    dense part of the float grid around 0.
+    """
+    lo, hi = _ordered_key(-np.inf, dtype), _ordered_key(np.inf, dtype)
+    if pred(_from_ordered_key(lo, dtype)):
+        return _from_ordered_key(lo, dtype)
+    while hi - lo > 1:  # pred(lo) is false, pred(hi) is true
+        mid = (lo + hi) // 2
+        if pred(_from_ordered_key(mid, dtype)):
+            hi = mid
+        else:
+            lo = mid
+    return _from_ordered_key(hi, dtype)
+
+
+def _raw_threshold_le(t: float, mean: float, scale: float) -> float:
+    """Largest double c with (c - mean) / scale <= t  (LightGBM: go left if x <= t)"""
+    def scaled(x):
+        return (np.float64(x) - mean) / scale
+
+    first_right = _first_true(lambda c: scaled(c) > t, np.float64)
+    return float(np.nextafter(first_right, -np.inf))
+
+
+def _raw_threshold_lt(t: np.float32, mean: float, scale: float) -> np.float32:
+    """Smallest float32 c with float32((c - mean) / scale) >= t  (XGBoost: go left if x < t)"""
+    def scaled(x):
+        return np.float32((np.float64(x) - mean) / scale)
+
+    return _first_true(lambda c: scaled(c) >= t, np.float32)
+
+
+def fold_lightgbm(lgb_model, mean: np.ndarray, scale: np.ndarray):
+    """Copy of an LGBMClassifier whose thresholds live in raw feature space"""
+    import lightgbm as lgb
+
+    model_str = lgb_model.booster_.model_to_string()
+    header, rest = model_str.split('\nTree=', 1)
+    trees_text, footer = ('Tree=' + rest).split('end of trees', 1)
+
+    def fold_infos(match):
+        infos = []
+        for i, info in enumerate(match.group(1).split(' ')):
+            if info.startswith('['):
+                lo, hi = (float(v) for v in info[1:-1].split(':'))
+                info = f'[{float(lo * scale[i] + mean[i])!r}:{float(hi * scale[i] + mean[i])!r}]'
+            infos.append(info)
+        return 'feature_infos=' + ' '.join(infos)
+
+    header = re.sub(r'feature_infos=(.*)', fold_infos, header)
+
+    blocks = re.split(r'(?=^Tree=\d+$)', trees_text, flags=re.M)
+    folded_blocks = []
+    for block in blocks:
+        if not block:
+            continue
+        fields = dict(re.findall(r'^(\w+)=(.*)$', block, flags=re.M))
+        if int(fields.get('num_leaves', 1)) > 1:
+            features = [int(v) for v in fields['split_feature'].split()]
+            thresholds = [float(v) for v in fields['threshold'].split()]
+            decision_types = [int(v) for v in fields['decision_type'].split()]
+            for decision_type in decision_types:
+                if decision_type & 1:
+                    raise ValueError("Categorical splits cannot be folded")
+                if (decision_type >> 2) & 3 == 1:
+                    raise ValueError("zero_as_missing splits cannot be folded")
+            new_thresholds = [
+                _raw_threshold_le(t, mean[f], scale[f]) for f, t in zip(features, thresholds)
+            ]
+            block = re.sub(
+                r'^threshold=.*$',
+                'threshold=' + ' '.join(repr(t) for t in new_thresholds),
+                block, count=1, flags=re.M
+            )
+        folded_blocks.append(block)
+
+    tree_sizes = ' '.join(str(len(b.encode())) for b in folded_blocks)
+    header = re.sub(r'^tree_sizes=.*$', 'tree_sizes=' + tree_sizes, header, flags=re.M)
+    folded_str = header + '\n' + ''.join(folded_blocks) + 'end of trees' + footer
+
+    folded = copy.deepcopy(lgb_model)
+    folded._Booster = lgb.Booster(model_str=folded_str)
+    return folded
+
+
+def fold_xgboost(xgb_model, mean: np.ndarray, scale: np.ndarray):
+    """Copy of an XGBClassifier whose thresholds live in raw feature space"""
+    model = json.loads(xgb_model.get_booster().save_raw('json'))
+    for tree in model['learner']['gradient_booster']['model']['trees']:
+        if any(tree.get('split_type', [])):
+            raise ValueError("Categorical splits cannot be folded")
+        conditions = tree['split_conditions']
+        for node, (left, feature) in enumerate(zip(tree['left_children'], tree['split_indices'])):
+            if left == -1:
+                continue  # leaf: split_conditions holds the leaf weight
+            conditions[node] = float(_raw_threshold_lt(np.float32(conditions[node]), mean[feature], scale[feature]))
+
+    folded = copy.deepcopy(xgb_model)
+    folded.get_booster().load_model(bytearray(json.dumps(model).encode()))
+    return folded
+
+
+def check_parity(lgb_model, xgb_model, lgb_raw, xgb_raw, scaler, X_holdout: np.ndarray) -> Dict[str, Any]:
+    """Compare scaled and scaler-free ensembles on raw hold-out features"""
+    X_raw = np.asarray(X_holdout, dtype=np.float64)
+    X_scaled = scaler.transform(X_raw)
+
+    def ensemble(lgb_m, xgb_m, X):
+        return 0.6 * lgb_m.predict_proba(X)[:, 1] + 0.4 * xgb_m.predict_proba(X)[:, 1]
+
+    expected = ensemble(lgb_model, xgb_model, X_scaled)
+    actual = ensemble(lgb_raw, xgb_raw, X_raw)
+    diff = np.abs(expected - actual)
+
+    return {
+        'rows': int(len(X_raw)),
+        'max_abs_diff': float(diff.max()) if len(diff) else 0.0,
+        'rows_changed': int(np.count_nonzero(diff)),
+        'passed': bool(len(diff) == 0 or diff.max() <= PARITY_ATOL)
+    }
+
+
+def export_scaler_free(lgb_model, xgb_model, scaler, X_holdout: np.ndarray, model_dir: Path) -> Dict[str, Any]:
+    """
+    Fold the scaler into both models, verify parity on the hold-out set and
+    write the variants. Returns the parity report; files are written only
+    when parity passes.
+    """
+    mean, scale = _scaler_vectors(scaler)
+    lgb_raw = fold_lightgbm(lgb_model, mean, scale)
+    xgb_raw = fold_xgboost(xgb_model, mean, scale)
+
+    report = check_parity(lgb_model, xgb_model, lgb_raw, xgb_raw, scaler, X_holdout)
+    if report['passed']:
+        joblib.dump(lgb_raw, Path(model_dir) / LGB_RAW_FILE)
+        joblib.dump(xgb_raw, Path(model_dir) / XGB_RAW_FILE)
+        report['lgb_model'] = LGB_RAW_FILE
+        report['xgb_model'] = XGB_RAW_FILE
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export scaler-free model variants")
+    parser.add_argument('--model-dir', default='models')
+    parser.add_argument('--holdout', required=True, help=".npy matrix of raw (unscaled) hold-out features")
+    args = parser.parse_args()
+
+    model_dir = Path(args.model_dir)
+    lgb_model = joblib.load(model_dir / 'lgb_model.joblib')
+    xgb_model = joblib.load(model_dir / 'xgb_model.joblib')
+    scaler = joblib.load(model_dir / 'scaler.joblib')
+    X_holdout = np.load(args.holdout)
+
+    print("[FOLD] Складываем StandardScaler в пороги деревьев...")
+    report = export_scaler_free(lgb_model, xgb_model, scaler, X_holdout, model_dir)
+    print(f"[PARITY] rows={report['rows']} max|Δp|={report['max_abs_diff']:.3e} changed={report['rows_changed']}")
+
+    if not report['passed']:
+        raise SystemExit("[ERROR] Parity check failed, scaler-free variants were not written")
+
+    metadata_path = model_dir / 'metadata.json'
+    with open(metadata_path, 'r') as f:
+        metadata = json.load(f)
+    metadata['scaler_free'] = report
+    with open(metadata_path, 'w') as f:
+        json.dump(metadata, f, indent=2)
+
+    print(f"[OK] Scaler-free модели сохранены: {LGB_RAW_FILE}, {XGB_RAW_FILE}")
+
+
+if __name__ == "__main__":
+    main()
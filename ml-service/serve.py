@@ -1,36 +1,37 @@
 """
 Forte.AI ML Service
 FastAPI сервис для предсказаний мошенничества с интеграцией OpenAI
+
+Legacy entry point: scoring and AI analysis go through the same services as
+the app package (app.services.model_service / app.services.ai_service), so
+the model runs on the executor and the fraud + AML completions run
+concurrently on the async client without blocking the event loop.
 """
 
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
-from typing import Dict, Any, List, Optional
-import joblib
+from typing import Dict, List
 import numpy as np
-import pandas as pd
-import shap
-from pathlib import Path
 import json
+import asyncio
 from datetime import datetime
 import os
-from openai import OpenAI
 from dotenv import load_dotenv
-import hashlib
-
-# MLflow для трекинга экспериментов
-import mlflow
-from mlflow.tracking import MlflowClient
 
 # Prometheus метрики
-from prometheus_client import Counter, Histogram, Gauge, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client import Counter, Gauge
 from prometheus_fastapi_instrumentator import Instrumentator
-from starlette.responses import Response
 
-# Загрузка переменных окружения из .env
+# Загрузка переменных окружения из .env (до импорта настроек app)
 load_dotenv()
 
+from app.core.config import settings
+from app.schemas.transaction import TransactionFeatures, PredictionResponse
+from app.services.model_service import model_service
+from app.services.ai_service import ai_service
+from app.core.request_id import RequestIdMiddleware, exemplar
+
 app = FastAPI(
     title="Forte.AI ML Service",
     description="GREKdev API with AI Analysis",
@@ -45,104 +46,58 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# X-Request-ID на входе и выходе; exemplars метрик несут его
+app.add_middleware(RequestIdMiddleware)
 
 # ==================== PROMETHEUS METRICS ====================
 
-# Счётчики
-PREDICTIONS_TOTAL = Counter(
-    "forte_predictions_total",
-    "Total number of predictions made",
-    ["risk_level", "blocked"]
-)
-
-PREDICTIONS_ERRORS = Counter(
-    "forte_predictions_errors_total",
-    "Total number of prediction errors"
+# Общие метрики с app (одинаковые имена нельзя зарегистрировать дважды)
+from app.core.metrics import (
+    PREDICTIONS_TOTAL, PREDICTIONS_ERRORS, PREDICTION_LATENCY, BLOCKED_TRANSACTIONS,
+    CURRENT_THRESHOLD, FRAUD_SCORE as FRAUD_SCORE_DISTRIBUTION
 )
 
+# Счётчики
 BATCH_PREDICTIONS_TOTAL = Counter(
     "forte_batch_predictions_total",
     "Total number of batch prediction requests"
 )
 
-# Гистограммы
-PREDICTION_LATENCY = Histogram(
-    "forte_prediction_latency_seconds",
-    "Prediction latency in seconds",
-    buckets=[0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0]
-)
-
-FRAUD_SCORE_DISTRIBUTION = Histogram(
-    "forte_fraud_score",
-    "Distribution of fraud scores",
-    buckets=[0, 10, 20, 30, 40, 50, 60, 70, 80, 90, 100]
-)
-
 # Gauges
 MODEL_VERSION_INFO = Gauge(
     "forte_model_version",
     "Current model version (as float, e.g., 1.02 for v1.0.2)"
 )
 
-CURRENT_THRESHOLD = Gauge(
-    "forte_current_threshold",
-    "Current fraud detection threshold"
-)
-
-DRIFT_SCORE = Gauge(
-    "forte_drift_score",
-    "Current data drift score"
-)
-
 # Инструментация FastAPI
 instrumentator = Instrumentator(
     should_group_status_codes=True,
     should_ignore_untemplated=True,
     should_respect_env_var=True,
     should_instrument_requests_inprogress=True,
-    excluded_handlers=["/metrics", "/health"],
+    excluded_handlers=["/metrics", "/health", "/ready"],
     inprogress_name="forte_inprogress_requests",
     inprogress_labels=True,
 )
 instrumentator.instrument(app)
 
 # Загрузка моделей
-MODEL_DIR = Path("models")
-lgb_model = None
-xgb_model = None
-scaler = None
-label_encoders = None
-metadata = None
-explainer = None
-openai_client = None
+MODEL_DIR = settings.MODEL_DIR
 
 
 @app.on_event("startup")
 async def load_models():
     """Загрузка моделей при старте"""
-    global lgb_model, xgb_model, scaler, label_encoders, metadata, explainer, openai_client
-
     print("[STARTUP] Загрузка моделей...")
 
     try:
-        lgb_model = joblib.load(MODEL_DIR / 'lgb_model.joblib')
-        xgb_model = joblib.load(MODEL_DIR / 'xgb_model.joblib')
-        scaler = joblib.load(MODEL_DIR / 'scaler.joblib')
-        label_encoders = joblib.load(MODEL_DIR / 'label_encoders.joblib')
-
-        with open(MODEL_DIR / 'metadata.json', 'r') as f:
-            metadata = json.load(f)
-
-        # Инициализация SHAP explainer
-        print("[SHAP] Инициализация SHAP explainer...")
-        # Используем TreeExplainer для LightGBM
-        explainer = shap.TreeExplainer(lgb_model)
-
-        # Инициализация OpenAI
-        api_key = os.getenv('OPENAI_API_KEY')
-        if api_key:
-            openai_client = OpenAI(api_key=api_key)
-            print("[AI] OpenAI клиент инициализирован")
+        model_service.load_models()
+        metadata = model_service.metadata
+
+        if ai_service.gateway:
+            # Клиент (импорт openai) создаётся в фоне, не задерживая старт
+            app.state.ai_warmup = asyncio.create_task(ai_service.warm())
+            print("[AI] OpenAI клиент инициализируется в фоне")
         else:
             print("[WARNING] OPENAI_API_KEY не найден. AI анализ будет недоступен.")
 
@@ -160,6 +115,9 @@ async def load_models():
 
         CURRENT_THRESHOLD.set(metadata['optimal_threshold'])
 
+        # Прогрев в фоне: /health отвечает сразу, /ready - после прогрева
+        app.state.warmup = asyncio.create_task(model_service.warm_up())
+
         # Экспозиция метрик
         instrumentator.expose(app)
         print("[PROMETHEUS] Метрики доступны на /metrics")
@@ -169,106 +127,9 @@ async def load_models():
         raise
 
 
-class TransactionFeatures(BaseModel):
-    """Признаки транзакции для предсказания"""
-    # Транзакционные данные
-    amount: float = Field(..., description="Сумма транзакции")
-    hour: int = Field(..., ge=0, le=23, description="Час транзакции")
-    day_of_week: int = Field(..., ge=0, le=6, description="День недели")
-    direction: str = Field(..., description="Направление перевода (хеш)")
-
-    # Поведенческие паттерны
-    monthly_os_changes: Optional[int] = None
-    monthly_phone_model_changes: Optional[int] = None
-    last_phone_model: Optional[str] = None
-    last_os: Optional[str] = None
-    logins_last_7_days: Optional[int] = None
-    logins_last_30_days: Optional[int] = None
-    login_frequency_7d: Optional[float] = None
-    login_frequency_30d: Optional[float] = None
-    freq_change_7d_vs_mean: Optional[float] = None
-    logins_7d_over_30d_ratio: Optional[float] = None
-    avg_login_interval_30d: Optional[float] = None
-    std_login_interval_30d: Optional[float] = None
-    var_login_interval_30d: Optional[float] = None
-    ewm_login_interval_7d: Optional[float] = None
-    burstiness_login_interval: Optional[float] = None
-    fano_factor_login_interval: Optional[float] = None
-    zscore_avg_login_interval_7d: Optional[float] = None
-
-
-class PredictionResponse(BaseModel):
-    """Ответ с предсказанием"""
-    fraud_probability: float
-    fraud_score: float
-    risk_level: str
-    should_block: bool
-    model_version: str
-    shap_values: Optional[Dict[str, float]] = None
-    ai_analysis: Optional[str] = None
-    aml_analysis: Optional[str] = None
-    recommendation: Optional[str] = None
-    analysis_fingerprint: Optional[str] = None
-    top_risk_factors: List[Dict[str, Any]]
-
-
-def prepare_features(transaction: TransactionFeatures) -> np.ndarray:
-    """Подготовка признаков для предсказания"""
-    # Создаем DataFrame
-    data = transaction.model_dump()
-
-    # Инжиниринг признаков
-    data['amount_log'] = np.log1p(data['amount'])
-    data['is_weekend'] = int(data['day_of_week'] in [5, 6])
-    data['is_night'] = int(data['hour'] >= 22 or data['hour'] <= 6)
-    data['is_business_hours'] = int(9 <= data['hour'] <= 18)
-
-    # Кодирование категориальных
-    if 'last_phone_model' in data and data['last_phone_model']:
-        if 'last_phone_model_categorical' in label_encoders:
-            le = label_encoders['last_phone_model_categorical']
-            try:
-                data['last_phone_model_categorical_encoded'] = le.transform([data['last_phone_model']])[0]
-            except:
-                data['last_phone_model_categorical_encoded'] = -1
-        del data['last_phone_model']
-
-    if 'last_os' in data and data['last_os']:
-        if 'last_os_categorical' in label_encoders:
-            le = label_encoders['last_os_categorical']
-            try:
-                data['last_os_categorical_encoded'] = le.transform([data['last_os']])[0]
-            except:
-                data['last_os_categorical_encoded'] = -1
-        del data['last_os']
-
-    if 'direction' in data and data['direction']:
-        if 'direction' in label_encoders:
-            le = label_encoders['direction']
-            try:
-                data['direction_encoded'] = le.transform([data['direction']])[0]
-            except:
-                data['direction_encoded'] = -1
-        del data['direction']
-
-    # Преобразуем в DataFrame
-    df = pd.DataFrame([data])
-
-    # Добавляем недостающие признаки
-    for feat in metadata['feature_names']:
-        if feat not in df.columns:
-            df[feat] = -999
-
-    # Сортируем столбцы в нужном порядке
-    df = df[metadata['feature_names']]
-
-    # Заполнение NaN
-    df = df.fillna(-999)
-
-    # Масштабирование
-    X_scaled = scaler.transform(df)
-
-    return X_scaled, df
+@app.on_event("shutdown")
+async def shutdown():
+    await model_service.close()
 
 
 def get_risk_level(probability: float, threshold: float) -> str:
@@ -283,122 +144,6 @@ def get_risk_level(probability: float, threshold: float) -> str:
         return "LOW"
 
 
-async def get_ai_analysis(
-    transaction: TransactionFeatures,
-    probability: float,
-    risk_level: str,
-    top_factors: List[Dict[str, Any]]
-) -> tuple[str, str, str, str]:
-    """Получение AI анализа от OpenAI с AML проверкой"""
-    if not openai_client:
-        return None, None, None, None
-
-    try:
-        # Формируем промпт для fraud анализа
-        fraud_prompt = f"""Ты - эксперт по анализу мошеннических транзакций в банковской системе Forte.AI.
-
-Проанализируй следующую транзакцию:
-
-**Данные транзакции:**
-- Сумма: {transaction.amount} тенге
-- Время: {transaction.hour}:00, день недели: {transaction.day_of_week}
-- Активность входов за 7 дней: {transaction.logins_last_7_days}
-- Активность входов за 30 дней: {transaction.logins_last_30_days}
-- Изменения устройств за месяц: {transaction.monthly_phone_model_changes}
-- Изменения ОС за месяц: {transaction.monthly_os_changes}
-
-**Результаты ML-модели:**
-- Вероятность мошенничества: {probability:.1%}
-- Уровень риска: {risk_level}
-
-**Топ факторы риска:**
-{chr(10).join([f"- {f['feature']}: {f['impact']:.3f}" for f in top_factors[:5]])}
-
-Предоставь:
-1. **Краткий анализ** (2-3 предложения): почему эта транзакция имеет такой уровень риска?
-2. **Рекомендацию** (1-2 предложения): что должен сделать аналитик?
-
-Будь конкретным и профессиональным. Отвечай на русском языке."""
-
-        # AML анализ
-        aml_prompt = f"""Ты - эксперт по AML (Anti-Money Laundering) в финансовой системе.
-
-Проанализируй транзакцию на признаки отмывания денег:
-
-**Данные транзакции:**
-- Сумма: {transaction.amount} тенге
-- Время: {transaction.hour}:00, день недели: {transaction.day_of_week}
-- Направление: {transaction.direction}
-- Частота входов (7 дней): {transaction.logins_last_7_days}
-- Частота входов (30 дней): {transaction.logins_last_30_days}
-- Изменения устройств: {transaction.monthly_phone_model_changes}
-- Изменения ОС: {transaction.monthly_os_changes}
-
-**ML Risk Level:** {risk_level}
-
-Предоставь:
-1. **AML Risk Score** (LOW/MEDIUM/HIGH/CRITICAL)
-2. **Признаки подозрительности** (2-3 пункта)
-3. **Действия** (что проверить дополнительно)
-
-Формат:
-AML_SCORE: [уровень]
-ПРИЗНАКИ:
-- [признак 1]
-- [признак 2]
-ДЕЙСТВИЯ:
-- [действие 1]
-- [действие 2]"""
-
-        # Параллельные запросы к OpenAI
-        fraud_response = openai_client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "Ты - эксперт по антифроду в мобильном банкинге. Анализируй транзакции кратко и точно."
-                },
-                {"role": "user", "content": fraud_prompt}
-            ],
-            max_tokens=500,
-            temperature=0.3
-        )
-
-        aml_response = openai_client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "Ты - эксперт по AML (Anti-Money Laundering). Выявляй схемы отмывания денег."
-                },
-                {"role": "user", "content": aml_prompt}
-            ],
-            max_tokens=600,
-            temperature=0.3
-        )
-
-        fraud_analysis = fraud_response.choices[0].message.content
-        aml_analysis = aml_response.choices[0].message.content
-
-        # Разделяем анализ и рекомендацию
-        parts = fraud_analysis.split("**Рекомендация")
-        ai_analysis = parts[0].replace("**Краткий анализ**", "").strip()
-
-        recommendation = ""
-        if len(parts) > 1:
-            recommendation = parts[1].replace(":**", "").replace("**:", "").strip()
-
-        # Генерируем fingerprint (hash от всех данных анализа)
-        fingerprint_data = f"{transaction.amount}_{transaction.hour}_{probability}_{risk_level}_{ai_analysis}_{aml_analysis}"
-        fingerprint = hashlib.sha256(fingerprint_data.encode()).hexdigest()[:16]
-
-        return ai_analysis, aml_analysis, recommendation, fingerprint
-
-    except Exception as e:
-        print(f"[WARNING] Ошибка AI анализа: {e}")
-        return None, None, None, None
-
-
 @app.post("/predict", response_model=PredictionResponse)
 async def predict_fraud(transaction: TransactionFeatures):
     """Предсказание мошенничества для транзакции"""
@@ -406,66 +151,39 @@ async def predict_fraud(transaction: TransactionFeatures):
     start_time = time.time()
 
     try:
-        # Подготовка признаков
-        X_scaled, X_df = prepare_features(transaction)
-
-        # Предсказания от обеих моделей
-        lgb_proba = lgb_model.predict_proba(X_scaled)[0, 1]
-        xgb_proba = xgb_model.predict_proba(X_scaled)[0, 1]
-
-        # Ансамбль
-        fraud_probability = float(0.6 * lgb_proba + 0.4 * xgb_proba)
+        # Предсказание ансамбля и SHAP значения (CPU, в пуле потоков)
+        prediction = await model_service.predict(transaction)
+        fraud_probability = prediction["fraud_probability"]
         fraud_score = fraud_probability * 100
 
-        # Уровень риска
-        threshold = metadata['optimal_threshold']
+        # Уровень риска (порог и версия той модели, которая посчитала предсказание)
+        threshold = prediction["threshold"]
         risk_level = get_risk_level(fraud_probability, threshold)
         should_block = fraud_probability >= threshold
 
-        # SHAP значения для объяснимости
-        shap_values = explainer.shap_values(X_scaled)
-        if isinstance(shap_values, list):
-            shap_values = shap_values[1]  # Для класса fraud
-
         # Топ факторы риска
-        shap_dict = dict(zip(metadata['feature_names'], shap_values[0]))
-        sorted_shap = sorted(shap_dict.items(), key=lambda x: abs(x[1]), reverse=True)
-
-        top_risk_factors = [
-            {
-                "feature": feat,
-                "impact": float(val),
-                "direction": "increases" if val > 0 else "decreases"
-            }
-            for feat, val in sorted_shap[:10]
-        ]
+        top_risk_factors = prediction["top_risk_factors"]
 
-        # AI анализ (fraud + AML)
-        ai_analysis, aml_analysis, recommendation, fingerprint = await get_ai_analysis(
-            transaction, fraud_probability, risk_level, top_risk_factors
-        )
+        # AI анализ (fraud + AML, параллельно, без блокировки event loop; шаблонный движок при отказе LLM)
+        ai_result = await ai_service.analyze(transaction, fraud_probability, risk_level, top_risk_factors)
 
         # Prometheus метрики
         latency = time.time() - start_time
-        PREDICTION_LATENCY.observe(latency)
+        PREDICTION_LATENCY.observe(latency, exemplar=exemplar())
         FRAUD_SCORE_DISTRIBUTION.observe(fraud_score)
-        PREDICTIONS_TOTAL.labels(
-            risk_level=risk_level,
-            blocked=str(should_block).lower()
-        ).inc()
+        PREDICTIONS_TOTAL.labels(risk_level=risk_level).inc()
+        if should_block:
+            BLOCKED_TRANSACTIONS.inc()
 
         return PredictionResponse(
             fraud_probability=fraud_probability,
             fraud_score=fraud_score,
             risk_level=risk_level,
             should_block=should_block,
-            model_version=metadata['version'],
-            shap_values={k: float(v) for k, v in shap_dict.items()},
-            ai_analysis=ai_analysis,
-            aml_analysis=aml_analysis,
-            recommendation=recommendation,
-            analysis_fingerprint=fingerprint,
-            top_risk_factors=top_risk_factors
+            model_version=prediction["model_version"],
+            shap_values=prediction["shap_values"],
+            top_risk_factors=top_risk_factors,
+            **ai_result
         )
 
     except Exception as e:
@@ -478,22 +196,33 @@ async def health_check():
     """Проверка здоровья сервиса"""
     return {
         "status": "healthy",
-        "model_loaded": lgb_model is not None and xgb_model is not None,
-        "model_version": metadata['version'] if metadata else None,
-        "openai_available": openai_client is not None
+        "model_loaded": model_service.lgb_model is not None,
+        "ready": model_service.ready,
+        "model_version": model_service.metadata['version'] if model_service.metadata else None,
+        "openai_available": ai_service.gateway is not None
     }
 
 
+@app.get("/ready")
+async def readiness_check():
+    """Готовность принимать трафик: модели загружены и прогреты (503 до окончания прогрева)"""
+    if not model_service.ready:
+        raise HTTPException(status_code=503, detail="Warming up")
+    return {"status": "ready", "model_version": model_service.metadata['version'],
+            "warmup": model_service.warmup_report}
+
+
 @app.get("/model-info")
 async def model_info():
     """Расширенная информация о модели с метриками"""
+    metadata = model_service.metadata
     if not metadata:
         raise HTTPException(status_code=500, detail="Model not loaded")
 
     # Calculate feature importance from LightGBM
     feature_importance = {}
-    if lgb_model is not None:
-        importances = lgb_model.feature_importances_
+    if model_service.lgb_model is not None:
+        importances = model_service.lgb_model.feature_importances_
         feature_names = metadata['feature_names']
         for name, imp in zip(feature_names, importances):
             feature_importance[name] = float(imp)
@@ -526,6 +255,7 @@ async def model_info():
 @app.get("/threshold")
 async def get_threshold():
     """Get current fraud detection threshold"""
+    metadata = model_service.metadata
     if not metadata:
         raise HTTPException(status_code=503, detail="Model not loaded")
 
@@ -542,21 +272,17 @@ class ThresholdUpdate(BaseModel):
 @app.post("/threshold")
 async def update_threshold(request: ThresholdUpdate):
     """Update fraud detection threshold dynamically"""
-    global metadata
-
-    if not metadata:
+    if not model_service.metadata:
         raise HTTPException(status_code=503, detail="Model not loaded")
 
-    old_threshold = metadata['optimal_threshold']
+    old_threshold = model_service.metadata['optimal_threshold']
     new_threshold = request.threshold
 
-    # Update in memory
-    metadata['optimal_threshold'] = new_threshold
+    # Update in memory (also invalidates cached predictions)
+    model_service.set_threshold(new_threshold)
 
     # Persist to file
-    metadata_path = MODEL_DIR / 'metadata.json'
-    with open(metadata_path, 'w') as f:
-        json.dump(metadata, f, indent=2)
+    await model_service.save_metadata()
 
     return {
         "old_threshold": old_threshold,
@@ -578,65 +304,32 @@ async def predict_batch(request: BatchPredictionRequest):
     import time
     start_time = time.time()
 
+    # Один проход по всей матрице на пуле потоков: ансамбль и объяснения вызываются один раз,
+    # ошибки изолируются построчно
+    result = await model_service.predict_batch(request.transactions)
+
     predictions = []
     total_fraud_prob = 0.0
     blocked_count = 0
-    threshold = metadata['optimal_threshold']
-
-    for idx, transaction in enumerate(request.transactions):
-        try:
-            X_scaled, _ = prepare_features(transaction)
-
-            lgb_proba = lgb_model.predict_proba(X_scaled)[0, 1]
-            xgb_proba = xgb_model.predict_proba(X_scaled)[0, 1]
-            fraud_prob = float(0.6 * lgb_proba + 0.4 * xgb_proba)
-            fraud_score = fraud_prob * 100
-
-            if fraud_prob >= threshold + 0.2:
-                risk_level = "CRITICAL"
-            elif fraud_prob >= threshold + 0.1:
-                risk_level = "HIGH"
-            elif fraud_prob >= threshold:
-                risk_level = "MEDIUM"
-            else:
-                risk_level = "LOW"
-
-            should_block = fraud_prob >= threshold
-            if should_block:
-                blocked_count += 1
-            total_fraud_prob += fraud_prob
-
-            # SHAP values
-            shap_vals = explainer.shap_values(X_scaled)
-            if isinstance(shap_vals, list):
-                shap_vals = shap_vals[1]
-            shap_dict = dict(zip(metadata['feature_names'], shap_vals[0]))
-            sorted_shap = sorted(shap_dict.items(), key=lambda x: abs(x[1]), reverse=True)
-            top_factors = [
-                {"feature": feat, "impact": float(val), "direction": "increases" if val > 0 else "decreases"}
-                for feat, val in sorted_shap[:5]
-            ]
 
-            predictions.append({
-                "index": idx,
-                "fraud_probability": fraud_prob,
-                "fraud_score": fraud_score,
-                "risk_level": risk_level,
-                "should_block": should_block,
-                "top_risk_factors": top_factors
-            })
-
-        except Exception as e:
-            predictions.append({
-                "index": idx,
-                "fraud_probability": 1.0,
-                "fraud_score": 100.0,
-                "risk_level": "CRITICAL",
-                "should_block": True,
-                "top_risk_factors": [{"feature": "error", "impact": 1.0, "direction": "increases"}]
-            })
+    for idx, (fraud_prob, risk_level, should_block, factors) in enumerate(zip(
+        result["fraud_probability"].tolist(),
+        result["risk_level"].tolist(),
+        result["should_block"].tolist(),
+        result["top_risk_factors"]
+    )):
+        if should_block:
             blocked_count += 1
-            total_fraud_prob += 1.0
+        total_fraud_prob += fraud_prob
+
+        predictions.append({
+            "index": idx,
+            "fraud_probability": fraud_prob,
+            "fraud_score": fraud_prob * 100,
+            "risk_level": risk_level,
+            "should_block": should_block,
+            "top_risk_factors": factors
+        })
 
     processing_time = (time.time() - start_time) * 1000
     avg_prob = total_fraud_prob / len(predictions) if predictions else 0.0
@@ -757,19 +450,20 @@ async def check_drift(transactions: List[TransactionFeatures]):
 
 # ==================== MLFLOW TRACKING ====================
 
-# Инициализация MLflow - используем удалённый сервер
+# Инициализация MLflow - используем удалённый сервер. Сам mlflow (~0.8s
+# импорта) загружается при первом обращении к /mlflow/*, а не на старте
 MLFLOW_URI = os.getenv("MLFLOW_TRACKING_URI", "https://forte.grekdev.com:5000")
-mlflow.set_tracking_uri(MLFLOW_URI)
 print(f"[MLflow] Tracking URI: {MLFLOW_URI}")
 
-_mlflow_client: Optional[MlflowClient] = None
+_mlflow_client = None
 
 
-def get_mlflow_client() -> MlflowClient:
-    """Lazy initialization of MLflow client"""
+def get_mlflow_client():
+    """Lazy initialization of MLflow client (mlflow.tracking.MlflowClient)"""
     global _mlflow_client
     if _mlflow_client is None:
-        _mlflow_client = MlflowClient()
+        from mlflow.tracking import MlflowClient
+        _mlflow_client = MlflowClient(tracking_uri=MLFLOW_URI)
     return _mlflow_client
 
 
@@ -33,6 +33,9 @@ import mlflow.lightgbm
 import mlflow.xgboost
 from mlflow.models.signature import infer_signature
 
+from scaler_folding import export_scaler_free
+from bundle_export import export_bundle
+
 
 class FraudDetectionModel:
     """
@@ -50,6 +53,9 @@ class FraudDetectionModel:
         self.label_encoders = {}
         self.feature_names = []
         self.model_version = "1.0.0"
+        self.scaler_free = None
+        self.onnx_export = None
+        self.X_holdout = None  # raw test features, used for export parity checks
 
         # MLflow настройка - используем удалённый сервер или локальный
         self.experiment_name = experiment_name
@@ -430,6 +436,25 @@ class FraudDetectionModel:
             print(f"   False Positive Rate: {fp/(fp+tn):.4f}")
             print(f"   False Negative Rate: {fn/(fn+tp):.4f}")
 
+            self.X_holdout = X_test
+
+            # ==================== SCALER-FREE EXPORT ====================
+            print("\n[FOLD] Экспорт scaler-free моделей (scaler в порогах деревьев)...")
+            try:
+                self.scaler_free = export_scaler_free(
+                    self.lgb_model, self.xgb_model, self.scaler, X_test, self.model_dir
+                )
+                print(f"[PARITY] max|Δp|={self.scaler_free['max_abs_diff']:.3e}, "
+                      f"изменённых строк: {self.scaler_free['rows_changed']} из {self.scaler_free['rows']}")
+                mlflow.log_metric("scaler_free_max_abs_diff", self.scaler_free['max_abs_diff'])
+                mlflow.log_metric("scaler_free_parity", int(self.scaler_free['passed']))
+                if not self.scaler_free['passed']:
+                    print("[WARN] Parity не пройдена, сервис будет использовать scaler")
+                    self.scaler_free = None
+            except Exception as e:
+                print(f"[WARN] Не удалось экспортировать scaler-free модели: {e}")
+                self.scaler_free = None
+
             # ==================== LOG MODELS TO MLFLOW ====================
             print("\n[MLflow] Логирование моделей...")
 
@@ -527,6 +552,25 @@ class FraudDetectionModel:
         joblib.dump(self.scaler, self.model_dir / 'scaler.joblib')
         joblib.dump(self.label_encoders, self.model_dir / 'label_encoders.joblib')
 
+        # ONNX: scaler + оба бустера в одном графе для ONNX Runtime
+        if self.X_holdout is not None:
+            print("[ONNX] Экспорт ансамбля в ONNX...")
+            try:
+                from onnx_export import export_onnx
+                self.onnx_export = export_onnx(
+                    self.lgb_model, self.xgb_model, self.scaler, self.X_holdout, self.model_dir
+                )
+                print(f"[PARITY] ONNX max|Δp|={self.onnx_export['max_abs_diff']:.3e}")
+                if not self.onnx_export['passed']:
+                    print("[WARN] ONNX parity не пройдена, модель не сохранена")
+                    self.onnx_export = None
+            except ImportError as e:
+                print(f"[SKIP] ONNX экспорт пропущен, не установлены пакеты из requirements-onnx.txt: {e}")
+                self.onnx_export = None
+            except Exception as e:
+                print(f"[WARN] Не удалось экспортировать ONNX модель: {e}")
+                self.onnx_export = None
+
         # Увеличиваем версию модели
         try:
             with open(self.model_dir / 'metadata.json', 'r') as f:
@@ -547,6 +591,28 @@ class FraudDetectionModel:
             'model_type': 'LightGBM + XGBoost Ensemble',
             'created_at': pd.Timestamp.now().isoformat()
         }
+        if self.scaler_free:
+            metadata['scaler_free'] = self.scaler_free
+        if self.onnx_export:
+            metadata['onnx'] = self.onnx_export
+
+        # Бандл: нативные модели, массивы и скомпилированные деревья в одном файле (сервис мапит его в память)
+        print("[BUNDLE] Экспорт бандла моделей...")
+        try:
+            if self.scaler_free:
+                serving_lgb = joblib.load(self.model_dir / self.scaler_free['lgb_model'])
+                serving_xgb = joblib.load(self.model_dir / self.scaler_free['xgb_model'])
+                X_check = self.X_holdout
+            else:
+                serving_lgb, serving_xgb = self.lgb_model, self.xgb_model
+                X_check = self.scaler.transform(self.X_holdout) if self.X_holdout is not None else None
+            metadata['bundle'] = export_bundle(
+                serving_lgb, serving_xgb, self.scaler, self.label_encoders, dict(metadata),
+                self.model_dir, scaler_free=bool(self.scaler_free), X_holdout=X_check
+            )
+            print(f"[OK] Бандл: {metadata['bundle']['file']} (sha256 {metadata['bundle']['sha256'][:12]})")
+        except Exception as e:
+            print(f"[WARN] Не удалось экспортировать бандл моделей: {e}")
 
         with open(self.model_dir / 'metadata.json', 'w') as f:
             json.dump(metadata, f, indent=2)
@@ -562,7 +628,7 @@ class FraudDetectionModel:
         print(f"[OK] Модели сохранены успешно! Версия: {self.model_version}")
 
 
-def main():
+def main(model_dir: str = "models"):
     """Основная функция обучения"""
     print("=" * 60)
     print("Forte.AI - GREKdev Model Training")
@@ -598,7 +664,7 @@ def main():
         )
 
     # Инициализация модели
-    model = FraudDetectionModel()
+    model = FraudDetectionModel(model_dir=model_dir)
 
     # Загрузка данных
     df = model.load_data(behavioral_path, transactions_path)
@@ -620,4 +686,9 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Forte.AI model training")
+    parser.add_argument("--model-dir", default="models",
+                        help="куда сохранить модели (сервис обучает в staging-каталог и переносит их после успеха)")
+    main(parser.parse_args().model_dir)